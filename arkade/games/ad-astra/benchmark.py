@@ -0,0 +1,347 @@
+"""
+Ad Astra - API Benchmark
+Runs server.py in-process against a throwaway database, seeds pilots with
+realistic game state and replays scripted workloads, reporting latency
+percentiles and throughput. Results can be saved as a JSON baseline and
+compared against on a later commit.
+
+    python benchmark.py                               # all workloads
+    python benchmark.py --players 2000 --requests 5000 --concurrency 32
+    python benchmark.py --workload autosave --save benchmarks/main.json
+    python benchmark.py --compare benchmarks/main.json  # exit 1 on regression
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+BASELINE_VERSION = 1
+PASSWORD = 'benchmark-pass'
+
+WORKLOADS = ('login', 'autosave', 'multiplayer', 'admin_scan')
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def make_game_state(rng, username, pilot_name):
+    """A mid-game save: ship, cargo, stats and a few hundred visited sectors"""
+    visited = sorted(rng.sample(range(1, 1001), rng.randint(20, 400)))
+    return {
+        'username': username,
+        'pilotName': pilot_name,
+        'credits': rng.randint(0, 250000),
+        'turns': rng.randint(0, 100),
+        'maxTurns': 100,
+        'currentSector': rng.choice(visited),
+        'ship': {
+            'name': f'{pilot_name} Runner', 'type': 'scout',
+            'hull': rng.randint(10, 100), 'hullMax': 100,
+            'shields': rng.randint(0, 50), 'shieldsMax': 50,
+            'fuel': rng.randint(0, 100), 'fuelMax': 100,
+            'cargo': 0, 'cargoMax': 50, 'weapons': 20, 'weaponsMax': 20, 'speed': 1.0,
+        },
+        'shipVariant': rng.randint(1, 3),
+        'cargo': {item: rng.randint(0, 20) for item in ('ore', 'organics', 'equipment', 'fuel')},
+        'stats': {
+            'sectorsVisited': len(visited),
+            'creditsEarned': rng.randint(0, 1000000),
+            'combatsWon': rng.randint(0, 50),
+            'combatsLost': rng.randint(0, 20),
+            'tradesCompleted': rng.randint(0, 500),
+            'eventsEncountered': rng.randint(0, 100),
+        },
+        'visitedSectors': visited,
+        'messages': [{'from': 'Sysop', 'text': f'Welcome back, pilot #{i}', 'read': True}
+                     for i in range(rng.randint(0, 15))],
+        'lastLogin': int(time.time() * 1000),
+        'lastTurnRegen': int(time.time() * 1000),
+        'lastDailyReset': datetime.now().strftime('%a %b %d %Y'),
+        'created': int(time.time() * 1000) - rng.randint(0, 90) * 86400000,
+    }
+
+
+class Bench:
+    """Owns the in-process app, the temp database and the seeded pilots"""
+
+    def __init__(self, players, seed, write_behind=False):
+        self.workdir = tempfile.mkdtemp(prefix='adastra-bench-')
+        os.environ['ADASTRA_DB_PATH'] = os.path.join(self.workdir, 'bench.db')
+        os.environ.setdefault('ADASTRA_LOG_LEVEL', 'WARNING')
+        os.environ.setdefault('ADASTRA_ACCESS_LOG_SAMPLE', '0')
+        if write_behind:
+            os.environ['ADASTRA_WRITE_BEHIND'] = '1'
+        # Imported late: the module reads its configuration from the environment
+        import server
+        self.server = server
+        self.app = server.app
+        self.rng = random.Random(seed)
+        self.pilots = []
+        self.admin_token = None
+        self._local = threading.local()
+        self._ip_counter = 0
+        self._ip_lock = threading.Lock()
+
+        server.init_db()
+        if write_behind:
+            server.write_behind.start()
+        self.seed(players)
+
+    def seed(self, count):
+        """Insert accounts, players, sessions and presence rows directly"""
+        server = self.server
+        password_hash = server.hash_password(PASSWORD)
+        now = datetime.now().isoformat()
+        server.create_admin_account('admin', PASSWORD)
+        with server.db.connection() as conn:
+            c = conn.cursor()
+            for i in range(count):
+                username = f'pilot{i:05d}'
+                pilot_name = f'Pilot {i}'
+                state = make_game_state(self.rng, username, pilot_name)
+                c.execute('''INSERT INTO accounts (username, password_hash, created_at, last_login)
+                             VALUES (?, ?, ?, ?)''', (username, password_hash, now, now))
+                account_id = c.lastrowid
+                c.execute('''INSERT INTO players (account_id, pilot_name, ship_name, credits, turns,
+                                 current_sector, ship_type, cargo, equipment, game_state,
+                                 last_activity, ship_variant)
+                             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                          (account_id, pilot_name, state['ship']['name'], state['credits'],
+                           state['turns'], state['currentSector'], 'Scout', json.dumps(state['cargo']),
+                           '{}', json.dumps(state), now, state['shipVariant']))
+                token, _, _ = server.create_session(c, account_id)
+                server.presence.upsert(c, username, {
+                    'pilotName': pilot_name, 'currentSector': state['currentSector'],
+                    'credits': state['credits'], 'status': 'online',
+                    'ship': {'name': state['ship']['name'], 'hull': state['ship']['hull'],
+                             'maxHull': 100, 'class': 'scout'},
+                })
+                self.pilots.append({'username': username, 'token': token, 'state': state})
+            admin_id = c.execute("SELECT id FROM accounts WHERE username = 'admin'").fetchone()[0]
+            self.admin_token, _, _ = server.create_session(c, admin_id)
+            conn.commit()
+            server.live_stats.load(conn)
+
+    def client(self):
+        """Per-thread test client with its own (non-local) client address"""
+        local = self._local
+        if getattr(local, 'client', None) is None:
+            with self._ip_lock:
+                self._ip_counter += 1
+                n = self._ip_counter
+            local.client = self.app.test_client()
+            local.environ = {'REMOTE_ADDR': f'10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}'}
+        return local.client, local.environ
+
+    # -- workloads (each issues one request; returns the status code) --
+
+    def op_login(self, i):
+        client, environ = self.client()
+        pilot = self.pilots[i % len(self.pilots)]
+        r = client.post('/api/login', json={'username': pilot['username'], 'password': PASSWORD},
+                        environ_base=environ)
+        if r.status_code == 200:
+            # Older sessions may be evicted by the per-account cap
+            pilot['token'] = r.json['token']
+        return r.status_code
+
+    def op_autosave(self, i):
+        client, environ = self.client()
+        pilot = self.pilots[i % len(self.pilots)]
+        state = pilot['state']
+        state['credits'] += 10
+        state['turns'] = max(0, state['turns'] - 1)
+        body = {
+            'pilotName': state['pilotName'], 'shipName': state['ship']['name'],
+            'shipType': state['ship']['type'], 'shipVariant': state['shipVariant'],
+            'gameState': state, 'credits': state['credits'], 'turns': state['turns'],
+            'currentSector': state['currentSector'], 'cargo': state['cargo'], 'equipment': {},
+        }
+        r = client.put('/api/player', json=body, environ_base=environ,
+                       headers={'Authorization': 'Bearer ' + pilot['token']})
+        return r.status_code
+
+    def op_multiplayer(self, i):
+        client, environ = self.client()
+        return client.get('/api/multiplayer', environ_base=environ).status_code
+
+    def op_admin_scan(self, i):
+        """Walk the whole admin player list, 100 per page; one sample per page"""
+        client, environ = self.client()
+        headers = {'Authorization': 'Bearer ' + self.admin_token}
+        r = client.get('/api/admin/players?limit=100', headers=headers, environ_base=environ)
+        cursor = r.json.get('nextCursor') if r.status_code == 200 else None
+        pages = [(r.status_code, None)]
+        while cursor:
+            started = time.perf_counter()
+            r = client.get(f'/api/admin/players?limit=100&cursor={cursor}',
+                           headers=headers, environ_base=environ)
+            pages.append((r.status_code, time.perf_counter() - started))
+            cursor = r.json.get('nextCursor') if r.status_code == 200 else None
+        return pages
+
+    def run(self, name, requests, concurrency):
+        """Run `requests` operations of one workload on `concurrency` threads"""
+        op = getattr(self, 'op_' + name)
+        latencies = []
+        statuses = {}
+        lock = threading.Lock()
+
+        def one(i):
+            started = time.perf_counter()
+            result = op(i)
+            elapsed = time.perf_counter() - started
+            # admin_scan returns one entry per page: the first page is timed
+            # here, follow-up pages timed inside the op
+            samples = ([(result, elapsed)] if isinstance(result, int)
+                       else [(status, t if t is not None else elapsed) for status, t in result])
+            with lock:
+                for status, t in samples:
+                    latencies.append(t)
+                    statuses[status] = statuses.get(status, 0) + 1
+
+        wall_started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='bench') as pool:
+            list(pool.map(one, range(requests)))
+        wall = time.perf_counter() - wall_started
+
+        latencies.sort()
+        ok = sum(count for status, count in statuses.items() if status < 400)
+        return {
+            'requests': len(latencies),
+            'concurrency': concurrency,
+            'seconds': round(wall, 3),
+            'throughput': round(len(latencies) / wall, 1) if wall else 0.0,
+            'errorRate': round(1 - ok / len(latencies), 4) if latencies else 0.0,
+            'statuses': {str(k): v for k, v in sorted(statuses.items())},
+            'p50Ms': round(percentile(latencies, 50) * 1000, 3),
+            'p95Ms': round(percentile(latencies, 95) * 1000, 3),
+            'p99Ms': round(percentile(latencies, 99) * 1000, 3),
+            'maxMs': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        }
+
+    def close(self):
+        server = self.server
+        server.write_behind.stop()
+        server.kdf.shutdown()
+        server.db.close_all()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+                              ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, results, threshold):
+    """Print per-workload deltas; returns the names that regressed"""
+    regressed = []
+    print()
+    print(f"Compared with {baseline.get('commit') or 'baseline'} ({baseline.get('createdAt')}), "
+          f"threshold {threshold:.0%}")
+    for name, current in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            print(f'  {name:<12} (not in baseline)')
+            continue
+        p95_change = current['p95Ms'] / base['p95Ms'] - 1 if base['p95Ms'] else 0.0
+        tput_change = current['throughput'] / base['throughput'] - 1 if base['throughput'] else 0.0
+        bad = p95_change > threshold or tput_change < -threshold
+        if bad:
+            regressed.append(name)
+        print(f"  {name:<12} p95 {base['p95Ms']:>9.2f} -> {current['p95Ms']:>9.2f} ms ({p95_change:+.1%})"
+              f"  throughput {base['throughput']:>8.1f} -> {current['throughput']:>8.1f}/s"
+              f" ({tput_change:+.1%}){'  REGRESSION' if bad else ''}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Ad Astra API in-process')
+    parser.add_argument('--workload', action='append', choices=WORKLOADS,
+                        help='Workload to run (repeatable; default: all)')
+    parser.add_argument('--players', type=int, default=500, help='Pilots to seed')
+    parser.add_argument('--requests', type=int, default=2000, help='Operations per workload')
+    parser.add_argument('--login-requests', type=int, default=200,
+                        help='Operations for the login storm (each runs scrypt)')
+    parser.add_argument('--scans', type=int, default=20, help='Full admin list walks')
+    parser.add_argument('--concurrency', type=int, default=16, help='Client threads')
+    parser.add_argument('--seed', type=int, default=1, help='RNG seed for generated data')
+    parser.add_argument('--write-behind', action='store_true', help='Run with ADASTRA_WRITE_BEHIND=1')
+    parser.add_argument('--save', metavar='PATH', help='Write results as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='Compare with a saved baseline')
+    parser.add_argument('--threshold', type=float, default=0.20,
+                        help='Allowed p95/throughput change before --compare fails (default 0.20)')
+    args = parser.parse_args()
+
+    workloads = args.workload or list(WORKLOADS)
+    counts = {'login': args.login_requests, 'admin_scan': args.scans}
+
+    print(f'Seeding {args.players} pilots...', flush=True)
+    started = time.perf_counter()
+    bench = Bench(args.players, args.seed, write_behind=args.write_behind)
+    print(f'  done in {time.perf_counter() - started:.1f}s')
+
+    results = {}
+    try:
+        print(f"{'workload':<12} {'reqs':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+              f"{'p99 ms':>9} {'max ms':>9} {'errors':>7}")
+        for name in workloads:
+            result = bench.run(name, counts.get(name, args.requests), args.concurrency)
+            results[name] = result
+            print(f"{name:<12} {result['requests']:>7} {result['throughput']:>9.1f} "
+                  f"{result['p50Ms']:>9.2f} {result['p95Ms']:>9.2f} {result['p99Ms']:>9.2f} "
+                  f"{result['maxMs']:>9.2f} {result['errorRate']:>7.1%}", flush=True)
+    finally:
+        bench.close()
+
+    report = {
+        'version': BASELINE_VERSION,
+        'createdAt': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'players': args.players, 'requests': args.requests,
+            'loginRequests': args.login_requests, 'scans': args.scans,
+            'concurrency': args.concurrency, 'seed': args.seed,
+            'writeBehind': args.write_behind,
+        },
+        'results': results,
+    }
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nSaved baseline to {args.save}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('config') != report['config']:
+            print('\nWarning: baseline was recorded with a different configuration')
+        if compare(baseline, results, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
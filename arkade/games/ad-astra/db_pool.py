@@ -0,0 +1,150 @@
+"""
+Ad Astra - SQLite Connection Pool
+Bounded pool of pre-configured connections shared by every API route
+"""
+
+import sqlite3
+import threading
+import queue
+import time
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the pool timeout"""
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections.
+
+    Connections are opened lazily (up to max_size), configured once with
+    WAL journaling, synchronous=NORMAL, mmap and a prepared-statement cache,
+    and then reused for the life of the process.
+    """
+
+    def __init__(self, db_path, max_size=8, timeout=5.0,
+                 mmap_size=256 * 1024 * 1024, cache_kib=16 * 1024,
+                 cached_statements=256, busy_timeout=5.0):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.mmap_size = mmap_size
+        self.cache_kib = cache_kib
+        self.cached_statements = cached_statements
+        self.busy_timeout = busy_timeout
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._all = []
+        self._in_use = 0
+
+        # Metrics
+        self._acquired_total = 0
+        self._waits_total = 0
+        self._wait_seconds = 0.0
+        self._timeouts_total = 0
+        self._peak_in_use = 0
+
+        # Optional callback(seconds) after each connection() block, wait included
+        self.on_hold = None
+
+    def _connect(self):
+        """Open and configure a new connection"""
+        conn = sqlite3.connect(self.db_path,
+                               timeout=self.busy_timeout,
+                               check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+        conn.execute(f'PRAGMA cache_size=-{int(self.cache_kib)}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+
+    def acquire(self):
+        """Take a connection from the pool, opening one if under max_size"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if len(self._all) < self.max_size:
+                    conn = self._connect()
+                    self._all.append(conn)
+            if conn is None:
+                started = time.perf_counter()
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts_total += 1
+                    raise PoolTimeout(f'No database connection free after {self.timeout}s')
+                with self._lock:
+                    self._waits_total += 1
+                    self._wait_seconds += time.perf_counter() - started
+
+        with self._lock:
+            self._in_use += 1
+            self._acquired_total += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+        return conn
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding any open transaction"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Broken connection - drop it so a fresh one is opened next time
+            with self._lock:
+                self._in_use -= 1
+                if conn in self._all:
+                    self._all.remove(conn)
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            return
+
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager: `with pool.connection() as conn: ...`"""
+        started = time.perf_counter()
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+            if self.on_hold is not None:
+                self.on_hold(time.perf_counter() - started)
+
+    def close_all(self):
+        """Close idle connections (used on shutdown)"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                if conn in self._all:
+                    self._all.remove(conn)
+            conn.close()
+
+    def stats(self):
+        """Pool metrics for the admin dashboard"""
+        with self._lock:
+            return {
+                'maxSize': self.max_size,
+                'open': len(self._all),
+                'inUse': self._in_use,
+                'idle': self._idle.qsize(),
+                'peakInUse': self._peak_in_use,
+                'acquiredTotal': self._acquired_total,
+                'waitsTotal': self._waits_total,
+                'waitMsTotal': round(self._wait_seconds * 1000, 3),
+                'timeoutsTotal': self._timeouts_total,
+            }
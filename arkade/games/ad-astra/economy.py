@@ -0,0 +1,386 @@
+"""
+Ad Astra - Trading Economy
+Server-side market for the live galaxy: shared supply per trading
+location, cached deterministic daily prices, atomic trades and a
+periodic supply regeneration pass
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+
+from galaxy import COMMODITIES, BASE_PRICES, SeededRandom, js_round
+
+log = logging.getLogger('adastra.economy')
+
+MAX_TRADE_QUANTITY = 100000
+
+# Date.prototype.toDateString() pieces; spelled out so the locale never matters
+_DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+class TradeError(Exception):
+    """Rejected trade; `status` is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def date_string(now=None):
+    """Server-local day in the JS toDateString() format, e.g. 'Sat Oct 17 2026'"""
+    day = datetime.fromtimestamp(time.time() if now is None else now)
+    return f'{_DAYS[day.weekday()]} {_MONTHS[day.month - 1]} {day.day:02d} {day.year}'
+
+
+def daily_price(name, specialty, commodity, date):
+    """Galaxy.generateDailyPrice(): (buyPrice, sellPrice) for one location and day"""
+    rng = SeededRandom(f'{date}-{name}-{commodity}')
+    base = BASE_PRICES[commodity]
+    if commodity == specialty:
+        base *= 0.7
+    else:
+        base *= rng.float(0.8, 1.5)
+    buy = js_round(base * rng.float(1.1, 1.3))
+    sell = js_round(base * rng.float(0.7, 0.9))
+    return buy, sell
+
+
+class DailyPrices:
+    """Today's prices per (location name, specialty, commodity), computed
+    once per day on first use instead of on every request"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._date = None
+        self._prices = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, content, commodity, date=None):
+        date = date or date_string()
+        key = (content.get('name'), content.get('specialty'), commodity)
+        with self._lock:
+            if date != self._date:
+                self._date = date
+                self._prices = {}
+            price = self._prices.get(key)
+            if price is not None:
+                self.hits += 1
+                return price
+            self.misses += 1
+        price = daily_price(key[0], key[1], commodity, date)
+        with self._lock:
+            if date == self._date:
+                self._prices[key] = price
+        return price
+
+    def stats(self):
+        with self._lock:
+            return {'date': self._date, 'cached': len(self._prices),
+                    'hits': self.hits, 'misses': self.misses}
+
+
+def create_tables(c):
+    """Shared stock per (galaxy version, sector, content slot, commodity).
+
+    `slot` is the index of the planet/station in the sector's contents and
+    `commodity` an index into COMMODITIES, so rows stay a few bytes wide.
+    `equilibrium` is the generated stock level that regeneration drifts
+    back to: producers restock up to it, consumers (0) use up what is sold.
+    """
+    c.execute('''CREATE TABLE IF NOT EXISTS market (
+        galaxy_version INTEGER NOT NULL,
+        sector_id INTEGER NOT NULL,
+        slot INTEGER NOT NULL,
+        commodity INTEGER NOT NULL,
+        supply INTEGER NOT NULL,
+        equilibrium INTEGER NOT NULL,
+        PRIMARY KEY (galaxy_version, sector_id, slot, commodity)
+    ) WITHOUT ROWID''')
+
+
+def trading_slots(contents):
+    """(slot, content) for every planet/station in a sector that trades"""
+    return [(slot, content) for slot, content in enumerate(contents)
+            if content.get('type') in ('planet', 'station') and content.get('economy')]
+
+
+class Market:
+    """Economy for the live galaxy version.
+
+    Market rows are seeded from the galaxy's generated economy the first
+    time a version is traded on. Trades update the market row and the
+    player row in one transaction; the player update is conditional on
+    the version read, so a concurrent save makes the trade retry rather
+    than lose credits or cargo.
+    """
+
+    def __init__(self, pool, store, interval=300.0, rate=0.1):
+        self.pool = pool
+        self.store = store
+        self.interval = interval
+        self.rate = rate
+        self.prices = DailyPrices()
+        self._seeded = set()
+        self._seed_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._trades = {'buy': 0, 'sell': 0}
+        self._rejected = 0
+        self._regen_runs = 0
+        self._regen_rows = 0
+        self._regen_seconds = 0.0
+        self._last_regen = None
+
+    def ensure(self, snapshot):
+        """Seed market rows for a galaxy version (once per process)"""
+        if snapshot.version in self._seeded:
+            return
+        with self._seed_lock:
+            if snapshot.version in self._seeded:
+                return
+            rows = []
+            for sector_id in range(1, snapshot.galaxy.size + 1):
+                for slot, content in trading_slots(snapshot.galaxy.contents[sector_id]):
+                    for commodity, eco in content['economy'].items():
+                        if commodity in COMMODITIES:
+                            supply = int(eco.get('supply') or 0)
+                            rows.append((snapshot.version, sector_id, slot,
+                                         COMMODITIES.index(commodity), supply, supply))
+            with self.pool.connection() as conn:
+                conn.executemany('''INSERT OR IGNORE INTO market
+                                    (galaxy_version, sector_id, slot, commodity, supply, equilibrium)
+                                    VALUES (?, ?, ?, ?, ?, ?)''', rows)
+                conn.commit()
+            self._seeded.add(snapshot.version)
+            log.info('Market for galaxy %s: %s rows', snapshot.version, len(rows))
+
+    def listing(self, snapshot, sector_ids):
+        """Trading locations in `sector_ids` with today's prices and live supply"""
+        self.ensure(snapshot)
+        date = date_string()
+        placeholders = ','.join('?' * len(sector_ids))
+        with self.pool.connection() as conn:
+            rows = conn.execute(f'''SELECT sector_id, slot, commodity, supply FROM market
+                                    WHERE galaxy_version = ? AND sector_id IN ({placeholders})''',
+                                (snapshot.version, *sector_ids)).fetchall()
+        supply = {(sector_id, slot, commodity): value for sector_id, slot, commodity, value in rows}
+
+        sectors = {}
+        for sector_id in sector_ids:
+            locations = []
+            for slot, content in trading_slots(snapshot.galaxy.contents[sector_id]):
+                goods = []
+                for commodity in COMMODITIES:
+                    eco = content['economy'].get(commodity)
+                    if eco is None:
+                        continue
+                    buy, sell = self.prices.get(content, commodity, date)
+                    goods.append({
+                        'commodity': commodity,
+                        'buyPrice': buy,
+                        'sellPrice': sell,
+                        'supply': supply.get((sector_id, slot, COMMODITIES.index(commodity)), 0),
+                        'equilibrium': int(eco.get('supply') or 0)
+                    })
+                locations.append({'slot': slot, 'type': content['type'], 'name': content.get('name'),
+                                  'commodities': goods})
+            sectors[str(sector_id)] = locations
+        return {'version': snapshot.version, 'date': date, 'sectors': sectors}
+
+    def _location(self, snapshot, sector_id, slot, commodity):
+        if not isinstance(sector_id, int) or not 1 <= sector_id <= snapshot.galaxy.size:
+            raise TradeError('sector must be a sector id in this galaxy')
+        for index, content in trading_slots(snapshot.galaxy.contents[sector_id]):
+            if (slot is None or slot == index) and commodity in content['economy']:
+                return index, content
+        raise TradeError('Invalid trading location')
+
+    def trade(self, snapshot, account_id, action, sector_id, commodity, quantity, slot=None, retries=3):
+        """Buy or sell at a location in the player's current sector.
+
+        Same rules as TradingSystem.buy()/sell(): one turn per trade, credits,
+        cargo space (game_state.ship.cargoMax) and shared supply. Returns the
+        TradingSystem result plus the player's new credits, turns and cargo.
+        """
+        if action not in ('buy', 'sell'):
+            raise TradeError("action must be 'buy' or 'sell'")
+        if commodity not in COMMODITIES:
+            raise TradeError(f'Unknown commodity: {commodity}')
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or not 1 <= quantity <= MAX_TRADE_QUANTITY:
+            raise TradeError(f'quantity must be between 1 and {MAX_TRADE_QUANTITY}')
+
+        slot, content = self._location(snapshot, sector_id, slot, commodity)
+        self.ensure(snapshot)
+        buy_price, sell_price = self.prices.get(content, commodity)
+        price = buy_price if action == 'buy' else sell_price
+        market_key = (snapshot.version, sector_id, slot, COMMODITIES.index(commodity))
+
+        try:
+            for _ in range(retries):
+                result = self._attempt(account_id, action, commodity, quantity, price, sector_id, market_key)
+                if result is not None:
+                    with self._lock:
+                        self._trades[action] += 1
+                    return result
+        except TradeError:
+            with self._lock:
+                self._rejected += 1
+            raise
+        raise TradeError('Player data changed during the trade, please retry', 409)
+
+    def _attempt(self, account_id, action, commodity, quantity, price, sector_id, market_key):
+        with self.pool.connection() as conn:
+            row = conn.execute('''SELECT credits, turns, current_sector, cargo, game_state, version
+                                  FROM players WHERE account_id = ?''', (account_id,)).fetchone()
+            if row is None:
+                raise TradeError('Player not found', 404)
+            credits, turns, current_sector, cargo, game_state, version = row
+            credits = credits or 0
+            turns = turns or 0
+            cargo = json.loads(cargo) if cargo else {}
+            state = json.loads(game_state) if game_state else {}
+
+            if current_sector != sector_id:
+                raise TradeError('You are not in that sector', 409)
+            if turns < 1:
+                raise TradeError('Not enough turns!')
+
+            total = price * quantity
+            held = cargo.get(commodity, 0)
+            if action == 'buy':
+                if credits < total:
+                    raise TradeError('Not enough credits!')
+                cargo_max = (state.get('ship') or {}).get('cargoMax')
+                if cargo_max is not None and sum(cargo.values()) + quantity > cargo_max:
+                    raise TradeError('Not enough cargo space!')
+                c = conn.execute('''UPDATE market SET supply = supply - ?
+                                    WHERE galaxy_version = ? AND sector_id = ? AND slot = ? AND commodity = ?
+                                      AND supply >= ?''', (quantity, *market_key, quantity))
+                if c.rowcount == 0:
+                    conn.rollback()
+                    available = conn.execute('''SELECT supply FROM market WHERE galaxy_version = ?
+                                                AND sector_id = ? AND slot = ? AND commodity = ?''',
+                                             market_key).fetchone()
+                    raise TradeError(f'Only {available[0] if available else 0} units available!', 409)
+                credits -= total
+                cargo[commodity] = held + quantity
+            else:
+                if held < quantity:
+                    raise TradeError('Not enough cargo to sell!')
+                conn.execute('''UPDATE market SET supply = supply + ?
+                                WHERE galaxy_version = ? AND sector_id = ? AND slot = ? AND commodity = ?''',
+                             (quantity, *market_key))
+                credits += total
+                cargo[commodity] = held - quantity
+                if cargo[commodity] == 0:
+                    del cargo[commodity]
+            turns -= 1
+
+            # gameState carries its own copy of these for the client
+            state['credits'] = credits
+            state['turns'] = turns
+            state['cargo'] = cargo
+            stats = state.get('stats')
+            if isinstance(stats, dict):
+                stats['tradesCompleted'] = stats.get('tradesCompleted', 0) + 1
+
+            c = conn.execute('''UPDATE players SET credits = ?, turns = ?, cargo = ?, game_state = ?,
+                                last_activity = ?, version = version + 1
+                                WHERE account_id = ? AND version = ?''',
+                             (credits, turns, json.dumps(cargo), json.dumps(state),
+                              datetime.now().isoformat(), account_id, version))
+            if c.rowcount == 0:
+                conn.rollback()
+                return None
+            supply = conn.execute('''SELECT supply FROM market WHERE galaxy_version = ?
+                                     AND sector_id = ? AND slot = ? AND commodity = ?''',
+                                  market_key).fetchone()[0]
+            conn.commit()
+
+        return {
+            'success': True,
+            'commodity': commodity,
+            'quantity': quantity,
+            'price': price,
+            ('cost' if action == 'buy' else 'revenue'): total,
+            'credits': credits,
+            'turns': turns,
+            'cargo': cargo,
+            'supply': supply,
+            'version': version + 1
+        }
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='market-regen', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.regenerate()
+            except Exception as e:
+                log.error('Market regeneration failed: %s', e)
+
+    def regenerate(self):
+        """Move every live market row `rate` of the way back to its
+        equilibrium (at least one unit) in a single UPDATE; returns rows changed"""
+        snapshot = self.store.current()
+        if snapshot is None:
+            return 0
+        self.ensure(snapshot)
+        started = time.perf_counter()
+        with self.pool.connection() as conn:
+            c = conn.execute('''UPDATE market SET supply = CASE
+                                    WHEN supply < equilibrium THEN
+                                        MIN(equilibrium, supply + MAX(1, CAST((equilibrium - supply) * :rate AS INTEGER)))
+                                    ELSE
+                                        MAX(equilibrium, supply - MAX(1, CAST((supply - equilibrium) * :rate AS INTEGER)))
+                                END
+                                WHERE galaxy_version = :version AND supply != equilibrium''',
+                             {'rate': self.rate, 'version': snapshot.version})
+            changed = c.rowcount
+            conn.commit()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._regen_runs += 1
+            self._regen_rows += changed
+            self._regen_seconds += elapsed
+            self._last_regen = datetime.now().isoformat()
+        log.debug('Market regeneration: %s rows in %.1fms', changed, elapsed * 1000)
+        return changed
+
+    def stats(self):
+        with self._lock:
+            return {
+                'running': self.running,
+                'intervalSeconds': self.interval,
+                'rate': self.rate,
+                'seededVersions': len(self._seeded),
+                'buys': self._trades['buy'],
+                'sells': self._trades['sell'],
+                'rejected': self._rejected,
+                'regenRuns': self._regen_runs,
+                'regenRows': self._regen_rows,
+                'regenSeconds': round(self._regen_seconds, 3),
+                'lastRegen': self._last_regen,
+                'prices': self.prices.stats()
+            }
@@ -0,0 +1,723 @@
+"""
+Ad Astra - Galaxy Engine
+Server-side port of js/galaxy.js generate(): the same seeded algorithm,
+stored once per galaxy version as compact arrays and served from memory
+"""
+
+import gzip
+import hashlib
+import json
+import math
+import secrets
+import string
+import threading
+import time
+
+from flask import Response
+
+from routing import RoutingIndex
+
+# Bump when the snapshot layout changes (clients check `v`)
+FORMAT_VERSION = 1
+
+MIN_SIZE = 10
+DEFAULT_SIZE = 100
+
+# CONSTANTS.GALAXY / COMMODITIES / ECONOMY in js/utils.js
+PLANET_CHANCE = 0.3
+STATION_CHANCE = 0.1
+COMMODITIES = ('Ore', 'Organics', 'Equipment', 'Contraband')
+BASE_PRICES = {'Ore': 10, 'Organics': 15, 'Equipment': 25, 'Contraband': 100}
+
+# Extra warps are only added between sectors closer than this
+EXTRA_WARP_DISTANCE = 30
+
+# Sector coordinates span [0, MAP_EXTENT) on both axes whatever the size
+MAP_EXTENT = 100
+# Target sectors per spatial grid cell
+SECTORS_PER_CELL = 8
+
+PLANET_TYPES = (
+    ('Desert', 'Ore'), ('Forest', 'Organics'), ('Industrial', 'Equipment'),
+    ('Ocean', 'Organics'), ('Rocky', 'Ore'), ('Urban', 'Equipment'),
+)
+PLANET_NAMES = (
+    'Alpha Prime', 'Beta Station', 'Gamma Outpost', 'Delta World',
+    'Epsilon Colony', 'Zeta Haven', 'Theta Base', 'Nova Terra',
+    'Proxima', 'Kepler Station', 'Titan Outpost', 'Europa Base',
+)
+STATION_TYPES = (
+    {'class': 'Mining', 'icon': '⛏️', 'specialties': ['Ore'],
+     'services': ['repair', 'refuel', 'trade'],
+     'description': 'A rough-and-tumble mining outpost dealing primarily in raw materials',
+     'repairCost': 6, 'refuelCost': 2, 'tradingBonus': 1.2},
+    {'class': 'Agricultural', 'icon': '🌾', 'specialties': ['Organics'],
+     'services': ['repair', 'refuel', 'trade'],
+     'description': 'An agricultural station with hydroponic farms and bio-domes',
+     'repairCost': 5, 'refuelCost': 2, 'tradingBonus': 1.2},
+    {'class': 'Industrial', 'icon': '🏭', 'specialties': ['Equipment'],
+     'services': ['repair', 'refuel', 'trade', 'upgrade'],
+     'description': 'A high-tech industrial complex specializing in equipment and ship parts',
+     'repairCost': 4, 'refuelCost': 2, 'tradingBonus': 1.2},
+    {'class': 'Commercial', 'icon': '🏢', 'specialties': ['Ore', 'Organics', 'Equipment'],
+     'services': ['repair', 'refuel', 'trade', 'bank'],
+     'description': 'A bustling commercial hub with general trading facilities',
+     'repairCost': 5, 'refuelCost': 2, 'tradingBonus': 1},
+    {'class': 'Black Market', 'icon': '💀', 'specialties': ['Contraband'],
+     'services': ['refuel', 'trade'],
+     'description': 'A secretive outpost dealing in illegal goods - no questions asked',
+     'repairCost': 8, 'refuelCost': 3, 'tradingBonus': 1.5, 'hidden': True},
+    {'class': 'Military', 'icon': '🛡️', 'specialties': ['Equipment'],
+     'services': ['repair', 'refuel', 'upgrade'],
+     'description': 'A fortified military outpost with advanced repair facilities',
+     'repairCost': 3, 'refuelCost': 1, 'tradingBonus': 0.8, 'defended': True},
+)
+STATION_NAMES = (
+    'Alpha', 'Beta', 'Gamma', 'Delta', 'Epsilon', 'Zeta',
+    'Omega', 'Nova', 'Nexus', 'Haven', 'Outpost', 'Station',
+)
+STATION_TECH_LEVELS = {'Military': 5, 'Industrial': 4, 'Commercial': 3}
+
+_MASK32 = 0xFFFFFFFF
+
+
+def _imul(a, b):
+    return (a * b) & _MASK32
+
+
+def js_round(value):
+    """Math.round: halves go up, not to even"""
+    return math.floor(value + 0.5)
+
+
+class SeededRandom:
+    """Mulberry32 exactly as Utils.SeededRandom, so seeds give the same galaxy
+    in the browser and here. All arithmetic is kept in unsigned 32 bits,
+    which matches JS's ToInt32 wrap-around for every operation used."""
+
+    def __init__(self, seed):
+        if isinstance(seed, str):
+            h = 0
+            for unit in _utf16_units(seed):
+                h = (((h << 5) - h) + unit) & _MASK32
+            if h >= 0x80000000:
+                h -= 0x100000000
+            self.seed = abs(h)
+        else:
+            self.seed = abs(int(seed)) or 1
+        self.counter = 0
+
+    def next(self):
+        self.counter += 1
+        t = (self.seed + self.counter) & _MASK32
+        t = _imul(t ^ (t >> 15), t | 1)
+        t ^= (t + _imul(t ^ (t >> 7), t | 61)) & _MASK32
+        return ((t ^ (t >> 14)) & _MASK32) / 4294967296
+
+    def int(self, low, high):
+        return math.floor(self.next() * (high - low + 1)) + low
+
+    def float(self, low, high):
+        return self.next() * (high - low) + low
+
+    def choice(self, items):
+        if not items:
+            return None
+        return items[math.floor(self.next() * len(items))]
+
+    def chance(self, probability):
+        return self.next() < probability
+
+
+def _utf16_units(text):
+    for ch in text:
+        code = ord(ch)
+        if code > 0xFFFF:
+            code -= 0x10000
+            yield 0xD800 + (code >> 10)
+            yield 0xDC00 + (code & 0x3FF)
+        else:
+            yield code
+
+
+def generate_seed():
+    """Same shape as Utils.generateId(): '<ms>-<9 base36 chars>'"""
+    alphabet = string.digits + string.ascii_lowercase
+    return f"{int(time.time() * 1000)}-{''.join(secrets.choice(alphabet) for _ in range(9))}"
+
+
+class Galaxy:
+    """Sector data as parallel arrays indexed by sector id (index 0 unused).
+
+    `warps[i]` keeps the order galaxy.js pushes them in; `contents[i]` is
+    the list of planet/station/debris dicts for sector i.
+    """
+
+    __slots__ = ('seed', 'size', 'created', 'x', 'y', 'warps', 'contents')
+
+    def __init__(self, seed, size, created, x, y, warps, contents):
+        self.seed = seed
+        self.size = size
+        self.created = created
+        self.x = x
+        self.y = y
+        self.warps = warps
+        self.contents = contents
+
+    def distance(self, a, b):
+        return math.sqrt((self.x[b] - self.x[a]) ** 2 + (self.y[b] - self.y[a]) ** 2)
+
+    def sector(self, sector_id):
+        """One sector in the galaxy.js shape"""
+        return {'id': sector_id, 'x': self.x[sector_id], 'y': self.y[sector_id],
+                'warps': list(self.warps[sector_id]), 'contents': self.contents[sector_id]}
+
+    def to_legacy(self):
+        """The full `galaxy.data` object galaxy.js builds (large; for tooling)"""
+        return {'size': self.size, 'seed': self.seed, 'created': self.created,
+                'sectors': {i: self.sector(i) for i in range(1, self.size + 1)}}
+
+    def map_snapshot(self):
+        """Topology and coordinates: CSR warp arrays, sector ids 1..size"""
+        offsets = [0]
+        flat = []
+        for i in range(1, self.size + 1):
+            flat.extend(self.warps[i])
+            offsets.append(len(flat))
+        return {
+            'v': FORMAT_VERSION,
+            'seed': self.seed,
+            'size': self.size,
+            'created': self.created,
+            'x': [round(v, 3) for v in self.x[1:]],
+            'y': [round(v, 3) for v in self.y[1:]],
+            'warpOffsets': offsets,
+            'warps': flat,
+        }
+
+    def contents_snapshot(self):
+        """Sparse sector contents: {sectorId: [content, ...]} for non-empty sectors"""
+        return {'v': FORMAT_VERSION,
+                'contents': {str(i): c for i, c in enumerate(self.contents) if c}}
+
+    def to_record(self):
+        """Full-precision form kept in the galaxies table"""
+        return {'x': self.x[1:], 'y': self.y[1:],
+                'warps': self.warps[1:], 'contents': self.contents[1:]}
+
+    @classmethod
+    def from_record(cls, seed, size, created, record):
+        return cls(seed, size, created, [0.0] + record['x'], [0.0] + record['y'],
+                   [[]] + record['warps'], [[]] + record['contents'])
+
+    def stats(self):
+        kinds = [{c['type'] for c in contents} for contents in self.contents[1:]]
+        return {
+            'totalSectors': self.size,
+            'planetsCount': sum('planet' in k for k in kinds),
+            'stationsCount': sum('station' in k for k in kinds),
+            'debrisCount': sum('debris' in k for k in kinds),
+            'emptySectors': sum(not k for k in kinds),
+            'averageConnections': sum(len(w) for w in self.warps[1:]) / self.size,
+        }
+
+
+# ============================================
+# GENERATION (mirrors js/galaxy.js step by step)
+# ============================================
+
+def generate(size=DEFAULT_SIZE, seed=None, created=None):
+    """Galaxy for (size, seed); identical to Galaxy.generate() in the client"""
+    seed = seed or generate_seed()
+    rng = SeededRandom(seed)
+    x = [0.0] * (size + 1)
+    y = [0.0] * (size + 1)
+    contents = [[] for _ in range(size + 1)]
+    for i in range(1, size + 1):
+        x[i] = rng.float(0, 100)
+        y[i] = rng.float(0, 100)
+        contents[i] = _create_contents(rng)
+
+    _embed_lore(contents, size, rng)
+    galaxy = Galaxy(seed, size, int(time.time() * 1000) if created is None else created, x, y,
+                    [[] for _ in range(size + 1)], contents)
+    _connect_sectors(galaxy, rng)
+    return galaxy
+
+
+def _create_contents(rng):
+    contents = []
+    if rng.chance(PLANET_CHANCE):
+        contents.append(_generate_planet(rng))
+    if rng.chance(STATION_CHANCE):
+        contents.append(_generate_station(rng))
+    if rng.chance(0.2) and not contents:
+        contents.append({'type': 'debris', 'name': 'Asteroid Field',
+                         'description': 'Scattered asteroids that could be mined for resources'})
+    return contents
+
+
+def _generate_planet(rng):
+    planet_type, specialty = rng.choice(PLANET_TYPES)
+    planet = {
+        'type': 'planet',
+        'name': f'{rng.choice(PLANET_NAMES)} {rng.int(1, 999)}',
+        'planetType': planet_type,
+        'specialty': specialty,
+        'economy': {},
+        'population': rng.int(1000, 1000000),
+        'techLevel': rng.int(1, 10),
+        'messageBoard': True,
+    }
+    for commodity in COMMODITIES:
+        if commodity == 'Contraband':
+            continue
+        base = BASE_PRICES[commodity]
+        if commodity == specialty:
+            planet['economy'][commodity] = {'buyPrice': js_round(base * 0.7),
+                                            'sellPrice': js_round(base * 0.5),
+                                            'supply': rng.int(500, 2000)}
+        else:
+            planet['economy'][commodity] = {'buyPrice': js_round(base * 3.0),
+                                            'sellPrice': js_round(base * 1.4),
+                                            'supply': 0}
+    return planet
+
+
+def _generate_station(rng):
+    kind = rng.choice(STATION_TYPES)
+    station = {
+        'type': 'station',
+        'class': kind['class'],
+        'icon': kind['icon'],
+        'name': f"{kind['class']} {rng.choice(STATION_NAMES)} {rng.int(1, 99)}",
+        'description': kind['description'],
+        'specialties': list(kind['specialties']),
+        'services': list(kind['services']),
+        'repairCost': kind['repairCost'],
+        'refuelCost': kind['refuelCost'],
+        'tradingBonus': kind['tradingBonus'],
+        'hidden': kind.get('hidden', False),
+        'defended': kind.get('defended', False),
+        'messageBoard': True,
+        'economy': {},
+    }
+    if 'trade' in kind['services']:
+        commodities = list(dict.fromkeys(kind['specialties'] + ['Ore', 'Organics', 'Equipment']))
+        if kind['class'] == 'Black Market':
+            commodities.append('Contraband')
+        for commodity in commodities:
+            price = BASE_PRICES[commodity]
+            is_specialty = commodity in kind['specialties']
+            if is_specialty:
+                price *= 0.85
+            price *= (2 - kind['tradingBonus'])
+            price *= (0.9 + rng.float(0, 1) * 0.2)
+            price = js_round(price)
+            supply = math.floor(rng.float(0, 1) * 80) + 20
+            if is_specialty:
+                supply *= 2
+            station['economy'][commodity] = {
+                'buyPrice': price,
+                'sellPrice': js_round(price * (0.9 if is_specialty else 0.8)),
+                'supply': supply,
+            }
+    station['planetType'] = kind['class']
+    station['techLevel'] = STATION_TECH_LEVELS.get(kind['class'], 2)
+    return station
+
+
+def _embed_lore(contents, size, rng):
+    def set_sector(sector_id, data):
+        if sector_id > size:
+            return
+        contents[sector_id] = []
+        if data['type'] == 'planet':
+            planet = _generate_planet(rng)
+            planet['name'] = data['name']
+            planet['planetType'] = data.get('planetType') or planet['planetType']
+            if data.get('description'):
+                planet['description'] = data['description']
+            if data.get('specialty'):
+                planet['specialty'] = data['specialty']
+            contents[sector_id].append(planet)
+        else:
+            station = _generate_station(rng)
+            station['name'] = data['name']
+            station['class'] = data.get('class') or station['class']
+            if data.get('description'):
+                station['description'] = data['description']
+            contents[sector_id].append(station)
+
+    set_sector(1, {'name': 'Earth (Sol)', 'type': 'planet', 'planetType': 'Terran',
+                   'specialty': 'Equipment',
+                   'description': 'The cradle of humanity. Home of the Federation.'})
+    set_sector(5, {'name': 'Babylon 5', 'type': 'station', 'class': 'Diplomatic',
+                   'description': 'A diplomatic hub. The last best hope for peace.'})
+    desert_id = rng.int(10, size)
+    set_sector(desert_id, {'name': 'Tatooine', 'type': 'planet', 'planetType': 'Desert',
+                           'specialty': 'Ore',
+                           'description': 'A harsh desert world with twin suns. Hazardous.'})
+    caprica_id = rng.int(10, size)
+    if caprica_id != desert_id:
+        set_sector(caprica_id, {'name': 'Caprica', 'type': 'planet', 'planetType': 'Urban',
+                                'specialty': 'Equipment',
+                                'description': 'A high-tech colony world. Beware of cylons.'})
+    set_sector(2, {'name': 'Stardock', 'type': 'station', 'class': 'Shipyard',
+                   'description': 'Major fleet manufacturing facility.'})
+    borg_id = rng.int(math.floor(size * 0.8), size)
+    contents[borg_id].append({'type': 'debris', 'name': 'Borg Debris Field',
+                              'description': 'Remnants of a cubic vessel. Resistance was futile.'})
+    set_sector(42, {'name': 'Magrathea', 'type': 'planet', 'planetType': 'Industrial',
+                    'specialty': 'Luxury',
+                    'description': 'Ancient planet-building facility. Currently closed for recession.'})
+    gate_id = rng.int(5, size)
+    contents[gate_id].append({'type': 'anomaly', 'name': "Chappa'ai (Stargate)",
+                              'description': 'An ancient ring device of unknown origin.'})
+
+
+def _connect_sectors(galaxy, rng):
+    """Spanning tree, then ~size/2 random short extra warps.
+
+    galaxy.js rescans every (visited, unvisited) pair per step, O(n^3);
+    this is Prim's algorithm with the same tie-breaking (earliest visited
+    sector, then lowest unvisited id), so the tree is identical in O(n^2).
+    """
+    size = galaxy.size
+    xs, ys, warps = galaxy.x, galaxy.y, galaxy.warps
+    sqrt = math.sqrt
+    # Per unvisited sector: distance to, and visit rank of, its nearest visited sector
+    best_dist = [math.inf] * (size + 1)
+    best_rank = [0] * (size + 1)
+    best_from = [0] * (size + 1)
+    unvisited = list(range(2, size + 1))
+    latest, rank = 1, 0
+    while unvisited:
+        lx, ly = xs[latest], ys[latest]
+        pick_index, pick_dist = -1, math.inf
+        for index, uid in enumerate(unvisited):
+            dist = sqrt((xs[uid] - lx) ** 2 + (ys[uid] - ly) ** 2)
+            if dist < best_dist[uid]:
+                best_dist[uid] = dist
+                best_rank[uid] = rank
+                best_from[uid] = latest
+            else:
+                dist = best_dist[uid]
+            if dist < pick_dist:
+                pick_index, pick_dist = index, dist
+            elif dist == pick_dist:
+                # Ties: earlier visited sector first (kept by the strict < above), then lowest id
+                other = unvisited[pick_index]
+                if (best_rank[uid], uid) < (best_rank[other], other):
+                    pick_index = index
+        pick = unvisited[pick_index]
+        unvisited[pick_index] = unvisited[-1]
+        unvisited.pop()
+        _add_warp(warps, best_from[pick], pick)
+        latest, rank = pick, rank + 1
+
+    for _ in range(math.floor(size * 0.5)):
+        id1 = rng.choice(range(1, size + 1))
+        id2 = rng.choice(range(1, size + 1))
+        if id1 != id2 and id2 not in warps[id1] and galaxy.distance(id1, id2) < EXTRA_WARP_DISTANCE:
+            _add_warp(warps, id1, id2)
+
+
+def _add_warp(warps, a, b):
+    if b not in warps[a]:
+        warps[a].append(b)
+    if a not in warps[b]:
+        warps[b].append(a)
+
+
+# ============================================
+# SPATIAL INDEX
+# ============================================
+
+class SpatialGrid:
+    """Uniform grid over sector x/y: `dims` x `dims` cells, about
+    SECTORS_PER_CELL sectors each, so a region lookup touches only the
+    cells under its bounding box instead of every sector."""
+
+    def __init__(self, galaxy, per_cell=SECTORS_PER_CELL):
+        self.dims = max(1, math.ceil(math.sqrt(galaxy.size / per_cell)))
+        self.cell_size = MAP_EXTENT / self.dims
+        self.cells = [[] for _ in range(self.dims * self.dims)]
+        for sector_id in range(1, galaxy.size + 1):
+            cx, cy = self.cell_of(galaxy.x[sector_id], galaxy.y[sector_id])
+            self.cells[cy * self.dims + cx].append(sector_id)
+
+    def cell_of(self, x, y):
+        last = self.dims - 1
+        return (min(last, max(0, int(x / self.cell_size))),
+                min(last, max(0, int(y / self.cell_size))))
+
+    def cell_range(self, x, y, radius):
+        """(cx0, cy0, cx1, cy1), inclusive: the cell holding (x, y) plus
+        enough rings of neighbours to cover the circle. Depends only on the
+        center's cell, so every center in one cell gets the same range."""
+        cx, cy = self.cell_of(x, y)
+        rings = math.ceil(radius / self.cell_size)
+        last = self.dims - 1
+        return (max(0, cx - rings), max(0, cy - rings),
+                min(last, cx + rings), min(last, cy + rings))
+
+    def sectors_in(self, cell_range):
+        cx0, cy0, cx1, cy1 = cell_range
+        ids = []
+        for cy in range(cy0, cy1 + 1):
+            row = cy * self.dims
+            for cx in range(cx0, cx1 + 1):
+                ids.extend(self.cells[row + cx])
+        ids.sort()
+        return ids
+
+
+# ============================================
+# STORAGE AND SNAPSHOTS
+# ============================================
+
+def create_tables(c):
+    """One row per generated galaxy; the highest id is the live one"""
+    c.execute('''CREATE TABLE IF NOT EXISTS galaxies (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        seed TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        format INTEGER NOT NULL,
+        data TEXT NOT NULL,
+        created_ms INTEGER NOT NULL,
+        created_by TEXT
+    )''')
+
+
+def _encode(payload):
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+class SnapshotPart:
+    """Immutable response body with its gzip variant and strong ETag"""
+
+    __slots__ = ('body', 'gzipped', 'etag')
+
+    def __init__(self, body):
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+
+
+class Snapshot:
+    """One galaxy version: the engine object plus its encoded parts"""
+
+    def __init__(self, version, galaxy, routing_precompute_max=2000):
+        self.version = version
+        self.galaxy = galaxy
+        self._grid = None
+        self.routing = RoutingIndex(galaxy, precompute_max=routing_precompute_max)
+        self.parts = {
+            'map': SnapshotPart(_encode(dict(galaxy.map_snapshot(), version=version))),
+            'contents': SnapshotPart(_encode(dict(galaxy.contents_snapshot(), version=version))),
+        }
+
+    @property
+    def grid(self):
+        # Built on first region request; a racing duplicate build is harmless
+        if self._grid is None:
+            self._grid = SpatialGrid(self.galaxy)
+        return self._grid
+
+    def sectors_body(self, ids):
+        """JSON for the given sector ids in the galaxy.js sector shape"""
+        return _encode({'version': self.version,
+                        'sectors': [self.galaxy.sector(i) for i in ids]})
+
+    def region(self, center_id, radius):
+        """Cell range around a sector and a lazy body with every sector in it.
+
+        The range is snapped to grid cells, so nearby centers share one
+        response (and one ETag) and clients get a superset of the circle.
+        """
+        galaxy = self.galaxy
+        cell_range = self.grid.cell_range(galaxy.x[center_id], galaxy.y[center_id], radius)
+
+        def body():
+            return _encode({
+                'version': self.version,
+                'cellSize': self.grid.cell_size,
+                'cells': list(cell_range),
+                'sectors': [galaxy.sector(i) for i in self.grid.sectors_in(cell_range)],
+            })
+        return cell_range, body
+
+    def describe(self):
+        return {
+            'version': self.version,
+            'format': FORMAT_VERSION,
+            'seed': self.galaxy.seed,
+            'size': self.galaxy.size,
+            'created': self.galaxy.created,
+            'mapUrl': f'/api/galaxy/{self.version}/map',
+            'contentsUrl': f'/api/galaxy/{self.version}/contents',
+            'mapBytes': len(self.parts['map'].gzipped),
+            'contentsBytes': len(self.parts['contents'].gzipped),
+        }
+
+
+class GalaxyBusy(Exception):
+    """Another galaxy is being generated"""
+
+
+class GalaxyStore:
+    """Current galaxy kept in memory, older versions loaded on demand.
+
+    A version is never modified once written, so its URLs can be cached
+    forever; only GET /api/galaxy (which names the current version) has
+    to be revalidated.
+    """
+
+    def __init__(self, pool, routing_precompute_max=2000):
+        self.pool = pool
+        self.routing_precompute_max = routing_precompute_max
+        self._lock = threading.Lock()
+        self._generating = threading.Lock()
+        self._current = None
+        self._loaded = False
+        self._recent = {}  # version -> Snapshot, for clients still on an old version
+        self._generated_total = 0
+        self._served = {'map': 0, 'contents': 0}
+        self._partial_served = 0
+        self._partial_not_modified = 0
+
+    def current(self):
+        with self._lock:
+            if self._loaded:
+                return self._current
+        with self.pool.connection() as conn:
+            row = conn.execute('''SELECT id, seed, size, created_ms, data FROM galaxies
+                                  ORDER BY id DESC LIMIT 1''').fetchone()
+        snapshot = self._snapshot_from_row(row) if row else None
+        with self._lock:
+            if not self._loaded:
+                self._current, self._loaded = snapshot, True
+            return self._current
+
+    def get(self, version):
+        """Snapshot for a version (None if it was never generated)"""
+        current = self.current()
+        if current is not None and current.version == version:
+            return current
+        with self._lock:
+            if version in self._recent:
+                return self._recent[version]
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT id, seed, size, created_ms, data FROM galaxies WHERE id = ?',
+                               (version,)).fetchone()
+        if row is None:
+            return None
+        snapshot = self._snapshot_from_row(row)
+        with self._lock:
+            if len(self._recent) >= 4:
+                self._recent.pop(next(iter(self._recent)))
+            self._recent[version] = snapshot
+        return snapshot
+
+    def generate(self, size, seed=None, created_by=None):
+        """Generate, persist and publish a new galaxy; returns its Snapshot"""
+        if not self._generating.acquire(blocking=False):
+            raise GalaxyBusy('A galaxy is already being generated')
+        try:
+            galaxy = generate(size, seed)
+            with self.pool.connection() as conn:
+                cursor = conn.execute('''INSERT INTO galaxies (seed, size, format, data, created_ms, created_by)
+                                         VALUES (?, ?, ?, ?, ?, ?)''',
+                                      (galaxy.seed, galaxy.size, FORMAT_VERSION,
+                                       json.dumps(galaxy.to_record(), separators=(',', ':')),
+                                       galaxy.created, created_by))
+                conn.commit()
+                version = cursor.lastrowid
+            snapshot = Snapshot(version, galaxy, self.routing_precompute_max)
+            snapshot.routing.start_precompute()
+            with self._lock:
+                previous = self._current
+                if previous is not None:
+                    self._recent[previous.version] = previous
+                    while len(self._recent) > 4:
+                        self._recent.pop(next(iter(self._recent)))
+                self._current, self._loaded = snapshot, True
+                self._generated_total += 1
+            return snapshot
+        finally:
+            self._generating.release()
+
+    def _snapshot_from_row(self, row):
+        version, seed, size, created_ms, data = row
+        snapshot = Snapshot(version, Galaxy.from_record(seed, size, created_ms, json.loads(data)),
+                            self.routing_precompute_max)
+        snapshot.routing.start_precompute()
+        return snapshot
+
+    def response(self, snapshot, part, request):
+        """Immutable, conditional, gzip-aware response for one snapshot part"""
+        item = snapshot.parts[part]
+        gzipped = request.accept_encodings['gzip'] > 0
+        response = Response(item.gzipped if gzipped else item.body, mimetype='application/json')
+        response.set_etag(item.etag + ('-gzip' if gzipped else ''))
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+        response.vary.add('Accept-Encoding')
+        if gzipped:
+            response.content_encoding = 'gzip'
+        response.make_conditional(request)
+        with self._lock:
+            self._served[part] += 1
+        return response
+
+    def partial_response(self, etag, build_body, request, pinned):
+        """Response for a computed subset (sectors or region) of a version.
+
+        The ETag is derived from the version and the request shape, so a
+        matching If-None-Match is answered without building the body; as
+        with the snapshot parts, the gzip body's ETag ends in `-gzip`, and
+        either form matches. Pinned (?version=) responses never change and
+        are cached like the snapshot parts; unpinned ones follow the
+        current version and are revalidated.
+        """
+        matched = next((tag for tag in (etag, etag + '-gzip') if tag in request.if_none_match), None)
+        if matched:
+            response = Response(status=304)
+            response.set_etag(matched)
+            with self._lock:
+                self._partial_not_modified += 1
+        else:
+            body = build_body()
+            gzipped = len(body) >= 1024 and request.accept_encodings['gzip'] > 0
+            response = Response(gzip.compress(body, compresslevel=6, mtime=0) if gzipped else body,
+                                mimetype='application/json')
+            response.set_etag(etag + ('-gzip' if gzipped else ''))
+            if gzipped:
+                response.content_encoding = 'gzip'
+            with self._lock:
+                self._partial_served += 1
+        response.vary.add('Accept-Encoding')
+        if pinned:
+            response.cache_control.public = True
+            response.cache_control.max_age = 31536000
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response
+
+    def stats(self):
+        with self._lock:
+            current = self._current
+            return {
+                'version': current.version if current else None,
+                'size': current.galaxy.size if current else None,
+                'generatedTotal': self._generated_total,
+                'olderVersionsCached': len(self._recent),
+                'mapServed': self._served['map'],
+                'contentsServed': self._served['contents'],
+                'partialServed': self._partial_served,
+                'partialNotModified': self._partial_not_modified,
+                'routing': current.routing.stats() if current else None,
+            }
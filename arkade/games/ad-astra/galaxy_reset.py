@@ -0,0 +1,211 @@
+"""
+Ad Astra - Galaxy Reset Job
+Resets every non-admin player to the starting values in id-ordered
+chunks, one short transaction per chunk, resumable after a restart
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+
+log = logging.getLogger('adastra.reset')
+
+# Columns plus the copies the client keeps in game_state. The ship's
+# current and max values both get the starting stat.
+RESET_SQL = '''UPDATE players SET
+    credits = :credits,
+    turns = :turns,
+    current_sector = :sector,
+    cargo = '{}',
+    equipment = '{}',
+    game_state = json_set(
+        CASE WHEN json_valid(game_state) AND json_type(game_state) = 'object' THEN game_state ELSE '{}' END,
+        '$.credits', :credits,
+        '$.turns', :turns,
+        '$.currentSector', :sector,
+        '$.cargo', json('{}'),
+        '$.ship.hull', :hull, '$.ship.hullMax', :hull,
+        '$.ship.shields', :shields, '$.ship.shieldsMax', :shields,
+        '$.ship.fuel', :fuel, '$.ship.fuelMax', :fuel),
+    version = version + 1
+    WHERE id BETWEEN :first AND :last
+      AND account_id IN (SELECT id FROM accounts WHERE is_admin = 0)'''
+
+JOB_COLUMNS = '''id, status, settings, last_player_id, max_player_id, total, processed,
+                 started_by, started_at, updated_at, finished_at, error'''
+
+
+class ResetBusy(Exception):
+    """A reset job is already running"""
+
+
+def create_tables(c):
+    """One row per reset; `last_player_id` is the resume point"""
+    c.execute('''CREATE TABLE IF NOT EXISTS reset_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        status TEXT NOT NULL,
+        settings TEXT NOT NULL,
+        last_player_id INTEGER NOT NULL DEFAULT 0,
+        max_player_id INTEGER NOT NULL,
+        total INTEGER NOT NULL,
+        processed INTEGER NOT NULL DEFAULT 0,
+        started_by TEXT,
+        started_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        finished_at TEXT,
+        error TEXT
+    )''')
+
+
+class GalaxyReset:
+    """Runs reset jobs on a background thread.
+
+    Each chunk of `chunk_size` players is reset and the job's progress
+    recorded in the same transaction, with a short pause between chunks
+    so autosaves get the write lock in between. Players who register
+    after the job starts are left alone (ids above max_player_id). A job
+    interrupted by a shutdown stays 'running' in reset_jobs and is picked
+    up again by resume().
+    """
+
+    def __init__(self, pool, chunk_size=500, pause=0.02):
+        self.pool = pool
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, settings, started_by=None):
+        """Start a reset with `settings` (game_settings key -> int), or
+        continue an interrupted one with the settings it started with;
+        returns its status"""
+        with self._lock:
+            if self.running:
+                raise ResetBusy('A galaxy reset is already running')
+            with self.pool.connection() as conn:
+                row = conn.execute("SELECT id FROM reset_jobs WHERE status = 'running' "
+                                   'ORDER BY id DESC LIMIT 1').fetchone()
+                if row:
+                    job_id = row[0]
+                    log.info('Resuming galaxy reset job %s', job_id)
+                else:
+                    max_id, total = conn.execute('''SELECT COALESCE(MAX(p.id), 0), COUNT(*) FROM players p
+                                                    JOIN accounts a ON a.id = p.account_id
+                                                    WHERE a.is_admin = 0''').fetchone()
+                    now = datetime.now().isoformat()
+                    job_id = conn.execute('''INSERT INTO reset_jobs
+                                             (status, settings, max_player_id, total, started_by, started_at, updated_at)
+                                             VALUES ('running', ?, ?, ?, ?, ?, ?)''',
+                                          (json.dumps(settings), max_id, total, started_by, now, now)).lastrowid
+                    conn.commit()
+                    log.info('Galaxy reset job %s started by %s: %s players', job_id, started_by, total)
+            self._launch(job_id)
+        return self.status(job_id)
+
+    def resume(self):
+        """Continue a job left 'running' by a previous process, if any"""
+        with self._lock:
+            if self.running:
+                return None
+            with self.pool.connection() as conn:
+                row = conn.execute("SELECT id FROM reset_jobs WHERE status = 'running' "
+                                   'ORDER BY id DESC LIMIT 1').fetchone()
+            if row is None:
+                return None
+            log.info('Resuming galaxy reset job %s', row[0])
+            self._launch(row[0])
+        return self.status(row[0])
+
+    def _launch(self, job_id):
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, args=(job_id,), name='galaxy-reset', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop after the current chunk; the job stays resumable"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+
+    def _run(self, job_id):
+        try:
+            self._process(job_id)
+        except Exception as e:
+            log.error('Galaxy reset job %s failed: %s', job_id, e)
+            with self.pool.connection() as conn:
+                conn.execute('''UPDATE reset_jobs SET status = 'failed', error = ?, updated_at = ?, finished_at = ?
+                                WHERE id = ?''', (str(e), datetime.now().isoformat(), datetime.now().isoformat(), job_id))
+                conn.commit()
+
+    def _process(self, job_id):
+        with self.pool.connection() as conn:
+            settings, last_id, max_id = conn.execute(
+                'SELECT settings, last_player_id, max_player_id FROM reset_jobs WHERE id = ?', (job_id,)).fetchone()
+        settings = json.loads(settings)
+        params = {
+            'credits': settings['starting_credits'],
+            'turns': settings['starting_turns'],
+            'sector': settings['starting_sector'],
+            'hull': settings['starting_hull'],
+            'shields': settings['starting_shields'],
+            'fuel': settings['starting_fuel'],
+        }
+
+        while not self._stopping.is_set():
+            with self.pool.connection() as conn:
+                ids = [row[0] for row in conn.execute('''SELECT p.id FROM players p
+                                                         JOIN accounts a ON a.id = p.account_id
+                                                         WHERE a.is_admin = 0 AND p.id > ? AND p.id <= ?
+                                                         ORDER BY p.id LIMIT ?''',
+                                                      (last_id, max_id, self.chunk_size))]
+                now = datetime.now().isoformat()
+                if not ids:
+                    conn.execute('''UPDATE reset_jobs SET status = 'done', updated_at = ?, finished_at = ?
+                                    WHERE id = ?''', (now, now, job_id))
+                    conn.commit()
+                    log.info('Galaxy reset job %s finished', job_id)
+                    return
+                changed = conn.execute(RESET_SQL, {**params, 'first': ids[0], 'last': ids[-1]}).rowcount
+                conn.execute('''UPDATE reset_jobs SET last_player_id = ?, processed = processed + ?, updated_at = ?
+                                WHERE id = ?''', (ids[-1], changed, now, job_id))
+                conn.commit()
+            last_id = ids[-1]
+            time.sleep(self.pause)
+        log.info('Galaxy reset job %s paused at player id %s', job_id, last_id)
+
+    def status(self, job_id=None):
+        """Progress of one job (default: the latest), or None"""
+        query = f'SELECT {JOB_COLUMNS} FROM reset_jobs '
+        with self.pool.connection() as conn:
+            if job_id is None:
+                row = conn.execute(query + 'ORDER BY id DESC LIMIT 1').fetchone()
+            else:
+                row = conn.execute(query + 'WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        (job_id, status, settings, last_id, max_id, total, processed,
+         started_by, started_at, updated_at, finished_at, error) = row
+        return {
+            'id': job_id,
+            'status': status,
+            'active': status == 'running' and self.running,
+            'total': total,
+            'processed': processed,
+            'percent': round(100.0 * processed / total, 1) if total else 100.0,
+            'lastPlayerId': last_id,
+            'maxPlayerId': max_id,
+            'settings': json.loads(settings),
+            'startedBy': started_by,
+            'startedAt': started_at,
+            'updatedAt': updated_at,
+            'finishedAt': finished_at,
+            'error': error
+        }
@@ -0,0 +1,143 @@
+"""
+Ad Astra - Game Settings
+Typed, in-process copy of the sysop-configurable game_settings table,
+loaded once and replaced atomically whenever an admin changes it
+"""
+
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+log = logging.getLogger('adastra.settings')
+
+Setting = namedtuple('Setting', 'key api_key default minimum maximum')
+
+# Every sysop setting: game_settings key, API name, default and allowed range
+SETTINGS = (
+    Setting('starting_sector', 'startingSector', 1, 1, 100000),
+    Setting('starting_credits', 'startingCredits', 10000, 0, 1000000000),
+    Setting('starting_turns', 'startingTurns', 50, 0, 100000),
+    Setting('starting_fuel', 'startingFuel', 100, 0, 100000),
+    Setting('starting_hull', 'startingHull', 100, 1, 100000),
+    Setting('starting_shields', 'startingShields', 100, 0, 100000),
+)
+BY_API_KEY = {setting.api_key: setting for setting in SETTINGS}
+
+# What readers see: replaced as one object, never mutated
+Published = namedtuple('Published', 'values version etag')
+
+
+class SettingsError(ValueError):
+    """A setting value that is not an integer in its range"""
+
+
+def create_tables(c):
+    """game_settings plus any missing defaults"""
+    c.execute('''CREATE TABLE IF NOT EXISTS game_settings (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )''')
+    c.executemany('INSERT OR IGNORE INTO game_settings (key, value) VALUES (?, ?)',
+                  [(setting.key, str(setting.default)) for setting in SETTINGS])
+
+
+def _coerce(setting, value):
+    """int value within range; raises SettingsError"""
+    if isinstance(value, bool):
+        raise SettingsError(f'{setting.api_key} must be an integer')
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise SettingsError(f'{setting.api_key} must be an integer')
+    if isinstance(value, float) and number != value:
+        raise SettingsError(f'{setting.api_key} must be an integer')
+    if not setting.minimum <= number <= setting.maximum:
+        raise SettingsError(f'{setting.api_key} must be between {setting.minimum} and {setting.maximum}')
+    return number
+
+
+class GameSettings:
+    """Read-mostly settings cache.
+
+    `current` holds an immutable mapping of game_settings key -> int with
+    its version and ETag, swapped as one object on load()/update(), so
+    readers never see a half applied change and never touch the
+    database. The version goes up on every change; the ETag also covers
+    the values, so it stays stable across restarts when nothing changed.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._lock = threading.Lock()
+        defaults = {setting.key: setting.default for setting in SETTINGS}
+        self.current = Published(MappingProxyType(defaults), 0, self._etag(defaults))
+        self._reads = 0
+
+    @property
+    def values(self):
+        return self.current.values
+
+    @property
+    def version(self):
+        return self.current.version
+
+    @staticmethod
+    def _etag(values):
+        text = ','.join(f'{key}={values[key]}' for key in sorted(values))
+        return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+    def _read(self, conn):
+        stored = dict(conn.execute('SELECT key, value FROM game_settings').fetchall())
+        values = {}
+        for setting in SETTINGS:
+            try:
+                values[setting.key] = _coerce(setting, stored.get(setting.key, setting.default))
+            except SettingsError:
+                log.warning('Bad game_settings value %s=%r, using %s', setting.key,
+                            stored.get(setting.key), setting.default)
+                values[setting.key] = setting.default
+        return values
+
+    def _publish(self, values):
+        self.current = Published(MappingProxyType(values), self.current.version + 1, self._etag(values))
+
+    def load(self):
+        """(Re)read the table, e.g. after editing it by hand"""
+        with self._lock:
+            with self.pool.connection() as conn:
+                values = self._read(conn)
+            self._reads += 1
+            self._publish(values)
+        return self.values
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def to_api(self, values=None):
+        """camelCase view for the admin API"""
+        values = self.values if values is None else values
+        return {setting.api_key: values[setting.key] for setting in SETTINGS}
+
+    def update(self, changes):
+        """Validate and store `changes` ({apiKey: value}, other keys are
+        ignored); returns the api keys written. Nothing is written if any
+        value is invalid."""
+        written = [key for key in changes if key in BY_API_KEY]
+        rows = [(BY_API_KEY[key].key, str(_coerce(BY_API_KEY[key], changes[key]))) for key in written]
+        if not rows:
+            return []
+        with self._lock:
+            with self.pool.connection() as conn:
+                conn.executemany('INSERT OR REPLACE INTO game_settings (key, value) VALUES (?, ?)', rows)
+                conn.commit()
+                values = self._read(conn)
+            self._reads += 1
+            self._publish(values)
+        log.info('Game settings v%s: %s', self.version, ', '.join(f'{k}={v}' for k, v in rows))
+        return written
+
+    def stats(self):
+        current = self.current
+        return {'version': current.version, 'etag': current.etag, 'tableReads': self._reads}
@@ -341,6 +341,44 @@ export class Galaxy {
         return this.data;
     }
 
+    // Build galaxy data from a server snapshot (GET /api/galaxy/<version>/map
+    // and /contents): parallel x/y arrays plus CSR warps, sector ids 1..size
+    loadSnapshot(map, contents = null) {
+        const sectors = {};
+        for (let i = 1; i <= map.size; i++) {
+            sectors[i] = {
+                id: i,
+                x: map.x[i - 1],
+                y: map.y[i - 1],
+                warps: map.warps.slice(map.warpOffsets[i - 1], map.warpOffsets[i]),
+                contents: (contents && contents.contents[i]) || []
+            };
+        }
+
+        this.data = {
+            size: map.size,
+            sectors: sectors,
+            seed: map.seed,
+            version: map.version,
+            created: map.created
+        };
+
+        Utils.storage.set('galaxy', this.data);
+        return this.data;
+    }
+
+    // Merge sectors from GET /api/galaxy/sectors or /api/galaxy/region
+    // (lazy loading of large galaxies: only neighbourhoods the pilot visits)
+    mergeSectors(response) {
+        if (!this.data || this.data.version !== response.version) {
+            this.data = { size: null, sectors: {}, version: response.version };
+        }
+        for (const sector of response.sectors) {
+            this.data.sectors[sector.id] = sector;
+        }
+        return this.data;
+    }
+
     // Get sector by ID
     getSector(id) {
         return this.data?.sectors[id] || null;
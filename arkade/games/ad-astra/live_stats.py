@@ -0,0 +1,145 @@
+"""
+Ad Astra - Live Dashboard Stats
+In-memory counters kept current by the API write paths, plus a
+per-minute history of active players for the Sysop Station charts
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+
+RECENT_WINDOW_SECONDS = 10 * 60
+HISTORY_MINUTES = 24 * 60
+
+
+class LiveStats:
+    """Counters behind GET /api/admin/stats.
+
+    load() seeds everything from the database once; after that the
+    register/login/logout/kick/ban/delete/save paths report their changes
+    and reads are O(1). `recently active` is an LRU of account -> last
+    activity time trimmed from the old end, and every closed minute
+    appends its distinct active-player count to a 24h ring buffer.
+    """
+
+    def __init__(self, recent_window=RECENT_WINDOW_SECONDS, history_minutes=HISTORY_MINUTES):
+        self.recent_window = recent_window
+        self._lock = threading.Lock()
+        self._total_players = 0
+        self._total_sessions = 0
+        self._sessions_by_account = {}
+        self._recent = OrderedDict()  # account_id -> unix time, oldest first
+        self._minute = None
+        self._minute_active = set()
+        self._history = deque(maxlen=history_minutes)  # (minute_start_unix, active_players)
+        self.loaded_at = None
+
+    # -- seeding ---------------------------------------------------------
+
+    def load(self, conn):
+        """(Re)build counters from the database"""
+        c = conn.cursor()
+        c.execute('SELECT COUNT(*) FROM accounts WHERE is_admin = 0')
+        total_players = c.fetchone()[0]
+        c.execute('SELECT account_id, COUNT(*) FROM sessions GROUP BY account_id')
+        sessions = dict(c.fetchall())
+        cutoff = (datetime.now() - timedelta(seconds=self.recent_window)).isoformat()
+        c.execute('''SELECT account_id, last_activity FROM players
+                     WHERE last_activity > ? ORDER BY last_activity''', (cutoff,))
+        recent = OrderedDict()
+        for account_id, last_activity in c.fetchall():
+            try:
+                recent[account_id] = datetime.fromisoformat(last_activity).timestamp()
+            except ValueError:
+                continue
+
+        with self._lock:
+            self._total_players = total_players
+            self._sessions_by_account = sessions
+            self._total_sessions = sum(sessions.values())
+            self._recent = recent
+            self.loaded_at = time.time()
+
+    # -- write-path hooks ------------------------------------------------
+
+    def player_created(self):
+        with self._lock:
+            self._total_players += 1
+
+    def player_deleted(self, account_id, was_admin=False):
+        with self._lock:
+            if not was_admin:
+                self._total_players = max(0, self._total_players - 1)
+            self._recent.pop(account_id, None)
+        self.sessions_ended(account_id)
+
+    def session_started(self, account_id):
+        with self._lock:
+            self._sessions_by_account[account_id] = self._sessions_by_account.get(account_id, 0) + 1
+            self._total_sessions += 1
+
+    def sessions_ended(self, account_id, count=None):
+        """`count` sessions of an account went away (None = all of them)"""
+        with self._lock:
+            current = self._sessions_by_account.get(account_id, 0)
+            removed = current if count is None else min(count, current)
+            if current - removed > 0:
+                self._sessions_by_account[account_id] = current - removed
+            else:
+                self._sessions_by_account.pop(account_id, None)
+            self._total_sessions = max(0, self._total_sessions - removed)
+
+    def activity(self, account_id, now=None):
+        """A player saved / acted"""
+        now = now or time.time()
+        with self._lock:
+            self._roll_minute(now)
+            self._minute_active.add(account_id)
+            self._recent[account_id] = now
+            self._recent.move_to_end(account_id)
+
+    # -- reads -----------------------------------------------------------
+
+    def _roll_minute(self, now):
+        minute = int(now // 60) * 60
+        if self._minute is None:
+            self._minute = minute
+        elif minute != self._minute:
+            self._history.append((self._minute, len(self._minute_active)))
+            # Idle minutes in between count as zero
+            gap = min((minute - self._minute) // 60 - 1, self._history.maxlen)
+            for i in range(gap):
+                self._history.append((minute - (gap - i) * 60, 0))
+            self._minute = minute
+            self._minute_active = set()
+
+    def _trim_recent(self, now):
+        cutoff = now - self.recent_window
+        while self._recent:
+            account_id, seen = next(iter(self._recent.items()))
+            if seen > cutoff:
+                break
+            self._recent.popitem(last=False)
+
+    def snapshot(self):
+        now = time.time()
+        with self._lock:
+            self._roll_minute(now)
+            self._trim_recent(now)
+            return {
+                'totalPlayers': self._total_players,
+                'activeSessions': len(self._sessions_by_account),
+                'recentlyActive': len(self._recent),
+                'totalConnections': self._total_sessions
+            }
+
+    def history(self, minutes=HISTORY_MINUTES):
+        """Closed minutes plus the current partial one, oldest first"""
+        now = time.time()
+        with self._lock:
+            self._roll_minute(now)
+            points = list(self._history)[-minutes:] if minutes > 0 else []
+            points.append((self._minute, len(self._minute_active)))
+        return [{'minute': datetime.fromtimestamp(m).isoformat(), 'activePlayers': n}
+                for m, n in points[-minutes:]]
@@ -0,0 +1,140 @@
+"""
+Ad Astra - Logging
+Level-gated loggers written by a background QueueListener, plus a
+sampled JSON access log
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+ROOT_LOGGER = 'adastra'
+ACCESS_LOGGER = 'adastra.access'
+
+TEXT_FORMAT = '%(asctime)s [%(levelname)s] %(name)s: %(message)s'
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any `fields`"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        return json.dumps(entry, separators=(',', ':'), default=str)
+
+
+def _parse_levels(spec):
+    """'adastra.admin=DEBUG,adastra.db=WARNING' -> {name: level}"""
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, level = item.partition('=')
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _stream_or_file(path):
+    if path:
+        return logging.FileHandler(path, encoding='utf-8')
+    return logging.StreamHandler(sys.stdout)
+
+
+def setup_logging(level=None, module_levels=None, access_sample=None):
+    """Route every `adastra.*` logger through one queue.
+
+    A disabled call costs one level check: messages use %-style
+    arguments, so nothing is formatted. An enabled call merges its
+    arguments into the message and puts the record on the queue;
+    timestamps, line layout and all I/O happen on the listener thread.
+
+    Environment: ADASTRA_LOG_LEVEL (default INFO), ADASTRA_LOG_LEVELS
+    (per-logger overrides), ADASTRA_LOG_FILE, ADASTRA_ACCESS_LOG_FILE and
+    ADASTRA_ACCESS_LOG_SAMPLE (fraction of requests logged, default 0.01).
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    level = (level or os.environ.get('ADASTRA_LOG_LEVEL', 'INFO')).upper()
+    module_levels = module_levels or _parse_levels(os.environ.get('ADASTRA_LOG_LEVELS', ''))
+    if access_sample is None:
+        access_sample = float(os.environ.get('ADASTRA_ACCESS_LOG_SAMPLE', '0.01'))
+
+    text_handler = _stream_or_file(os.environ.get('ADASTRA_LOG_FILE'))
+    text_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    text_handler.addFilter(lambda record: record.name != ACCESS_LOGGER)
+    access_handler = _stream_or_file(os.environ.get('ADASTRA_ACCESS_LOG_FILE'))
+    access_handler.setFormatter(JsonFormatter())
+    access_handler.addFilter(lambda record: record.name == ACCESS_LOGGER)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger(ROOT_LOGGER)
+    root.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(level)
+    root.propagate = False
+    # Werkzeug's per-request line is replaced by the sampled access log
+    werkzeug = logging.getLogger('werkzeug')
+    werkzeug.handlers[:] = [root.handlers[0]]
+    werkzeug.setLevel(logging.WARNING)
+    werkzeug.propagate = False
+    for name, name_level in module_levels.items():
+        logging.getLogger(name).setLevel(name_level)
+
+    access = logging.getLogger(ACCESS_LOGGER)
+    access.setLevel(logging.INFO if access_sample > 0 else logging.CRITICAL + 1)
+    access_log.sample = access_sample
+
+    _listener = logging.handlers.QueueListener(log_queue, text_handler, access_handler,
+                                               respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Drain the queue and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class AccessLog:
+    """Sampled per-request JSON lines on the `adastra.access` logger"""
+
+    def __init__(self, sample=0.01):
+        self.sample = sample
+        self._logger = logging.getLogger(ACCESS_LOGGER)
+
+    def started(self):
+        """Token for finished(); None when this request is not sampled"""
+        if self.sample <= 0 or (self.sample < 1 and random.random() >= self.sample):
+            return None
+        return time.perf_counter()
+
+    def finished(self, started, request, response):
+        if started is None:
+            return
+        self._logger.info('request', extra={'fields': {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'ms': round((time.perf_counter() - started) * 1000, 2),
+            'bytesIn': request.content_length or 0,
+            'bytesOut': response.content_length,
+            'ip': request.remote_addr,
+        }})
+
+
+access_log = AccessLog()
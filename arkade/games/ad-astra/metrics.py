@@ -0,0 +1,248 @@
+"""
+Ad Astra - Request Metrics
+Per-route latency and payload histograms, DB and JSON time per request,
+error counts, rendered in the Prometheus text exposition format
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+from flask.json.provider import DefaultJSONProvider
+
+# Upper bounds; the implicit last bucket is +Inf
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+STATUS_CLASSES = ('1xx', '2xx', '3xx', '4xx', '5xx')
+
+# Requests that matched no route (404s, scanners) share one label
+UNMATCHED_ROUTE = '<unmatched>'
+
+
+class _RequestTimes:
+    """Time spent in the pool and in JSON for the request on this thread"""
+
+    __slots__ = ('db', 'json_encode', 'json_decode')
+
+    def __init__(self):
+        self.db = 0.0
+        self.json_encode = 0.0
+        self.json_decode = 0.0
+
+
+class _RouteStats:
+    __slots__ = ('latency', 'latency_sum', 'size', 'bytes_in', 'bytes_out', 'statuses',
+                 'db_seconds', 'json_encode_seconds', 'json_decode_seconds')
+
+    def __init__(self):
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.size = [0] * (len(SIZE_BUCKETS) + 1)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.statuses = [0] * len(STATUS_CLASSES)
+        self.db_seconds = 0.0
+        self.json_encode_seconds = 0.0
+        self.json_decode_seconds = 0.0
+
+
+class RequestMetrics:
+    """Counters updated from before/after request hooks.
+
+    The hot path is two perf_counter() calls, two bisects and one
+    uncontended lock per request; buckets are plain lists keyed by
+    (route rule, method), so nothing is formatted until /api/metrics
+    is scraped. DB and JSON time are accumulated on a thread-local, so
+    work done outside a request (reaper, write-behind flush) is ignored.
+    """
+
+    def __init__(self):
+        self._routes = {}  # (rule, method) -> _RouteStats
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started = time.time()
+
+    def start(self):
+        """Call from before_request"""
+        local = self._local
+        local.times = _RequestTimes()
+        local.started = time.perf_counter()
+
+    def finish(self, request, response):
+        """Call from after_request with the unproxied request object
+        (each LocalProxy attribute lookup costs more than this whole method)"""
+        local = self._local
+        started = getattr(local, 'started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        times = local.times
+        local.started = local.times = None
+        rule = request.url_rule
+        key = (rule.rule if rule is not None else UNMATCHED_ROUTE, request.method)
+        bytes_in = request.content_length or 0
+        bytes_out = int(response.headers.get('Content-Length') or 0)
+        latency_bucket = bisect_left(LATENCY_BUCKETS, elapsed)
+        size_bucket = bisect_left(SIZE_BUCKETS, bytes_out)
+        status_class = min(response.status_code // 100, 5) - 1
+
+        with self._lock:
+            stats = self._routes.get(key)
+            if stats is None:
+                stats = self._routes[key] = _RouteStats()
+            stats.latency[latency_bucket] += 1
+            stats.latency_sum += elapsed
+            stats.size[size_bucket] += 1
+            stats.bytes_in += bytes_in
+            stats.bytes_out += bytes_out
+            stats.statuses[status_class] += 1
+            stats.db_seconds += times.db
+            stats.json_encode_seconds += times.json_encode
+            stats.json_decode_seconds += times.json_decode
+
+    def add_db_time(self, seconds):
+        """ConnectionPool hook: time a connection was held (including the wait)"""
+        times = getattr(self._local, 'times', None)
+        if times is not None:
+            times.db += seconds
+
+    def add_json_time(self, encode=0.0, decode=0.0):
+        times = getattr(self._local, 'times', None)
+        if times is not None:
+            times.json_encode += encode
+            times.json_decode += decode
+
+    def _snapshot(self):
+        with self._lock:
+            return sorted(
+                (key, (list(s.latency), s.latency_sum, list(s.size), s.bytes_in, s.bytes_out,
+                       list(s.statuses), s.db_seconds, s.json_encode_seconds, s.json_decode_seconds))
+                for key, s in self._routes.items())
+
+    def render(self, gauges=None):
+        """Prometheus text format (version 0.0.4).
+
+        `gauges` maps a component name to a stats dict (as returned by
+        the various .stats() methods); numeric values are exported as
+        adastra_<component>_<key>.
+        """
+        lines = []
+        out = lines.append
+        snapshot = self._snapshot()
+
+        out('# HELP adastra_http_request_duration_seconds Time from before_request to after_request.')
+        out('# TYPE adastra_http_request_duration_seconds histogram')
+        for (route, method), (latency, latency_sum, *_rest) in snapshot:
+            labels = _labels(route=route, method=method)
+            _histogram(out, 'adastra_http_request_duration_seconds', labels,
+                       LATENCY_BUCKETS, latency, latency_sum)
+
+        out('# HELP adastra_http_response_size_bytes Response body size.')
+        out('# TYPE adastra_http_response_size_bytes histogram')
+        for (route, method), (_l, _ls, size, _bi, bytes_out, *_rest) in snapshot:
+            labels = _labels(route=route, method=method)
+            _histogram(out, 'adastra_http_response_size_bytes', labels,
+                       SIZE_BUCKETS, size, bytes_out)
+
+        out('# HELP adastra_http_requests_total Requests by status class.')
+        out('# TYPE adastra_http_requests_total counter')
+        for (route, method), (_l, _ls, _s, _bi, _bo, statuses, *_rest) in snapshot:
+            for status, count in zip(STATUS_CLASSES, statuses):
+                if count:
+                    out(f'adastra_http_requests_total{_labels(route=route, method=method, status=status)} {count}')
+
+        out('# HELP adastra_http_request_errors_total Requests answered with a 5xx status.')
+        out('# TYPE adastra_http_request_errors_total counter')
+        for (route, method), (_l, _ls, _s, _bi, _bo, statuses, *_rest) in snapshot:
+            out(f'adastra_http_request_errors_total{_labels(route=route, method=method)} {statuses[4]}')
+
+        counters = (
+            ('adastra_http_request_bytes_total', 'Request body bytes received.', 3),
+            ('adastra_http_db_seconds_total', 'Time spent holding (or waiting for) a pooled DB connection.', 6),
+            ('adastra_http_json_encode_seconds_total', 'Time spent serializing JSON responses.', 7),
+            ('adastra_http_json_decode_seconds_total', 'Time spent parsing JSON request bodies.', 8),
+        )
+        for name, help_text, index in counters:
+            out(f'# HELP {name} {help_text}')
+            out(f'# TYPE {name} counter')
+            for (route, method), values in snapshot:
+                out(f'{name}{_labels(route=route, method=method)} {_number(values[index])}')
+
+        out('# HELP adastra_process_start_time_seconds Unix time the server started.')
+        out('# TYPE adastra_process_start_time_seconds gauge')
+        out(f'adastra_process_start_time_seconds {_number(self._started)}')
+
+        for component, stats in (gauges or {}).items():
+            for key, value in stats.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f'adastra_{_snake(component)}_{_snake(key)}'
+                out(f'# TYPE {name} gauge')
+                out(f'{name} {_number(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, charging dumps/loads to the current request.
+
+    jsonify() and request.get_json() both go through app.json, so this
+    covers response encoding and request body parsing.
+    """
+
+    metrics = None
+
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            if self.metrics is not None:
+                self.metrics.add_json_time(encode=time.perf_counter() - started)
+
+    def loads(self, s, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().loads(s, **kwargs)
+        finally:
+            if self.metrics is not None:
+                self.metrics.add_json_time(decode=time.perf_counter() - started)
+
+
+def _histogram(out, name, labels, bounds, counts, total):
+    cumulative = 0
+    inner = labels[1:-1] + ',' if labels else ''
+    for bound, count in zip(bounds, counts):
+        cumulative += count
+        out(f'{name}_bucket{{{inner}le="{_number(bound)}"}} {cumulative}')
+    cumulative += counts[-1]
+    out(f'{name}_bucket{{{inner}le="+Inf"}} {cumulative}')
+    out(f'{name}_sum{labels} {_number(total)}')
+    out(f'{name}_count{labels} {cumulative}')
+
+
+def _labels(**labels):
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+def _snake(name):
+    out = []
+    for ch in name:
+        if ch.isupper():
+            out.append('_' + ch.lower())
+        elif ch.isalnum():
+            out.append(ch)
+        else:
+            out.append('_')
+    return ''.join(out)
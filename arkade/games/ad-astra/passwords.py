@@ -0,0 +1,180 @@
+"""
+Ad Astra - Password Hashing
+Salted scrypt hashes, verified on a bounded worker pool
+"""
+
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+# Cost bounds for calibration (log2 of N)
+MIN_LOG_N = 14
+MAX_LOG_N = 17
+
+# Current cost; replaced by calibrate() at startup
+_params = {'n': 1 << MIN_LOG_N, 'r': SCRYPT_R, 'p': SCRYPT_P}
+
+
+class KdfBusy(Exception):
+    """Too many password checks queued server-wide"""
+
+
+class KdfRateLimited(Exception):
+    """Too many password checks in flight from one client"""
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * r * n + 1024 * 1024, dklen=KEY_BYTES)
+
+
+def current_params():
+    return dict(_params)
+
+
+def calibrate(target_ms=50.0):
+    """Pick the largest N (within bounds) whose hash takes <= target_ms here"""
+    chosen = MIN_LOG_N
+    timings = {}
+    salt = secrets.token_bytes(SALT_BYTES)
+    for log_n in range(MIN_LOG_N, MAX_LOG_N + 1):
+        started = time.perf_counter()
+        _scrypt('calibration', salt, 1 << log_n, SCRYPT_R, SCRYPT_P)
+        elapsed = (time.perf_counter() - started) * 1000
+        timings[1 << log_n] = round(elapsed, 2)
+        if elapsed > target_ms:
+            break
+        chosen = log_n
+    _params['n'] = 1 << chosen
+    return {'n': _params['n'], 'r': SCRYPT_R, 'p': SCRYPT_P, 'timingsMs': timings}
+
+
+def hash_password(password):
+    """scrypt$N$r$p$salt$hash using the current cost parameters"""
+    n, r, p = _params['n'], _params['r'], _params['p']
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = _scrypt(password, salt, n, r, p)
+    return f'scrypt${n}${r}${p}${salt.hex()}${digest.hex()}'
+
+
+def is_legacy_hash(stored):
+    """Unsalted SHA-256 hex digest from before scrypt"""
+    return not stored.startswith('scrypt$')
+
+
+def verify_password(password, stored):
+    """Return (matches, needs_rehash). Comparison is constant-time."""
+    if is_legacy_hash(stored):
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, stored), True
+
+    try:
+        _, n, r, p, salt_hex, digest_hex = stored.split('$')
+        n, r, p = int(n), int(r), int(p)
+        salt, expected = bytes.fromhex(salt_hex), bytes.fromhex(digest_hex)
+    except ValueError:
+        return False, False
+
+    matches = hmac.compare_digest(_scrypt(password, salt, n, r, p), expected)
+    needs_rehash = (n, r, p) != (_params['n'], _params['r'], _params['p'])
+    return matches, needs_rehash
+
+
+# Verifying against this when the username is unknown keeps response
+# times the same for existing and non-existing accounts
+_dummy_hash = None
+
+
+def dummy_verify(password):
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password(secrets.token_hex(8))
+    verify_password(password, _dummy_hash)
+    return False, False
+
+
+class KdfExecutor:
+    """Bounded pool for password hashing.
+
+    At most `workers` hashes run at once (hashlib.scrypt releases the GIL),
+    at most `max_queue` wait behind them, and a single client IP may have
+    at most `per_ip` in flight. Anything over those limits is rejected
+    immediately instead of piling up threads, so a login storm cannot
+    starve the rest of the API. A caller that gives up after `timeout`
+    gets KdfBusy; its slot is only freed once the hash really finishes.
+    """
+
+    def __init__(self, workers=2, max_queue=32, per_ip=2, timeout=10.0):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.per_ip = per_ip
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='kdf')
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self._per_ip = {}
+        self._completed_total = 0
+        self._rejected_busy = 0
+        self._rejected_ip = 0
+        self._timed_out = 0
+
+    def run(self, client_ip, fn, *args):
+        """Run fn(*args) on the pool and wait for the result"""
+        with self._lock:
+            if self._per_ip.get(client_ip, 0) >= self.per_ip:
+                self._rejected_ip += 1
+                raise KdfRateLimited('Too many concurrent login attempts')
+            if not self._slots.acquire(blocking=False):
+                self._rejected_busy += 1
+                raise KdfBusy('Login queue is full')
+            self._per_ip[client_ip] = self._per_ip.get(client_ip, 0) + 1
+
+        try:
+            future = self._pool.submit(fn, *args)
+        except RuntimeError:
+            self._release(client_ip)
+            raise KdfBusy('Login pool is shut down')
+        future.add_done_callback(lambda _: self._release(client_ip))
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            with self._lock:
+                self._timed_out += 1
+            raise KdfBusy(f'Password hash took over {self.timeout}s')
+
+    def _release(self, client_ip):
+        """Free a slot once its hash has finished (or was cancelled)"""
+        self._slots.release()
+        with self._lock:
+            remaining = self._per_ip.get(client_ip, 1) - 1
+            if remaining:
+                self._per_ip[client_ip] = remaining
+            else:
+                self._per_ip.pop(client_ip, None)
+            self._completed_total += 1
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            in_flight = sum(self._per_ip.values())
+            return {
+                'workers': self.workers,
+                'maxQueue': self.max_queue,
+                'perIp': self.per_ip,
+                'inFlight': in_flight,
+                'completedTotal': self._completed_total,
+                'rejectedBusy': self._rejected_busy,
+                'rejectedPerIp': self._rejected_ip,
+                'timedOut': self._timed_out,
+                'params': current_params(),
+            }
@@ -0,0 +1,214 @@
+"""
+Ad Astra - Admin Player Listing
+Keyset-paginated, filtered and projected queries for /api/admin/players
+"""
+
+import base64
+import json
+
+import state_fields
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+
+# sort key -> (SQL expression, nullable)
+SORT_KEYS = {
+    'lastActivity': ('p.last_activity', True),
+    'username': ('a.username', False),
+    'credits': ('p.credits', True),
+    'createdAt': ('a.created_at', False),
+    'id': ('p.id', False),
+    # Indexed game_state fields (state_fields.INDEXED)
+    **{field.api_key: (f'p.{field.column}', True) for field in state_fields.INDEXED}
+}
+
+# Always-selected columns: API key -> SQL expression
+BASE_COLUMNS = [
+    ('id', 'p.id'),
+    ('username', 'a.username'),
+    ('pilotName', 'p.pilot_name'),
+    ('shipName', 'p.ship_name'),
+    ('credits', 'p.credits'),
+    ('turns', 'p.turns'),
+    ('currentSector', 'p.current_sector'),
+    ('shipType', 'p.ship_type'),
+    ('lastActivity', 'p.last_activity'),
+    ('shipVariant', 'p.ship_variant'),
+    ('lastLogin', 'a.last_login'),
+    ('createdAt', 'a.created_at'),
+    ('isAdmin', 'a.is_admin'),
+    ('isBanned', 'a.is_banned')
+]
+BOOL_KEYS = ('isAdmin', 'isBanned')
+
+# Opt-in JSON columns (?include=gameState,cargo,equipment)
+JSON_COLUMNS = {
+    'cargo': 'p.cargo',
+    'equipment': 'p.equipment',
+    'gameState': 'p.game_state'
+}
+DEFAULT_INCLUDE = ('cargo', 'equipment')
+
+# ?include=stateFields adds every promoted game_state field
+STATE_INCLUDE = 'stateFields'
+STATE_COLUMNS = [(field.api_key, f'p.{field.column}') for field in state_fields.FIELDS]
+
+
+class ListingError(ValueError):
+    """Bad query parameter (reported as 400)"""
+
+
+def encode_cursor(value, row_id):
+    raw = json.dumps([value, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return value, int(row_id)
+    except (ValueError, TypeError):
+        raise ListingError('Invalid cursor')
+
+
+def _parse_bool(name, value):
+    if value in ('1', 'true', 'yes'):
+        return 1
+    if value in ('0', 'false', 'no'):
+        return 0
+    raise ListingError(f'{name} must be true or false')
+
+
+def _keyset_condition(expr, nullable, descending, value, row_id):
+    """Rows strictly after (value, row_id) in ORDER BY expr, p.id (NULLs last when DESC)"""
+    op = '<' if descending else '>'
+    if expr == 'p.id':
+        return f'p.id {op} ?', [row_id]
+    if value is None:
+        if descending:
+            # Already into the trailing NULL block
+            return f'({expr} IS NULL AND p.id {op} ?)', [row_id]
+        return f'(({expr} IS NULL AND p.id {op} ?) OR {expr} IS NOT NULL)', [row_id]
+    condition = f'({expr} {op} ? OR ({expr} = ? AND p.id {op} ?)'
+    if nullable and descending:
+        condition += f' OR {expr} IS NULL'
+    return condition + ')', [value, value, row_id]
+
+
+def _parse_number(name, value):
+    try:
+        return float(value)
+    except ValueError:
+        raise ListingError(f'{name} must be a number')
+
+
+def _require_state_fields(name):
+    if not state_fields.available:
+        raise ListingError(f'{name} needs SQLite generated columns (3.31+)')
+
+
+def build_query(args):
+    """Build (sql, params, columns, sort_key, limit) from request args"""
+    sort = args.get('sort', 'lastActivity')
+    if sort not in SORT_KEYS:
+        raise ListingError(f'sort must be one of: {", ".join(SORT_KEYS)}')
+    if sort in state_fields.BY_API_KEY:
+        _require_state_fields(f'sort={sort}')
+    order = args.get('order', 'desc').lower()
+    if order not in ('asc', 'desc'):
+        raise ListingError('order must be asc or desc')
+    descending = order == 'desc'
+
+    try:
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ListingError('limit must be a number')
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    include = args.get('include')
+    include = [k for k in include.split(',') if k] if include is not None else list(DEFAULT_INCLUDE)
+    unknown = [k for k in include if k not in JSON_COLUMNS and k != STATE_INCLUDE]
+    if unknown:
+        raise ListingError(f'Unknown include: {", ".join(unknown)}')
+
+    columns = BASE_COLUMNS + [(key, JSON_COLUMNS[key]) for key in include if key in JSON_COLUMNS]
+    if STATE_INCLUDE in include:
+        _require_state_fields(f'include={STATE_INCLUDE}')
+        columns = columns + STATE_COLUMNS
+    elif sort in state_fields.BY_API_KEY:
+        # The cursor needs the sort value
+        columns = columns + [(sort, SORT_KEYS[sort][0])]
+    where = []
+    params = []
+
+    if 'banned' in args:
+        where.append('a.is_banned = ?')
+        params.append(_parse_bool('banned', args['banned']))
+    if 'admin' in args:
+        where.append('a.is_admin = ?')
+        params.append(_parse_bool('admin', args['admin']))
+    if args.get('activeSince'):
+        where.append('p.last_activity >= ?')
+        params.append(args['activeSince'])
+    if args.get('sector'):
+        try:
+            params.append(int(args['sector']))
+        except ValueError:
+            raise ListingError('sector must be a number')
+        where.append('p.current_sector = ?')
+    if args.get('prefix'):
+        # Range scan on the username index instead of LIKE
+        where.append('a.username >= ? AND a.username < ?')
+        params.extend([args['prefix'], args['prefix'] + '\U0010ffff'])
+    # Range filters on indexed fields, e.g. hullPercentBelow=20, sectorsVisitedAtLeast=100
+    for field in state_fields.INDEXED:
+        for suffix, op in (('Below', '<'), ('AtLeast', '>=')):
+            name = field.api_key + suffix
+            if args.get(name):
+                _require_state_fields(name)
+                where.append(f'p.{field.column} {op} ?')
+                params.append(_parse_number(name, args[name]))
+
+    expr, nullable = SORT_KEYS[sort]
+    if args.get('cursor'):
+        value, row_id = decode_cursor(args['cursor'])
+        condition, condition_params = _keyset_condition(expr, nullable, descending, value, row_id)
+        where.append(condition)
+        params.extend(condition_params)
+
+    direction = 'DESC' if descending else 'ASC'
+    sql = (f"SELECT {', '.join(sql for _, sql in columns)} "
+           f"FROM players p JOIN accounts a ON p.account_id = a.id")
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += f' ORDER BY {expr} {direction}, p.id {direction} LIMIT ?'
+    params.append(limit + 1)  # one extra row tells us whether there is a next page
+
+    return sql, params, [key for key, _ in columns], sort, limit
+
+
+def rows_to_page(rows, keys, sort, limit):
+    """Turn fetched rows into {'players': [...], 'nextCursor': ...}"""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    players = []
+    for row in rows:
+        player = dict(zip(keys, row))
+        for key in BOOL_KEYS:
+            player[key] = bool(player[key])
+        for key in JSON_COLUMNS:
+            if key in player:
+                try:
+                    player[key] = json.loads(player[key]) if player[key] else {}
+                except ValueError:
+                    player[key] = {}
+        players.append(player)
+
+    next_cursor = None
+    if has_more and players:
+        last = players[-1]
+        next_cursor = encode_cursor(last[sort] if sort != 'id' else None, last['id'])
+    for player in players:
+        del player['id']
+    return {'players': players, 'nextCursor': next_cursor}
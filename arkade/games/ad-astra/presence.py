@@ -0,0 +1,208 @@
+"""
+Ad Astra - Multiplayer Presence
+One row per pilot (player_presence) instead of a single shared JSON blob
+"""
+
+import json
+import time
+
+# Matches MultiplayerSystem.ACTIVITY_TIMEOUT in js/multiplayer.js
+ACTIVITY_TIMEOUT_MS = 30 * 60 * 1000
+
+# Client key -> column for the flat fields MultiplayerSystem.registerPlayer builds
+PRESENCE_FIELDS = {
+    'pilotName': 'pilot_name',
+    'currentSector': 'current_sector',
+    'lastSeen': 'last_seen',
+    'kills': 'kills',
+    'deaths': 'deaths',
+    'credits': 'credits',
+    'status': 'status',
+    'joinedAt': 'joined_at'
+}
+# player.ship sub-keys -> column
+SHIP_FIELDS = {
+    'name': 'ship_name',
+    'hull': 'ship_hull',
+    'maxHull': 'ship_max_hull',
+    'class': 'ship_class'
+}
+
+# Column types for validate(): ints, texts, and which may not be null
+INT_COLUMNS = ('current_sector', 'last_seen', 'kills', 'deaths', 'credits', 'joined_at',
+               'ship_hull', 'ship_max_hull')
+NOT_NULL_COLUMNS = ('last_seen', 'kills', 'deaths', 'credits', 'status')
+
+SELECT_COLUMNS = '''username, pilot_name, ship_name, ship_hull, ship_max_hull, ship_class,
+                    current_sector, last_seen, kills, deaths, credits, status, joined_at, extra'''
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def create_tables(c):
+    """Create player_presence and its indexes (called from init_db)"""
+    c.execute('''CREATE TABLE IF NOT EXISTS player_presence (
+        username TEXT PRIMARY KEY,
+        pilot_name TEXT,
+        ship_name TEXT,
+        ship_hull INTEGER,
+        ship_max_hull INTEGER,
+        ship_class TEXT,
+        current_sector INTEGER,
+        last_seen INTEGER NOT NULL,
+        kills INTEGER NOT NULL DEFAULT 0,
+        deaths INTEGER NOT NULL DEFAULT 0,
+        credits INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL DEFAULT 'active',
+        joined_at INTEGER,
+        extra TEXT NOT NULL DEFAULT '{}'
+    )''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_presence_last_seen ON player_presence(last_seen)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_presence_sector ON player_presence(current_sector, last_seen)')
+
+
+class PresenceError(ValueError):
+    """Presence field with the wrong type (reported as 400)"""
+
+
+def _check(key, column, value):
+    if value is None:
+        if column in NOT_NULL_COLUMNS:
+            raise PresenceError(f'{key} cannot be null')
+    elif column in INT_COLUMNS:
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise PresenceError(f'{key} must be an integer')
+    elif not isinstance(value, str):
+        raise PresenceError(f'{key} must be a string')
+
+
+def validate(player):
+    """Raise PresenceError unless every known field fits its column"""
+    for key, column in PRESENCE_FIELDS.items():
+        if key in player:
+            _check(key, column, player[key])
+    if 'ship' in player:
+        ship = player['ship']
+        if not isinstance(ship, dict):
+            raise PresenceError('ship must be an object')
+        for key, column in SHIP_FIELDS.items():
+            if key in ship:
+                _check(f'ship.{key}', column, ship[key])
+
+
+def row_to_player(row):
+    """Rebuild the object shape MultiplayerSystem uses client-side"""
+    player = json.loads(row[13]) if row[13] else {}
+    player.update({
+        'username': row[0],
+        'pilotName': row[1],
+        'ship': {
+            'name': row[2],
+            'hull': row[3],
+            'maxHull': row[4],
+            'class': row[5]
+        },
+        'currentSector': row[6],
+        'lastSeen': row[7],
+        'kills': row[8],
+        'deaths': row[9],
+        'credits': row[10],
+        'status': row[11],
+        'joinedAt': row[12]
+    })
+    return player
+
+
+def upsert(c, username, player):
+    """Insert or update one pilot; only keys present in `player` are written"""
+    columns = ['username']
+    values = [username]
+    extra = {}
+    for key, value in player.items():
+        if key == 'username':
+            continue
+        if key in PRESENCE_FIELDS:
+            columns.append(PRESENCE_FIELDS[key])
+            values.append(value)
+        elif key == 'ship' and isinstance(value, dict):
+            for ship_key, column in SHIP_FIELDS.items():
+                if ship_key in value:
+                    columns.append(column)
+                    values.append(value[ship_key])
+        else:
+            extra[key] = value
+
+    if 'last_seen' not in columns:
+        columns.append('last_seen')
+        values.append(now_ms())
+    keep_joined = 'joined_at' not in columns
+    if keep_joined:
+        columns.append('joined_at')
+        values.append(values[columns.index('last_seen')])
+    if extra:
+        columns.append('extra')
+        values.append(json.dumps(extra))
+
+    assignments = [f'{col} = excluded.{col}' for col in columns[1:] if col != 'extra']
+    if keep_joined:
+        # Only new rows take the default joinedAt
+        assignments.remove('joined_at = excluded.joined_at')
+    if extra:
+        assignments.append('extra = json_patch(player_presence.extra, excluded.extra)')
+
+    c.execute(f'''INSERT INTO player_presence ({', '.join(columns)})
+                  VALUES ({', '.join('?' * len(columns))})
+                  ON CONFLICT(username) DO UPDATE SET {', '.join(assignments)}''', values)
+
+
+def remove(c, username):
+    c.execute('DELETE FROM player_presence WHERE username = ?', (username,))
+    return c.rowcount
+
+
+def get(c, username):
+    c.execute(f'SELECT {SELECT_COLUMNS} FROM player_presence WHERE username = ?', (username,))
+    row = c.fetchone()
+    return row_to_player(row) if row else None
+
+
+def in_sector(c, sector_id, since):
+    c.execute(f'''SELECT {SELECT_COLUMNS} FROM player_presence
+                  WHERE current_sector = ? AND last_seen >= ?
+                  ORDER BY last_seen DESC''', (sector_id, since))
+    return [row_to_player(row) for row in c.fetchall()]
+
+
+def active_since(c, since, limit=None):
+    query = f'''SELECT {SELECT_COLUMNS} FROM player_presence
+                WHERE last_seen >= ?
+                ORDER BY last_seen DESC'''
+    params = [since]
+    if limit:
+        query += ' LIMIT ?'
+        params.append(limit)
+    c.execute(query, params)
+    return [row_to_player(row) for row in c.fetchall()]
+
+
+def migrate_legacy_blob(c):
+    """Import the old multiplayer_state blob once, if presence is still empty"""
+    c.execute('SELECT COUNT(*) FROM player_presence')
+    if c.fetchone()[0]:
+        return 0
+    c.execute('SELECT data FROM multiplayer_state ORDER BY id DESC LIMIT 1')
+    row = c.fetchone()
+    if not row:
+        return 0
+    try:
+        blob = json.loads(row[0])
+    except ValueError:
+        return 0
+    imported = 0
+    for username, player in (blob.items() if isinstance(blob, dict) else []):
+        if isinstance(player, dict):
+            upsert(c, username, player)
+            imported += 1
+    return imported
@@ -0,0 +1,140 @@
+"""
+Ad Astra - Presence Push Channel
+Threaded broadcaster behind the Server-Sent Events stream
+"""
+
+import itertools
+import json
+import queue
+import secrets
+import threading
+
+# Event types sent to subscribers
+JOIN = 'join'
+LEAVE = 'leave'
+MOVE = 'move'
+STATUS = 'status'
+UPDATE = 'update'
+
+# Keys whose change alone does not warrant an event (heartbeats)
+QUIET_KEYS = ('lastSeen',)
+
+
+def classify_change(before, after):
+    """Pick the event type for a presence write, or None for a bare heartbeat"""
+    if before is None:
+        return JOIN
+    if after is None:
+        return LEAVE
+    if before.get('currentSector') != after.get('currentSector'):
+        return MOVE
+    if before.get('status') != after.get('status'):
+        return STATUS
+    changed = [k for k in after if k not in QUIET_KEYS and before.get(k) != after.get(k)]
+    return UPDATE if changed else None
+
+
+class Subscriber:
+    def __init__(self, sub_id, sectors, max_queue):
+        self.id = sub_id
+        self.sectors = sectors  # set of sector ids, or None for the whole galaxy
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = False
+
+    def wants(self, sectors):
+        return self.sectors is None or not self.sectors.isdisjoint(sectors)
+
+
+class PresenceBroadcaster:
+    """Fan presence events out to per-subscriber queues.
+
+    Each SSE connection owns a bounded queue; a subscriber that falls more
+    than `max_queue` events behind is dropped and must reconnect (and gets
+    a fresh snapshot), so one slow client never blocks the publishers.
+    Subscription ids are random tokens, since knowing one is enough to
+    retarget that stream.
+    """
+
+    def __init__(self, max_subscribers=500, max_queue=256):
+        self.max_subscribers = max_subscribers
+        self.max_queue = max_queue
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._event_ids = itertools.count(1)
+        self._published_total = 0
+        self._delivered_total = 0
+        self._dropped_total = 0
+
+    def subscribe(self, sectors=None):
+        """Register a subscriber; returns None when the server is full"""
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            sub = Subscriber(secrets.token_urlsafe(16), set(sectors) if sectors is not None else None, self.max_queue)
+            self._subscribers[sub.id] = sub
+            return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.pop(sub.id, None)
+
+    def set_sectors(self, sub_id, sectors):
+        """Change what an existing subscriber listens to; False if unknown"""
+        with self._lock:
+            sub = self._subscribers.get(sub_id)
+            if sub is None:
+                return False
+            sub.sectors = set(sectors) if sectors is not None else None
+            return True
+
+    def publish(self, event_type, player, sectors):
+        """Deliver one event to everyone subscribed to any of `sectors`"""
+        sectors = {s for s in sectors if s is not None}
+        message = {'id': next(self._event_ids), 'type': event_type, 'player': player}
+        with self._lock:
+            targets = [sub for sub in self._subscribers.values() if sub.wants(sectors)]
+            self._published_total += 1
+        for sub in targets:
+            try:
+                sub.queue.put_nowait(message)
+                delivered = True
+            except queue.Full:
+                delivered = False
+            with self._lock:
+                if delivered:
+                    self._delivered_total += 1
+                elif not sub.dropped:
+                    sub.dropped = True
+                    self._dropped_total += 1
+
+    def publish_change(self, before, after):
+        """Classify a presence write and publish it (no-op for heartbeats)"""
+        event_type = classify_change(before, after)
+        if event_type is None:
+            return None
+        player = after if after is not None else before
+        sectors = {player.get('currentSector')}
+        if event_type == MOVE:
+            sectors.add(before.get('currentSector'))
+            player = dict(player, fromSector=before.get('currentSector'))
+        self.publish(event_type, player, sectors)
+        return event_type
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'maxSubscribers': self.max_subscribers,
+                'publishedTotal': self._published_total,
+                'deliveredTotal': self._delivered_total,
+                'droppedTotal': self._dropped_total,
+            }
+
+
+def format_sse(event_type, data, event_id=None):
+    """Encode one Server-Sent Events frame"""
+    frame = ''
+    if event_id is not None:
+        frame += f'id: {event_id}\n'
+    frame += f'event: {event_type}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+    return frame
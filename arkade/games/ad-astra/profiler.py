@@ -0,0 +1,106 @@
+"""
+Ad Astra - Sampling Profiler
+Time-boxed wall-clock stack sampler for the live process, output as
+collapsed stacks (flamegraph.pl / speedscope "folded" format)
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+MAX_SECONDS = 60.0
+MIN_INTERVAL = 0.001
+
+# Leaf frames of threads parked waiting for work; dropped unless include_idle
+IDLE_FRAMES = frozenset([
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('selectors.py', 'select'),
+    ('socketserver.py', 'serve_forever'),
+    ('socket.py', 'accept'),
+    ('socket.py', 'readinto'),
+    ('queue.py', 'get'),
+    ('thread.py', '_worker'),
+    ('handlers.py', 'dequeue'),
+])
+
+_running = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    """A profile is already being taken"""
+
+
+class StackSampler:
+    """Samples every thread's Python stack each `interval` seconds.
+
+    Uses sys._current_frames() from the calling thread rather than a
+    signal timer: SIGPROF only ever interrupts the main thread, while
+    requests run on the server's worker threads. Work inside C calls
+    (sqlite3 execute, json encoding of large payloads) is charged to the
+    Python frame that made the call, which is what we want to see.
+    """
+
+    def __init__(self, interval=0.005, include_idle=False, max_depth=128):
+        self.interval = max(MIN_INTERVAL, interval)
+        self.include_idle = include_idle
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self.elapsed = 0.0
+
+    def run(self, seconds):
+        """Sample for `seconds` (blocking); returns self"""
+        if not _running.acquire(blocking=False):
+            raise ProfilerBusy('A profile is already running')
+        try:
+            own_ident = threading.get_ident()
+            started = time.perf_counter()
+            deadline = started + min(seconds, MAX_SECONDS)
+            while True:
+                self._sample(own_ident)
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                time.sleep(min(self.interval, deadline - now))
+            self.elapsed = time.perf_counter() - started
+        finally:
+            _running.release()
+        return self
+
+    def _sample(self, own_ident):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            code = frame.f_code
+            if not self.include_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            stack.append(names.get(ident, f'thread-{ident}'))
+            stack.reverse()
+            self.stacks[';'.join(stack)] += 1
+        self.samples += 1
+
+    def collapsed(self):
+        """One 'root;...;leaf count' line per distinct stack, hottest first"""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    def summary(self, top=20):
+        """Self-time by leaf frame, for a quick look without a flamegraph"""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        return {
+            'samples': self.samples,
+            'elapsedSeconds': round(self.elapsed, 3),
+            'intervalMs': round(self.interval * 1000, 3),
+            'stacks': len(self.stacks),
+            'top': [{'frame': frame, 'samples': count} for frame, count in leaves.most_common(top)],
+        }
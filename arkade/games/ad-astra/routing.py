@@ -0,0 +1,224 @@
+"""
+Ad Astra - Routing Index
+BFS next-hop and hop-count tables over a galaxy's warps, so routes,
+distance tables and nearest-X lookups cost O(path length) per query
+"""
+
+import logging
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
+
+log = logging.getLogger('adastra.routing')
+
+# array('H') holds sector ids and hop counts up to this
+UNREACHABLE = 0xFFFF
+
+# Content kinds answered by nearest(): a content `type`, or prefix:value
+PLAIN_KINDS = ('any', 'planet', 'station', 'debris', 'anomaly')
+KIND_PREFIXES = {'planetType': 'planetType', 'class': 'class', 'commodity': 'economy'}
+
+
+class RoutingError(ValueError):
+    """Bad sector id or unknown nearest-X kind"""
+
+
+def parse_kind(kind):
+    """'station' or 'class:Military' -> (field, value); raises RoutingError"""
+    if kind in PLAIN_KINDS:
+        return ('type', kind)
+    prefix, _, value = kind.partition(':')
+    if prefix not in KIND_PREFIXES or not value:
+        raise RoutingError(f"Unknown kind '{kind}' (use {', '.join(PLAIN_KINDS)} "
+                           f"or {', '.join(p + ':<value>' for p in KIND_PREFIXES)})")
+    return (prefix, value)
+
+
+def _matches(content, field, value):
+    if field == 'type':
+        return value == 'any' or content.get('type') == value
+    if field == 'commodity':
+        return value in (content.get('economy') or {})
+    return content.get(KIND_PREFIXES[field]) == value
+
+
+class RoutingIndex:
+    """Per-source BFS trees for one galaxy version.
+
+    For each source the table holds parent[v] (previous sector on the
+    shortest path from the source; 0 when unreachable) and hops[v], both
+    array('H'), about 4 bytes per sector pair. Paths are walked back from
+    the target, so they are exactly the paths galaxy.js findPath() returns
+    (same warp order, first discovery wins).
+
+    Galaxies up to `precompute_max` sectors get every source built on a
+    background thread; beyond that sources are built on first use and
+    kept in an LRU of `max_sources`, which bounds memory on huge maps.
+    Nearest-X uses one multi-source BFS per kind instead (next hop toward
+    the closest matching sector from everywhere), also built on demand.
+    """
+
+    def __init__(self, galaxy, precompute_max=2000, max_sources=512):
+        self.galaxy = galaxy
+        self.precompute_max = precompute_max
+        self.max_sources = max_sources
+        self._sources = OrderedDict()  # source id -> (parent, hops)
+        self._kinds = {}  # (field, value) -> (next_hop, hops, target)
+        self._kind_values = None  # field -> values present in this galaxy
+        self._lock = threading.Lock()
+        self._thread = None
+        self._built = 0
+        self._precompute_seconds = None
+
+    @property
+    def complete(self):
+        return self._precompute_seconds is not None
+
+    def start_precompute(self):
+        """Build every source table in the background (small galaxies only)"""
+        if self.galaxy.size > self.precompute_max or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._precompute, name='routing-precompute', daemon=True)
+        self._thread.start()
+
+    def _precompute(self):
+        started = time.perf_counter()
+        for source in range(1, self.galaxy.size + 1):
+            self.table(source)
+        self._precompute_seconds = time.perf_counter() - started
+        log.info('Routing tables for %s sectors built in %.2fs', self.galaxy.size, self._precompute_seconds)
+
+    def _check(self, sector_id):
+        if not isinstance(sector_id, int) or not 1 <= sector_id <= self.galaxy.size:
+            raise RoutingError(f'Sector {sector_id} is not in this galaxy')
+
+    def table(self, source):
+        """(parent, hops) arrays for BFS from `source`"""
+        with self._lock:
+            entry = self._sources.get(source)
+            if entry is not None:
+                if self.galaxy.size > self.precompute_max:
+                    self._sources.move_to_end(source)
+                return entry
+        entry = self._bfs(source)
+        with self._lock:
+            self._sources[source] = entry
+            self._built += 1
+            if self.galaxy.size > self.precompute_max:
+                while len(self._sources) > self.max_sources:
+                    self._sources.popitem(last=False)
+        return entry
+
+    def _bfs(self, source):
+        size = self.galaxy.size
+        warps = self.galaxy.warps
+        parent = array('H', bytes(2 * (size + 1)))
+        hops = array('H', [UNREACHABLE]) * (size + 1)
+        parent[source] = source
+        hops[source] = 0
+        queue = deque([source])
+        while queue:
+            current = queue.popleft()
+            next_hops = hops[current] + 1
+            for warp in warps[current]:
+                if hops[warp] == UNREACHABLE:
+                    hops[warp] = next_hops
+                    parent[warp] = current
+                    queue.append(warp)
+        return parent, hops
+
+    def route(self, source, target):
+        """Sector ids from source to target inclusive, or None if unreachable"""
+        self._check(source)
+        self._check(target)
+        parent, hops = self.table(source)
+        if hops[target] == UNREACHABLE:
+            return None
+        path = [target]
+        while path[-1] != source:
+            path.append(parent[path[-1]])
+        path.reverse()
+        return path
+
+    def distances(self, source):
+        """Hop count from source to every sector (index 0 = sector 1); None if unreachable"""
+        self._check(source)
+        _, hops = self.table(source)
+        return [None if h == UNREACHABLE else h for h in hops[1:]]
+
+    def _check_kind(self, kind):
+        """Only values that occur in the galaxy get a table, so _kinds stays
+        bounded by the galaxy's contents whatever clients ask for"""
+        field, value = kind
+        if field == 'type':
+            return
+        if self._kind_values is None:
+            values = {prefix: set() for prefix in KIND_PREFIXES}
+            for contents in self.galaxy.contents[1:]:
+                for content in contents:
+                    for prefix in ('planetType', 'class'):
+                        if content.get(prefix) is not None:
+                            values[prefix].add(content[prefix])
+                    values['commodity'].update(content.get('economy') or ())
+            self._kind_values = values
+        if value not in self._kind_values[field]:
+            raise RoutingError(f"No {field} '{value}' in this galaxy")
+
+    def _kind_table(self, kind):
+        self._check_kind(kind)
+        with self._lock:
+            entry = self._kinds.get(kind)
+        if entry is not None:
+            return entry
+        field, value = kind
+        size = self.galaxy.size
+        warps = self.galaxy.warps
+        next_hop = array('H', bytes(2 * (size + 1)))
+        hops = array('H', [UNREACHABLE]) * (size + 1)
+        target = array('H', bytes(2 * (size + 1)))
+        queue = deque()
+        for sector_id in range(1, size + 1):
+            if any(_matches(c, field, value) for c in self.galaxy.contents[sector_id]):
+                hops[sector_id] = 0
+                next_hop[sector_id] = target[sector_id] = sector_id
+                queue.append(sector_id)
+        # Warps are bidirectional, so BFS outward from every target gives
+        # each sector its closest target and the hop that leads toward it
+        while queue:
+            current = queue.popleft()
+            for warp in warps[current]:
+                if hops[warp] == UNREACHABLE:
+                    hops[warp] = hops[current] + 1
+                    next_hop[warp] = current
+                    target[warp] = target[current]
+                    queue.append(warp)
+        entry = (next_hop, hops, target)
+        with self._lock:
+            self._kinds[kind] = entry
+        return entry
+
+    def nearest(self, source, kind):
+        """{'sector', 'jumps', 'path'} for the closest sector with matching
+        content (by jumps), or None if there is none reachable"""
+        self._check(source)
+        next_hop, hops, target = self._kind_table(parse_kind(kind))
+        if hops[source] == UNREACHABLE:
+            return None
+        path = [source]
+        while hops[path[-1]]:
+            path.append(next_hop[path[-1]])
+        return {'sector': target[source], 'jumps': hops[source], 'path': path}
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.galaxy.size,
+                'precomputed': self.galaxy.size <= self.precompute_max,
+                'complete': self.complete,
+                'precomputeSeconds': round(self._precompute_seconds, 3) if self.complete else None,
+                'sourceTables': len(self._sources),
+                'sourceTablesBuilt': self._built,
+                'kindTables': len(self._kinds),
+                'tableBytes': len(self._sources) * 4 * (self.galaxy.size + 1),
+            }
@@ -3,129 +3,364 @@ Ad Astra - Game Server with Database
 Flask API for account management and game state persistence
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, g
 from flask_cors import CORS
 import sqlite3
-import hashlib
 import secrets
 import json
-from datetime import datetime
+import hashlib
+from datetime import datetime, timezone
 import os
+import signal
+import sys
+import time
+import logging
+from db_pool import ConnectionPool, PoolTimeout
+from session_cache import SessionCache, Session
+from session_expiry import (SessionReaper, enforce_session_cap, migrate_placeholder_expiry,
+                            to_db_time, from_db_time)
+from write_behind import WriteBehindBuffer
+import presence
+import player_listing
+import state_fields
+import galaxy
+import galaxy_reset
+import game_settings
+import economy
+from routing import RoutingError
+from live_stats import LiveStats
+from passwords import (KdfExecutor, KdfBusy, KdfRateLimited, hash_password,
+                       verify_password, dummy_verify, calibrate as calibrate_kdf)
+from presence_events import PresenceBroadcaster, format_sse
+from static_files import StaticFiles
+from log_config import setup_logging, stop_logging, access_log
+from metrics import RequestMetrics, TimedJSONProvider
+from profiler import StackSampler, ProfilerBusy
+import queue
+
+# Logs go through a queue to a background writer; see log_config.py
+setup_logging()
+log = logging.getLogger('adastra.server')
+admin_log = logging.getLogger('adastra.admin')
 
 app = Flask(__name__)
 CORS(app)  # Allow cross-origin requests from browser
 
+# Per-route latency, payload, DB and JSON timings; served on /api/metrics
+request_metrics = RequestMetrics()
+TimedJSONProvider.metrics = request_metrics
+app.json = TimedJSONProvider(app)
+
+@app.before_request
+def start_request():
+    request_metrics.start()
+    g.access_started = access_log.started()
+
+@app.after_request
+def finish_request(response):
+    request_metrics.finish(request._get_current_object(), response)
+    access_log.finished(g.get('access_started'), request, response)
+    return response
+
 # Configuration
-DB_PATH = 'adastra.db'
+DB_PATH = os.environ.get('ADASTRA_DB_PATH', 'adastra.db')
+DB_POOL_SIZE = int(os.environ.get('ADASTRA_DB_POOL_SIZE', '8'))
+
+# Shared connection pool (WAL, synchronous=NORMAL, mmap, statement cache)
+db = ConnectionPool(DB_PATH, max_size=DB_POOL_SIZE)
+db.on_hold = request_metrics.add_db_time
+
+# Token -> Session cache in front of the sessions table
+session_cache = SessionCache(
+    max_entries=int(os.environ.get('ADASTRA_SESSION_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('ADASTRA_SESSION_CACHE_TTL', '300')))
+
+# Session lifetime (sliding: renewed once less than half is left)
+SESSION_TTL_SECONDS = float(os.environ.get('ADASTRA_SESSION_TTL_HOURS', '168')) * 3600
+MAX_SESSIONS_PER_ACCOUNT = int(os.environ.get('ADASTRA_MAX_SESSIONS_PER_ACCOUNT', '5'))
+
+# Opt-in write-behind buffer for PUT /api/player (ADASTRA_WRITE_BEHIND=1)
+WRITE_BEHIND = os.environ.get('ADASTRA_WRITE_BEHIND', '0') == '1'
+write_behind = WriteBehindBuffer(
+    db,
+    interval=float(os.environ.get('ADASTRA_WRITE_BEHIND_INTERVAL', '1.0')),
+    max_dirty=int(os.environ.get('ADASTRA_WRITE_BEHIND_MAX_DIRTY', '256')))
+
+# Dashboard counters, kept current by the write paths
+live_stats = LiveStats()
+
+# Presence push channel (GET /api/multiplayer/stream)
+presence_broadcaster = PresenceBroadcaster(
+    max_subscribers=int(os.environ.get('ADASTRA_STREAM_MAX_SUBSCRIBERS', '500')))
+STREAM_KEEPALIVE_SECONDS = 15
+
+# Static assets: cached bytes, ETags, 304s, Range and gzip/brotli variants;
+# files over the stream threshold are sent from disk without buffering
+static_files = StaticFiles(
+    os.path.dirname(os.path.abspath(__file__)),
+    max_bytes=int(os.environ.get('ADASTRA_STATIC_CACHE_MB', '64')) * 1024 * 1024,
+    stream_threshold=int(os.environ.get('ADASTRA_STATIC_STREAM_KB', '1024')) * 1024)
+
+# Server-generated galaxies, served as immutable per-version snapshots
+galaxy_store = galaxy.GalaxyStore(
+    db, routing_precompute_max=int(os.environ.get('ADASTRA_ROUTING_PRECOMPUTE_MAX', '2000')))
+GALAXY_MAX_SIZE = int(os.environ.get('ADASTRA_GALAXY_MAX_SIZE', '5000'))
+GALAXY_MAX_SECTOR_IDS = 500
+GALAXY_MAX_REGION_RADIUS = 25.0
+
+# Shared market for the live galaxy; supply drifts back to its generated
+# level every ADASTRA_MARKET_REGEN_INTERVAL seconds
+market = economy.Market(
+    db, galaxy_store,
+    interval=float(os.environ.get('ADASTRA_MARKET_REGEN_INTERVAL', '300')),
+    rate=float(os.environ.get('ADASTRA_MARKET_REGEN_RATE', '0.1')))
+
+# Sysop settings, read from game_settings once at startup and on change
+settings_cache = game_settings.GameSettings(db)
+
+# Background player reset for galaxy regeneration, committed in chunks
+reset_jobs = galaxy_reset.GalaxyReset(
+    db, chunk_size=int(os.environ.get('ADASTRA_RESET_CHUNK_SIZE', '500')))
+
+def sessions_reaped(rows):
+    """Reaper callback: forget (token, account_id) pairs it deleted"""
+    per_account = {}
+    for token, account_id in rows:
+        session_cache.invalidate(token)
+        per_account[account_id] = per_account.get(account_id, 0) + 1
+    for account_id, count in per_account.items():
+        live_stats.sessions_ended(account_id, count)
+
+# Deletes expired sessions in small batches in the background
+session_reaper = SessionReaper(
+    db,
+    interval=float(os.environ.get('ADASTRA_SESSION_REAP_INTERVAL', '60')),
+    batch_size=int(os.environ.get('ADASTRA_SESSION_REAP_BATCH', '500')),
+    on_reaped=sessions_reaped)
+
+@app.errorhandler(PoolTimeout)
+def handle_pool_timeout(e):
+    log.error('%s', e)
+    return jsonify({'error': 'Server busy, please retry'}), 503
+
+# Password hashing runs on its own bounded pool so login storms
+# cannot take CPU away from the save path
+kdf = KdfExecutor(
+    workers=int(os.environ.get('ADASTRA_KDF_WORKERS', '2')),
+    max_queue=int(os.environ.get('ADASTRA_KDF_QUEUE', '32')),
+    per_ip=int(os.environ.get('ADASTRA_KDF_PER_IP', '2')))
+KDF_TARGET_MS = float(os.environ.get('ADASTRA_KDF_TARGET_MS', '50'))
+
+@app.errorhandler(KdfBusy)
+def handle_kdf_busy(e):
+    log.warning('%s', e)
+    return jsonify({'error': 'Login server busy, please retry'}), 503, {'Retry-After': '1'}
+
+@app.errorhandler(KdfRateLimited)
+def handle_kdf_rate_limited(e):
+    log.warning('%s from %s', e, request.remote_addr)
+    return jsonify({'error': 'Too many login attempts, slow down'}), 429, {'Retry-After': '1'}
 
 # Initialize database
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # Accounts table
-    c.execute('''CREATE TABLE IF NOT EXISTS accounts (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE NOT NULL,
-        password_hash TEXT NOT NULL,
-        created_at TEXT NOT NULL,
-        last_login TEXT,
-        is_admin INTEGER NOT NULL DEFAULT 0
-    )''')
-    
-    # Ensure is_admin column exists on older databases
-    try:
-        c.execute("ALTER TABLE accounts ADD COLUMN is_admin INTEGER NOT NULL DEFAULT 0")
-    except sqlite3.OperationalError:
-        # Column already exists
-        pass
-    
-    # Players table (game data)
-    c.execute('''CREATE TABLE IF NOT EXISTS players (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        account_id INTEGER NOT NULL,
-        pilot_name TEXT NOT NULL,
-        ship_name TEXT,
-        credits INTEGER DEFAULT 10000,
-        turns INTEGER DEFAULT 50,
-        current_sector INTEGER DEFAULT 1,
-        ship_type TEXT DEFAULT 'Scout',
-        cargo TEXT DEFAULT '{}',
-        equipment TEXT DEFAULT '{}',
-        game_state TEXT DEFAULT '{}',
-        last_activity TEXT,
-        FOREIGN KEY (account_id) REFERENCES accounts(id)
-    )''')
-    
-    # Add last_activity column if it doesn't exist
-    try:
-        c.execute("ALTER TABLE players ADD COLUMN last_activity TEXT")
-    except sqlite3.OperationalError:
-        pass
+    with db.connection() as conn:
+        c = conn.cursor()
+    
+        # Accounts table
+        c.execute('''CREATE TABLE IF NOT EXISTS accounts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            last_login TEXT,
+            is_admin INTEGER NOT NULL DEFAULT 0
+        )''')
+    
+        # Ensure is_admin column exists on older databases
+        try:
+            c.execute("ALTER TABLE accounts ADD COLUMN is_admin INTEGER NOT NULL DEFAULT 0")
+        except sqlite3.OperationalError:
+            # Column already exists
+            pass
+    
+        # Players table (game data)
+        c.execute('''CREATE TABLE IF NOT EXISTS players (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_id INTEGER NOT NULL,
+            pilot_name TEXT NOT NULL,
+            ship_name TEXT,
+            credits INTEGER DEFAULT 10000,
+            turns INTEGER DEFAULT 50,
+            current_sector INTEGER DEFAULT 1,
+            ship_type TEXT DEFAULT 'Scout',
+            cargo TEXT DEFAULT '{}',
+            equipment TEXT DEFAULT '{}',
+            game_state TEXT DEFAULT '{}',
+            last_activity TEXT,
+            FOREIGN KEY (account_id) REFERENCES accounts(id)
+        )''')
+    
+        # Add last_activity column if it doesn't exist
+        try:
+            c.execute("ALTER TABLE players ADD COLUMN last_activity TEXT")
+        except sqlite3.OperationalError:
+            pass
     
-    # Add ship_variant column if it doesn't exist
-    try:
-        c.execute("ALTER TABLE players ADD COLUMN ship_variant INTEGER DEFAULT 1")
-    except sqlite3.OperationalError:
-        pass
+        # Add ship_variant column if it doesn't exist
+        try:
+            c.execute("ALTER TABLE players ADD COLUMN ship_variant INTEGER DEFAULT 1")
+        except sqlite3.OperationalError:
+            pass
     
-    # Add is_banned column to accounts if it doesn't exist
-    try:
-        c.execute("ALTER TABLE accounts ADD COLUMN is_banned INTEGER NOT NULL DEFAULT 0")
-    except sqlite3.OperationalError:
-        pass
-    
-    # Game settings table (sysop configurable)
-    c.execute('''CREATE TABLE IF NOT EXISTS game_settings (
-        key TEXT PRIMARY KEY,
-        value TEXT NOT NULL
-    )''')
-    
-    # Insert default settings if they don't exist
-    default_settings = {
-        'starting_sector': '1',
-        'starting_credits': '10000',
-        'starting_turns': '50',
-        'starting_fuel': '100',
-        'starting_hull': '100',
-        'starting_shields': '100'
-    }
-    for key, value in default_settings.items():
-        c.execute('INSERT OR IGNORE INTO game_settings (key, value) VALUES (?, ?)', (key, value))
-    
-    # Multiplayer state table
-    c.execute('''CREATE TABLE IF NOT EXISTS multiplayer_state (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        data TEXT NOT NULL,
-        updated_at TEXT NOT NULL
-    )''')
-    
-    # Sessions table (for login tokens)
-    c.execute('''CREATE TABLE IF NOT EXISTS sessions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        account_id INTEGER NOT NULL,
-        token TEXT UNIQUE NOT NULL,
-        created_at TEXT NOT NULL,
-        expires_at TEXT NOT NULL,
-        FOREIGN KEY (account_id) REFERENCES accounts(id)
-    )''')
-    
-    conn.commit()
-    conn.close()
-    print("[OK] Database initialized")
-
-# Hash password
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+        # Add version column (optimistic concurrency for PATCH /api/player)
+        try:
+            c.execute("ALTER TABLE players ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        except sqlite3.OperationalError:
+            pass
+    
+        # Add is_banned column to accounts if it doesn't exist
+        try:
+            c.execute("ALTER TABLE accounts ADD COLUMN is_banned INTEGER NOT NULL DEFAULT 0")
+        except sqlite3.OperationalError:
+            pass
+    
+        # Game settings table (sysop configurable) with any missing defaults
+        game_settings.create_tables(c)
+    
+        # Multiplayer state table (legacy single blob, superseded by player_presence)
+        c.execute('''CREATE TABLE IF NOT EXISTS multiplayer_state (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )''')
+    
+        # Per-pilot presence rows
+        presence.create_tables(c)
+        galaxy.create_tables(c)
+        economy.create_tables(c)
+        galaxy_reset.create_tables(c)
+        imported = presence.migrate_legacy_blob(c)
+        if imported:
+            log.info('Imported %s pilots from multiplayer_state into player_presence', imported)
+    
+        # Sessions table (for login tokens)
+        c.execute('''CREATE TABLE IF NOT EXISTS sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_id INTEGER NOT NULL,
+            token TEXT UNIQUE NOT NULL,
+            created_at TEXT NOT NULL,
+            expires_at TEXT NOT NULL,
+            FOREIGN KEY (account_id) REFERENCES accounts(id)
+        )''')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions(expires_at)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_sessions_account_id ON sessions(account_id)')
+        fixed = migrate_placeholder_expiry(c, SESSION_TTL_SECONDS)
+        if fixed:
+            log.info('Gave %s legacy sessions a real expiry', fixed)
+    
+        # Indexes for admin listing / lookups
+        # (accounts.username is already indexed by its UNIQUE constraint)
+        c.execute('CREATE INDEX IF NOT EXISTS idx_players_last_activity ON players(last_activity, id)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_players_account_id ON players(account_id)')
+    
+        # Indexed virtual columns over game_state (ship hull/fuel, stats)
+        state_fields.migrate(c)
+    
+        conn.commit()
+    
+        live_stats.load(conn)
+    settings_cache.load()
+    log.info('Database initialized')
+
+# Player columns in the historical `p.*` order (row indexes below rely on it)
+PLAYER_COLUMNS = '''p.id, p.account_id, p.pilot_name, p.ship_name, p.credits, p.turns,
+                    p.current_sector, p.ship_type, p.cargo, p.equipment, p.game_state,
+                    p.last_activity, p.ship_variant'''
 
 # Generate session token
 def generate_token():
     return secrets.token_hex(32)
 
+def create_session(c, account_id):
+    """Insert a session row; returns (token, expires_at epoch, tokens evicted by the cap).
+    The caller commits, then calls forget_evicted_sessions()."""
+    token = generate_token()
+    now = time.time()
+    expires_at = now + SESSION_TTL_SECONDS
+    c.execute('INSERT INTO sessions (account_id, token, created_at, expires_at) VALUES (?, ?, ?, ?)',
+              (account_id, token, to_db_time(now), to_db_time(expires_at)))
+    evicted = enforce_session_cap(c, account_id, MAX_SESSIONS_PER_ACCOUNT)
+    return token, expires_at, evicted
+
+def forget_evicted_sessions(account_id, evicted):
+    for old_token in evicted:
+        session_cache.invalidate(old_token)
+    if evicted:
+        live_stats.sessions_ended(account_id, len(evicted))
+
+# Resolve session token -> Session (account_id, username, is_admin, is_banned, expires_at)
+# Expired tokens resolve to None; live ones are renewed once less than half their TTL is left
+def get_session(token):
+    # Taken before the lookup: put() skips caching if a kick/ban/delete ran since
+    generation = session_cache.generation()
+    session = session_cache.get(token)
+    cached = session is not None
+    if not cached:
+        with db.connection() as conn:
+            row = conn.execute('''SELECT a.id, a.username, a.is_admin, a.is_banned, s.expires_at
+                                  FROM sessions s
+                                  JOIN accounts a ON s.account_id = a.id
+                                  WHERE s.token = ?''', (token,)).fetchone()
+        if not row:
+            return None
+        session = Session(row[0], row[1], bool(row[2]), bool(row[3]), from_db_time(row[4]))
+    
+    if session.is_banned:
+        if cached:
+            session_cache.invalidate(token)
+        return None
+    
+    now = time.time()
+    if session.expires_at <= now:
+        session_cache.invalidate(token)
+        return None
+    
+    if session.expires_at - now < SESSION_TTL_SECONDS / 2:
+        expires_at = now + SESSION_TTL_SECONDS
+        with db.connection() as conn:
+            conn.execute('UPDATE sessions SET expires_at = ? WHERE token = ?', (to_db_time(expires_at), token))
+            conn.commit()
+        session = session._replace(expires_at=expires_at)
+        cached = False
+    
+    if not cached:
+        session_cache.put(token, session, generation)
+    return session
+
 # ============================================
 # API ENDPOINTS
 # ============================================
 
+@app.route('/api/health', methods=['GET'])
+def health():
+    """Liveness check; same shape as the Worker's /api/health"""
+    timestamp = datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+    return jsonify({'status': 'ok', 'timestamp': timestamp.replace('+00:00', 'Z')})
+
+def settings_response():
+    """Current game settings with their version; 304 when If-None-Match matches"""
+    current = settings_cache.current
+    response = jsonify({'success': True, 'version': current.version,
+                        'settings': settings_cache.to_api(current.values)})
+    response.set_etag(f'settings-{current.etag}')
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/api/settings', methods=['GET'])
+def get_settings():
+    """Game settings for clients (poll with If-None-Match)"""
+    return settings_response()
+
 @app.route('/api/register', methods=['POST'])
 def register():
     """Create new account"""
@@ -138,52 +373,53 @@ def register():
     if not username or not password:
         return jsonify({'error': 'Username and password required'}), 400
     
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    # Hash off the request thread (bounded KDF pool)
+    password_hash = kdf.run(request.remote_addr, hash_password, password)
     
-    try:
-        # Create account
-        password_hash = hash_password(password)
-        created_at = datetime.now().isoformat()
+    with db.connection() as conn:
+        c = conn.cursor()
+    
+        try:
+            # Create account
+            created_at = datetime.now().isoformat()
         
-        print(f"[DEBUG] ========== REGISTER ==========")
-        print(f"[DEBUG] Creating account: {username}")
+            log.debug('REGISTER creating account: %s', username)
         
-        c.execute('INSERT INTO accounts (username, password_hash, created_at) VALUES (?, ?, ?)',
-                  (username, password_hash, created_at))
-        account_id = c.lastrowid
+            c.execute('INSERT INTO accounts (username, password_hash, created_at) VALUES (?, ?, ?)',
+                      (username, password_hash, created_at))
+            account_id = c.lastrowid
         
-        print(f"[DEBUG] Account created: account_id={account_id}")
+            log.debug('Account created: account_id=%s', account_id)
         
-        # Create player
-        print(f"[DEBUG] Creating player record: pilot_name={pilot_name}, ship_name={ship_name}")
-        c.execute('''INSERT INTO players 
-                     (account_id, pilot_name, ship_name) 
-                     VALUES (?, ?, ?)''',
-                  (account_id, pilot_name, ship_name))
+            # Create player with the sysop's starting values
+            log.debug('Creating player record: pilot_name=%s, ship_name=%s', pilot_name, ship_name)
+            starting = settings_cache.values
+            c.execute('''INSERT INTO players 
+                         (account_id, pilot_name, ship_name, credits, turns) 
+                         VALUES (?, ?, ?, ?, ?)''',
+                      (account_id, pilot_name, ship_name,
+                       starting['starting_credits'], starting['starting_turns']))
         
-        print(f"[DEBUG] Player record created")
-        print(f"[DEBUG] ====================================")
+            log.debug('Player record created')
         
-        conn.commit()
+            conn.commit()
         
-        # Generate session token
-        token = generate_token()
-        expires_at = datetime.now().isoformat()  # TODO: Add expiration
-        c.execute('INSERT INTO sessions (account_id, token, created_at, expires_at) VALUES (?, ?, ?, ?)',
-                  (account_id, token, created_at, expires_at))
-        conn.commit()
+            # Generate session token
+            token, expires_at, _ = create_session(c, account_id)
+            conn.commit()
+            session_cache.put(token, Session(account_id, username, False, False, expires_at))
+            live_stats.player_created()
+            live_stats.session_started(account_id)
         
-        return jsonify({
-            'success': True,
-            'token': token,
-            'username': username
-        })
+            return jsonify({
+                'success': True,
+                'token': token,
+                'username': username,
+                'expiresAt': to_db_time(expires_at)
+            })
         
-    except sqlite3.IntegrityError:
-        return jsonify({'error': 'Username already exists'}), 400
-    finally:
-        conn.close()
+        except sqlite3.IntegrityError:
+            return jsonify({'error': 'Username already exists'}), 400
 
 @app.route('/api/login', methods=['POST'])
 def login():
@@ -192,106 +428,154 @@ def login():
     username = data.get('username', '').strip()
     password = data.get('password', '')
     
-    print(f"[DEBUG] ========== LOGIN ATTEMPT ==========")
-    print(f"[DEBUG] Username: {username}")
+    log.debug('LOGIN ATTEMPT username=%s', username)
     
     if not username or not password:
-        print(f"[ERROR] Missing username or password")
+        log.warning('Missing username or password')
         return jsonify({'error': 'Username and password required'}), 400
     
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    log.debug('Looking for account with username=%s', username)
     
-    password_hash = hash_password(password)
-    print(f"[DEBUG] Looking for account with username={username}")
+    with db.connection() as conn:
+        result = conn.execute('SELECT id, is_admin, is_banned, password_hash FROM accounts WHERE username = ?',
+                              (username,)).fetchone()
     
-    c.execute('SELECT id, is_admin, is_banned FROM accounts WHERE username = ? AND password_hash = ?',
-              (username, password_hash))
-    result = c.fetchone()
+    # Verify on the KDF pool; unknown usernames cost the same as wrong passwords
+    client_ip = request.remote_addr
+    if result:
+        matches, needs_rehash = kdf.run(client_ip, verify_password, password, result[3])
+    else:
+        matches, needs_rehash = kdf.run(client_ip, dummy_verify, password)
     
-    if not result:
-        print(f"[ERROR] No account found or wrong password")
-        conn.close()
+    if not matches:
+        log.warning('No account found or wrong password')
         return jsonify({'error': 'Invalid username or password'}), 401
     
-    print(f"[DEBUG] Account found: id={result[0]}, is_admin={result[1]}, is_banned={result[2]}")
+    log.debug('Account found: id=%s, is_admin=%s, is_banned=%s', result[0], result[1], result[2])
     
-    account_id, is_admin, is_banned = result
+    account_id, is_admin, is_banned, _ = result
     
     # Check if account is banned
     if is_banned:
-        print(f"[ERROR] Account is banned")
-        conn.close()
+        log.warning('Account is banned')
         return jsonify({'error': 'Account is banned. Contact administrator.'}), 403
     
-    # Update last login
-    c.execute('UPDATE accounts SET last_login = ? WHERE id = ?',
-              (datetime.now().isoformat(), account_id))
+    # Transparently upgrade legacy SHA-256 (or outdated scrypt cost) hashes
+    new_hash = None
+    if needs_rehash:
+        try:
+            new_hash = kdf.run(client_ip, hash_password, password)
+        except (KdfBusy, KdfRateLimited):
+            pass  # Try again on a later login
     
-    # Generate session token
-    token = generate_token()
-    created_at = datetime.now().isoformat()
-    expires_at = datetime.now().isoformat()  # TODO: Add expiration
-    c.execute('INSERT INTO sessions (account_id, token, created_at, expires_at) VALUES (?, ?, ?, ?)',
-              (account_id, token, created_at, expires_at))
+    with db.connection() as conn:
+        c = conn.cursor()
     
-    conn.commit()
-    conn.close()
+        # Update last login
+        c.execute('UPDATE accounts SET last_login = ? WHERE id = ?',
+                  (datetime.now().isoformat(), account_id))
     
-    print(f"[DEBUG] Login successful: token={token[:16]}...")
-    print(f"[DEBUG] ====================================")
+        if new_hash:
+            c.execute('UPDATE accounts SET password_hash = ? WHERE id = ?', (new_hash, account_id))
+            log.info('Upgraded password hash for %s', username)
+    
+        # Generate session token (oldest sessions beyond the per-account cap are dropped)
+        token, expires_at, evicted = create_session(c, account_id)
+    
+        conn.commit()
+    
+    session_cache.put(token, Session(account_id, username, bool(is_admin), False, expires_at))
+    live_stats.session_started(account_id)
+    forget_evicted_sessions(account_id, evicted)
+    
+    log.debug('Login successful: token=%s...', token[:16])
     
     return jsonify({
         'success': True,
         'token': token,
         'username': username,
-        'is_admin': bool(is_admin)
+        'is_admin': bool(is_admin),
+        'expiresAt': to_db_time(expires_at)
     })
 
+@app.route('/api/logout', methods=['POST'])
+def logout():
+    """End the current session"""
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    
+    if not token:
+        return jsonify({'error': 'No token provided'}), 401
+    
+    session = get_session(token)
+    
+    with db.connection() as conn:
+        removed = conn.execute('DELETE FROM sessions WHERE token = ?', (token,)).rowcount
+        conn.commit()
+    
+    session_cache.invalidate(token)
+    if session and removed:
+        live_stats.sessions_ended(session.account_id, removed)
+    
+    return jsonify({'success': True})
+
 @app.route('/api/player', methods=['GET'])
 def get_player():
     """Get player data"""
     token = request.headers.get('Authorization', '').replace('Bearer ', '')
     
     if not token:
-        print("[ERROR] GET player: No token provided")
+        log.warning('GET player: No token provided')
         return jsonify({'error': 'No token provided'}), 401
     
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
     # Get account from token
-    c.execute('SELECT account_id FROM sessions WHERE token = ?', (token,))
-    result = c.fetchone()
+    session = get_session(token)
     
-    if not result:
-        conn.close()
-        print("[ERROR] GET player: Invalid token")
+    if not session:
+        log.warning('GET player: Invalid token')
         return jsonify({'error': 'Invalid token'}), 401
     
-    account_id = result[0]
+    account_id = session.account_id
+    
+    log.debug('GET PLAYER account_id=%s', account_id)
+    
+    # Unflushed autosave? Answer from the write-behind buffer
+    pending = write_behind.pending(account_id) if write_behind.running else None
+    if pending:
+        values, version = pending
+        return jsonify({
+            'username': session.username,
+            'pilotName': values['pilot_name'],
+            'shipName': values['ship_name'],
+            'credits': values['credits'],
+            'turns': values['turns'],
+            'currentSector': values['current_sector'],
+            'shipType': values['ship_type'],
+            'cargo': values['cargo'],
+            'equipment': values['equipment'],
+            'gameState': values['game_state'],
+            'lastActivity': values['last_activity'],
+            'shipVariant': values['ship_variant'],
+            'is_admin': session.is_admin,
+            'version': version
+        })
     
-    print(f"[DEBUG] ========== GET PLAYER ==========")
-    print(f"[DEBUG] account_id: {account_id}")
+    with db.connection() as conn:
+        c = conn.cursor()
     
-    # Get player data
-    c.execute('''SELECT p.*, a.username, a.is_admin
-                 FROM players p 
-                 JOIN accounts a ON p.account_id = a.id 
-                 WHERE p.account_id = ?''', (account_id,))
+        # Get player data
+        c.execute(f'''SELECT {PLAYER_COLUMNS}, a.username, a.is_admin, p.version
+                     FROM players p 
+                     JOIN accounts a ON p.account_id = a.id 
+                     WHERE p.account_id = ?''', (account_id,))
     
-    row = c.fetchone()
-    conn.close()
+        row = c.fetchone()
     
     if not row:
-        print(f"[ERROR] NO PLAYER RECORD found for account_id={account_id}")
+        log.warning('NO PLAYER RECORD found for account_id=%s', account_id)
         return jsonify({'error': 'Player not found'}), 404
     
-    print(f"[DEBUG] Player record found:")
-    print(f"[DEBUG]   pilot_name: {row[2]}")
-    print(f"[DEBUG]   ship_name: {row[3]}")
-    print(f"[DEBUG]   ship_variant: {row[12]}")
-    print(f"[DEBUG]   username: {row[13]}")
+    log.debug('Player record found: pilot_name=%s ship_name=%s ship_variant=%s username=%s',
+              row[2], row[3], row[12], row[13])
     
     result = {
         'username': row[13],
@@ -306,12 +590,12 @@ def get_player():
         'gameState': json.loads(row[10]) if row[10] else {},
         'lastActivity': row[11],
         'shipVariant': row[12] if len(row) > 12 else 1,
-        'is_admin': bool(row[14]) if len(row) > 14 else False
+        'is_admin': bool(row[14]) if len(row) > 14 else False,
+        'version': row[15]
     }
     
-    print(f"[DEBUG] Returning: pilotName={result['pilotName']}, shipVariant={result['shipVariant']}")
-    print(f"[DEBUG] gameState keys: {list(result['gameState'].keys())}")
-    print(f"[DEBUG] ====================================")
+    log.debug('Returning: pilotName=%s, shipVariant=%s', result['pilotName'], result['shipVariant'])
+    log.debug('gameState keys: %s', result['gameState'].keys())
     
     return jsonify(result)
 
@@ -321,125 +605,638 @@ def update_player():
     token = request.headers.get('Authorization', '').replace('Bearer ', '')
     
     if not token:
-        print("[ERROR] No token provided")
+        log.warning('No token provided')
         return jsonify({'error': 'No token provided'}), 401
     
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
     # Get account from token
-    c.execute('SELECT account_id FROM sessions WHERE token = ?', (token,))
-    result = c.fetchone()
+    session = get_session(token)
     
-    if not result:
-        conn.close()
-        print("[ERROR] Invalid token")
+    if not session:
+        log.warning('Invalid token')
         return jsonify({'error': 'Invalid token'}), 401
     
-    account_id = result[0]
-    data = request.json
-    
-    print(f"[DEBUG] ========== UPDATE PLAYER ==========")
-    print(f"[DEBUG] account_id: {account_id}")
-    print(f"[DEBUG] pilotName: {data.get('pilotName')}")
-    print(f"[DEBUG] shipName: {data.get('shipName')}")
-    print(f"[DEBUG] shipVariant: {data.get('shipVariant')}")
-    
-    # Check if player record exists
-    c.execute('SELECT id, pilot_name FROM players WHERE account_id = ?', (account_id,))
-    existing = c.fetchone()
-    if existing:
-        print(f"[DEBUG] Player record EXISTS: id={existing[0]}, current_pilot_name={existing[1]}")
-    else:
-        print(f"[ERROR] NO PLAYER RECORD FOUND for account_id={account_id}!")
-        print(f"[ERROR] Creating player record now...")
-        # Create player record if missing
-        c.execute('''INSERT INTO players 
-                     (account_id, pilot_name, ship_name, credits, turns, current_sector, ship_type, cargo, equipment, game_state, ship_variant) 
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (account_id, 
-                   data.get('pilotName', 'Unknown'),
-                   data.get('shipName', 'Scout'),
-                   data.get('credits', 10000),
-                   data.get('turns', 50),
-                   data.get('currentSector', 1),
-                   data.get('shipType', 'scout'),
+    account_id = session.account_id
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Player data must be a JSON object'}), 400
+    # Checked up front: a value SQLite cannot bind would fail the whole write-behind batch
+    for key in PLAYER_FIELD_TYPES:
+        error = player_field_error(key, data.get(key))
+        if error:
+            return jsonify({'error': error}), 400
+    
+    log.debug('UPDATE PLAYER account_id=%s pilotName=%s shipName=%s shipVariant=%s',
+              account_id, data.get('pilotName'), data.get('shipName'), data.get('shipVariant'))
+    
+    # Write-behind mode: buffer the row, the flusher commits in batches
+    if write_behind.running:
+        # Held from reading the version to buffering, so a PATCH or trade
+        # in between cannot end up with the same version as this save
+        with write_behind.account_lock(account_id):
+            base_version = 0
+            if write_behind.pending(account_id) is None:
+                with db.connection() as conn:
+                    row = conn.execute('SELECT version FROM players WHERE account_id = ?',
+                                       (account_id,)).fetchone()
+                base_version = row[0] if row else None
+            
+            # No player row yet -> fall through to the direct INSERT below
+            if base_version is not None:
+                write_behind.put(account_id, {
+                    'pilot_name': data.get('pilotName'),
+                    'ship_name': data.get('shipName'),
+                    'credits': data.get('credits'),
+                    'turns': data.get('turns'),
+                    'current_sector': data.get('currentSector'),
+                    'ship_type': data.get('shipType'),
+                    'cargo': data.get('cargo', {}),
+                    'equipment': data.get('equipment', {}),
+                    'game_state': data.get('gameState', {}),
+                    'last_activity': datetime.now().isoformat(),
+                    'ship_variant': data.get('shipVariant', 1)
+                }, base_version)
+        if base_version is not None:
+            live_stats.activity(account_id)
+            log.debug('UPDATE buffered (write-behind)')
+            return jsonify({'success': True})
+    
+    with db.connection() as conn:
+        c = conn.cursor()
+    
+        # Check if player record exists
+        c.execute('SELECT id, pilot_name FROM players WHERE account_id = ?', (account_id,))
+        existing = c.fetchone()
+        if existing:
+            log.debug('Player record EXISTS: id=%s, current_pilot_name=%s', existing[0], existing[1])
+        else:
+            log.warning('NO PLAYER RECORD FOUND for account_id=%s!', account_id)
+            log.warning('Creating player record now...')
+            # Create player record if missing
+            c.execute('''INSERT INTO players 
+                         (account_id, pilot_name, ship_name, credits, turns, current_sector, ship_type, cargo, equipment, game_state, ship_variant) 
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                      (account_id, 
+                       data.get('pilotName', 'Unknown'),
+                       data.get('shipName', 'Scout'),
+                       data.get('credits', 10000),
+                       data.get('turns', 50),
+                       data.get('currentSector', 1),
+                       data.get('shipType', 'scout'),
+                       json.dumps(data.get('cargo', {})),
+                       json.dumps(data.get('equipment', {})),
+                       json.dumps(data.get('gameState', {})),
+                       data.get('shipVariant', 1)))
+            conn.commit()
+            live_stats.activity(account_id)
+            log.debug('Player record created!')
+            return jsonify({'success': True})
+    
+        # Update player
+        c.execute('''UPDATE players SET
+                     pilot_name = ?,
+                     ship_name = ?,
+                     credits = ?,
+                     turns = ?,
+                     current_sector = ?,
+                     ship_type = ?,
+                     cargo = ?,
+                     equipment = ?,
+                     game_state = ?,
+                     last_activity = ?,
+                     ship_variant = ?,
+                     version = version + 1
+                     WHERE account_id = ?''',
+                  (data.get('pilotName'),
+                   data.get('shipName'),
+                   data.get('credits'),
+                   data.get('turns'),
+                   data.get('currentSector'),
+                   data.get('shipType'),
                    json.dumps(data.get('cargo', {})),
                    json.dumps(data.get('equipment', {})),
                    json.dumps(data.get('gameState', {})),
-                   data.get('shipVariant', 1)))
+                   datetime.now().isoformat(),
+                   data.get('shipVariant', 1),
+                   account_id))
+    
+        rows_updated = c.rowcount
         conn.commit()
-        print(f"[DEBUG] Player record created!")
-        return jsonify({'success': True})
-    
-    # Update player
-    c.execute('''UPDATE players SET
-                 pilot_name = ?,
-                 ship_name = ?,
-                 credits = ?,
-                 turns = ?,
-                 current_sector = ?,
-                 ship_type = ?,
-                 cargo = ?,
-                 equipment = ?,
-                 game_state = ?,
-                 last_activity = ?,
-                 ship_variant = ?
-                 WHERE account_id = ?''',
-              (data.get('pilotName'),
-               data.get('shipName'),
-               data.get('credits'),
-               data.get('turns'),
-               data.get('currentSector'),
-               data.get('shipType'),
-               json.dumps(data.get('cargo', {})),
-               json.dumps(data.get('equipment', {})),
-               json.dumps(data.get('gameState', {})),
-               datetime.now().isoformat(),
-               data.get('shipVariant', 1),
-               account_id))
-    
-    rows_updated = c.rowcount
-    conn.commit()
-    conn.close()
-    
-    print(f"[DEBUG] UPDATE complete: rows_updated={rows_updated}")
-    print(f"[DEBUG] ====================================")
+    
+    live_stats.activity(account_id)
+    
+    log.debug('UPDATE complete: rows_updated=%s', rows_updated)
     
     return jsonify({'success': True})
 
+# PATCH field map: API key -> players column
+PATCH_SCALAR_FIELDS = {
+    'pilotName': 'pilot_name',
+    'shipName': 'ship_name',
+    'credits': 'credits',
+    'turns': 'turns',
+    'currentSector': 'current_sector',
+    'shipType': 'ship_type',
+    'shipVariant': 'ship_variant'
+}
+PATCH_JSON_FIELDS = {
+    'cargo': 'cargo',
+    'equipment': 'equipment',
+    'gameState': 'game_state'
+}
+
+# Types accepted for player fields by both PUT and PATCH /api/player
+PLAYER_FIELD_TYPES = {
+    'pilotName': str,
+    'shipName': str,
+    'shipType': str,
+    'credits': int,
+    'turns': int,
+    'currentSector': int,
+    'shipVariant': int,
+    'cargo': dict,
+    'equipment': dict,
+    'gameState': dict
+}
+TYPE_NAMES = {str: 'a string', int: 'an integer', dict: 'an object'}
+
+def player_field_error(key, value):
+    """Error message if a non-null `value` has the wrong type for player field `key`"""
+    expected = PLAYER_FIELD_TYPES.get(key)
+    if expected is None or value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, expected):
+        return f'{key} must be {TYPE_NAMES[expected]}'
+    return None
+
+@app.route('/api/player', methods=['PATCH'])
+def patch_player():
+    """Apply a JSON Merge Patch (RFC 7396) to player data.
+    
+    Only the columns named in the patch are written. Nested objects
+    (cargo, equipment, gameState) are merged inside SQLite with json_patch(),
+    so unchanged sub-keys never leave the database. Send the version from
+    the last GET/PUT/PATCH in `If-Match` to get a 409 instead of a lost update.
+    """
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    
+    if not token:
+        return jsonify({'error': 'No token provided'}), 401
+    
+    session = get_session(token)
+    if not session:
+        return jsonify({'error': 'Invalid token'}), 401
+    
+    patch = request.get_json(force=True, silent=True)
+    if not isinstance(patch, dict):
+        return jsonify({'error': 'Patch must be a JSON object'}), 400
+    
+    unknown = [k for k in patch if k not in PATCH_SCALAR_FIELDS and k not in PATCH_JSON_FIELDS]
+    if unknown:
+        return jsonify({'error': f'Unknown fields: {", ".join(unknown)}'}), 400
+    for key, value in patch.items():
+        error = player_field_error(key, value)
+        if error:
+            return jsonify({'error': error}), 400
+    
+    expected_version = None
+    if_match = request.headers.get('If-Match', '').strip().strip('"')
+    if if_match:
+        try:
+            expected_version = int(if_match)
+        except ValueError:
+            return jsonify({'error': 'If-Match must be a player version number'}), 400
+    
+    updates = []
+    values = []
+    for api_key, column in PATCH_SCALAR_FIELDS.items():
+        if api_key in patch:
+            if patch[api_key] is None:
+                return jsonify({'error': f'{api_key} cannot be removed'}), 400
+            updates.append(f'{column} = ?')
+            values.append(patch[api_key])
+    for api_key, column in PATCH_JSON_FIELDS.items():
+        if api_key in patch:
+            value = patch[api_key]
+            if isinstance(value, dict):
+                updates.append(f"{column} = json_patch(COALESCE(NULLIF({column}, ''), '{{}}'), ?)")
+                values.append(json.dumps(value))
+            else:
+                # null removes the whole object
+                updates.append(f'{column} = ?')
+                values.append('{}')
+    
+    updates.append('last_activity = ?')
+    values.append(datetime.now().isoformat())
+    updates.append('version = version + 1')
+    
+    query = f"UPDATE players SET {', '.join(updates)} WHERE account_id = ?"
+    values.append(session.account_id)
+    if expected_version is not None:
+        query += ' AND version = ?'
+        values.append(expected_version)
+    
+    # Buffered autosave must land first or it would overwrite this patch;
+    # the account lock keeps a new one from being buffered until we commit
+    with write_behind.account_lock(session.account_id):
+        write_behind.flush_account(session.account_id)
+        
+        with db.connection() as conn:
+            c = conn.cursor()
+            c.execute(query, values)
+            rows_updated = c.rowcount
+            c.execute('SELECT version FROM players WHERE account_id = ?', (session.account_id,))
+            row = c.fetchone()
+            conn.commit()
+    
+    if not row:
+        return jsonify({'error': 'Player not found'}), 404
+    if rows_updated == 0:
+        return jsonify({'error': 'Version conflict', 'version': row[0]}), 409
+    
+    live_stats.activity(session.account_id)
+    return jsonify({'success': True, 'version': row[0]})
+
+# Legacy whole-blob GET: the old multiplayer_state shape, built from presence rows.
+# The client drops pilots idle for 2 hours, so older rows are never returned.
+LEGACY_MULTIPLAYER_WINDOW_MS = 2 * 60 * 60 * 1000
+
 @app.route('/api/multiplayer', methods=['GET'])
 def get_multiplayer():
-    """Get multiplayer state"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    """Get multiplayer state (compatibility view over player_presence)"""
+    since = presence.now_ms() - LEGACY_MULTIPLAYER_WINDOW_MS
     
-    c.execute('SELECT data FROM multiplayer_state ORDER BY id DESC LIMIT 1')
-    result = c.fetchone()
-    conn.close()
+    with db.connection() as conn:
+        players = presence.active_since(conn.cursor(), since)
     
-    if result:
-        return jsonify(json.loads(result[0]))
-    return jsonify({})
+    return jsonify({p['username']: p for p in players})
+
+def check_presence_caller(username):
+    """Error response unless the caller's session is `username` or an admin"""
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    session = get_session(token) if token else None
+    if not session:
+        return jsonify({'error': 'Invalid token'}), 401
+    if session.username != username and not session.is_admin:
+        return jsonify({'error': 'You can only update your own pilot'}), 403
+    return None
 
 @app.route('/api/multiplayer', methods=['PUT'])
 def update_multiplayer():
-    """Update multiplayer state"""
-    data = request.json
+    """Update multiplayer state (legacy blob, upserted pilot by pilot).
+    
+    Same rules as PUT /api/multiplayer/player/<username> for every pilot
+    in the body; nothing is written unless all of them pass.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected an object keyed by username'}), 400
+    
+    for username, player in data.items():
+        denied = check_presence_caller(username)
+        if denied:
+            return denied
+        if not isinstance(player, dict):
+            return jsonify({'error': f'Expected a player object for {username}'}), 400
+        if player.get('username', username) != username:
+            return jsonify({'error': f'Username mismatch for {username}'}), 400
+        try:
+            presence.validate(player)
+        except presence.PresenceError as e:
+            return jsonify({'error': f'{username}: {e}'}), 400
+    
+    changes = []
+    with db.connection() as conn:
+        c = conn.cursor()
+        for username, player in data.items():
+            before = presence.get(c, username)
+            presence.upsert(c, username, player)
+            changes.append((before, presence.get(c, username)))
+        conn.commit()
+    
+    for before, after in changes:
+        presence_broadcaster.publish_change(before, after)
     
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    return jsonify({'success': True})
+
+@app.route('/api/multiplayer/player/<username>', methods=['PUT'])
+def upsert_presence(username):
+    """Insert or update a single pilot's presence (own pilot, or admin)"""
+    denied = check_presence_caller(username)
+    if denied:
+        return denied
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a player object'}), 400
+    if data.get('username', username) != username:
+        return jsonify({'error': 'Username mismatch'}), 400
+    try:
+        presence.validate(data)
+    except presence.PresenceError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    with db.connection() as conn:
+        c = conn.cursor()
+        before = presence.get(c, username)
+        presence.upsert(c, username, data)
+        conn.commit()
+        player = presence.get(c, username)
     
-    # Delete old state and insert new
-    c.execute('DELETE FROM multiplayer_state')
-    c.execute('INSERT INTO multiplayer_state (data, updated_at) VALUES (?, ?)',
-              (json.dumps(data), datetime.now().isoformat()))
+    presence_broadcaster.publish_change(before, player)
     
-    conn.commit()
-    conn.close()
+    return jsonify({'success': True, 'player': player})
+
+@app.route('/api/multiplayer/player/<username>', methods=['DELETE'])
+def remove_presence(username):
+    """Remove a pilot from presence (logout / leave; own pilot, or admin)"""
+    denied = check_presence_caller(username)
+    if denied:
+        return denied
+    
+    with db.connection() as conn:
+        c = conn.cursor()
+        before = presence.get(c, username)
+        presence.remove(c, username)
+        conn.commit()
     
+    if not before:
+        return jsonify({'error': 'Player not found'}), 404
+    
+    presence_broadcaster.publish_change(before, None)
     return jsonify({'success': True})
 
+def presence_since_arg():
+    """`since` query arg (ms epoch), defaulting to the client's activity timeout"""
+    return request.args.get('since', type=int, default=presence.now_ms() - presence.ACTIVITY_TIMEOUT_MS)
+
+@app.route('/api/multiplayer/sector/<int:sector_id>', methods=['GET'])
+def get_sector_presence(sector_id):
+    """Pilots in one sector seen since `since`"""
+    with db.connection() as conn:
+        players = presence.in_sector(conn.cursor(), sector_id, presence_since_arg())
+    
+    return jsonify({'sector': sector_id, 'players': players})
+
+@app.route('/api/multiplayer/active', methods=['GET'])
+def get_active_presence():
+    """Pilots seen since `since`, most recent first (optional `limit`)"""
+    limit = request.args.get('limit', type=int)
+    
+    with db.connection() as conn:
+        players = presence.active_since(conn.cursor(), presence_since_arg(), limit)
+    
+    return jsonify({'players': players})
+
+def parse_sectors_arg(value):
+    """'1,2,3' -> {1, 2, 3}; empty/missing -> None (whole galaxy)"""
+    if not value:
+        return None
+    return {int(part) for part in value.split(',') if part.strip()}
+
+@app.route('/api/multiplayer/stream', methods=['GET'])
+def presence_stream():
+    """Server-Sent Events: presence join/leave/move/status/update events.
+    
+    `?sectors=1,2` limits the stream to those sectors (default: all).
+    The first frame is a `hello` with the subscription id, followed by a
+    `snapshot` of pilots currently in the subscribed sectors.
+    """
+    try:
+        sectors = parse_sectors_arg(request.args.get('sectors', ''))
+    except ValueError:
+        return jsonify({'error': 'sectors must be a comma-separated list of sector ids'}), 400
+    
+    sub = presence_broadcaster.subscribe(sectors)
+    if sub is None:
+        return jsonify({'error': 'Too many presence subscribers'}), 503
+    
+    since = presence.now_ms() - presence.ACTIVITY_TIMEOUT_MS
+    with db.connection() as conn:
+        c = conn.cursor()
+        if sectors is None:
+            snapshot = presence.active_since(c, since)
+        else:
+            snapshot = [p for sector_id in sorted(sectors) for p in presence.in_sector(c, sector_id, since)]
+    
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            yield format_sse('hello', {'subscription': sub.id, 'sectors': sorted(sectors) if sectors else None})
+            yield format_sse('snapshot', {'players': snapshot})
+            while not sub.dropped:
+                try:
+                    message = sub.queue.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield format_sse(message['type'], message['player'], message['id'])
+            # Fell too far behind: tell the client to reconnect for a fresh snapshot
+            yield format_sse('reset', {'reason': 'subscriber queue overflow'})
+        finally:
+            presence_broadcaster.unsubscribe(sub)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/multiplayer/stream/<sub_id>/sectors', methods=['PUT'])
+def update_presence_stream(sub_id):
+    """Change the sectors an open stream listens to (e.g. after a warp)"""
+    data = request.get_json(silent=True) or {}
+    sectors = data.get('sectors')
+    if sectors is not None and (not isinstance(sectors, list) or not all(isinstance(s, int) for s in sectors)):
+        return jsonify({'error': 'sectors must be a list of sector ids or null'}), 400
+    
+    if not presence_broadcaster.set_sectors(sub_id, sectors):
+        return jsonify({'error': 'Subscription not found'}), 404
+    return jsonify({'success': True})
+
+# ============================================
+# GALAXY
+# ============================================
+
+@app.route('/api/galaxy', methods=['GET'])
+def get_galaxy():
+    """Current galaxy version and the URLs of its immutable snapshot parts"""
+    snapshot = galaxy_store.current()
+    if snapshot is None:
+        return jsonify({'error': 'No galaxy has been generated yet'}), 404
+    
+    response = jsonify({'success': True, **snapshot.describe()})
+    response.set_etag(f'galaxy-{snapshot.version}')
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def requested_galaxy():
+    """Snapshot for ?version= (pinned) or the current one; (snapshot, pinned)"""
+    version = request.args.get('version', type=int)
+    if version is not None:
+        return galaxy_store.get(version), True
+    return galaxy_store.current(), False
+
+@app.route('/api/galaxy/sectors', methods=['GET'])
+def get_galaxy_sectors():
+    """Selected sectors (`ids=1,2,3`, up to 500) in the galaxy.js sector shape"""
+    snapshot, pinned = requested_galaxy()
+    if snapshot is None:
+        return jsonify({'error': 'Galaxy not found'}), 404
+    
+    try:
+        ids = sorted({int(part) for part in request.args.get('ids', '').split(',') if part.strip()})
+    except ValueError:
+        return jsonify({'error': 'ids must be a comma-separated list of sector ids'}), 400
+    if not ids or len(ids) > GALAXY_MAX_SECTOR_IDS:
+        return jsonify({'error': f'Request between 1 and {GALAXY_MAX_SECTOR_IDS} sector ids'}), 400
+    if ids[0] < 1 or ids[-1] > snapshot.galaxy.size:
+        return jsonify({'error': 'Sector id out of range'}), 400
+    
+    key = ','.join(map(str, ids))
+    etag = f'{snapshot.version}-s{hashlib.sha1(key.encode()).hexdigest()[:16]}'
+    return galaxy_store.partial_response(etag, lambda: snapshot.sectors_body(ids), request, pinned)
+
+@app.route('/api/galaxy/region', methods=['GET'])
+def get_galaxy_region():
+    """Sectors around sector `center` within `radius` map units (grid-cell granularity)"""
+    snapshot, pinned = requested_galaxy()
+    if snapshot is None:
+        return jsonify({'error': 'Galaxy not found'}), 404
+    
+    center = request.args.get('center', type=int)
+    radius = request.args.get('radius', type=float, default=10.0)
+    if center is None or not 1 <= center <= snapshot.galaxy.size:
+        return jsonify({'error': 'center must be a sector id in this galaxy'}), 400
+    if not 0 <= radius <= GALAXY_MAX_REGION_RADIUS:
+        return jsonify({'error': f'radius must be between 0 and {GALAXY_MAX_REGION_RADIUS:g}'}), 400
+    
+    cell_range, build_body = snapshot.region(center, radius)
+    etag = f"{snapshot.version}-r{'.'.join(map(str, cell_range))}"
+    return galaxy_store.partial_response(etag, build_body, request, pinned)
+
+def sector_arg(name, snapshot):
+    """Required sector id query arg; raises RoutingError when missing or out of range"""
+    value = request.args.get(name, type=int)
+    if value is None or not 1 <= value <= snapshot.galaxy.size:
+        raise RoutingError(f'{name} must be a sector id in this galaxy')
+    return value
+
+@app.errorhandler(RoutingError)
+def handle_routing_error(e):
+    return jsonify({'error': str(e)}), 400
+
+@app.route('/api/galaxy/route', methods=['GET'])
+def get_galaxy_route():
+    """Shortest warp path `from` -> `to` (same path galaxy.js findPath would pick)"""
+    snapshot, _ = requested_galaxy()
+    if snapshot is None:
+        return jsonify({'error': 'Galaxy not found'}), 404
+    
+    source, target = sector_arg('from', snapshot), sector_arg('to', snapshot)
+    path = snapshot.routing.route(source, target)
+    if path is None:
+        return jsonify({'error': 'No route found', 'version': snapshot.version}), 404
+    return jsonify({'success': True, 'version': snapshot.version, 'from': source, 'to': target,
+                    'jumps': len(path) - 1, 'path': path})
+
+@app.route('/api/galaxy/distances', methods=['GET'])
+def get_galaxy_distances():
+    """Jumps from `from` to every sector (`jumps[i]` is sector i+1; null if unreachable)"""
+    snapshot, _ = requested_galaxy()
+    if snapshot is None:
+        return jsonify({'error': 'Galaxy not found'}), 404
+    
+    source = sector_arg('from', snapshot)
+    return jsonify({'success': True, 'version': snapshot.version, 'from': source,
+                    'jumps': snapshot.routing.distances(source)})
+
+@app.route('/api/galaxy/nearest', methods=['GET'])
+def get_galaxy_nearest():
+    """Closest sector (by jumps) for each of `kinds`, e.g.
+    kinds=station,planetType:Desert,class:Military,commodity:Ore"""
+    snapshot, _ = requested_galaxy()
+    if snapshot is None:
+        return jsonify({'error': 'Galaxy not found'}), 404
+    
+    source = sector_arg('from', snapshot)
+    kinds = [kind.strip() for kind in request.args.get('kinds', '').split(',') if kind.strip()]
+    if not kinds or len(kinds) > 20:
+        return jsonify({'error': 'kinds must list 1 to 20 content kinds'}), 400
+    
+    return jsonify({'success': True, 'version': snapshot.version, 'from': source,
+                    'results': {kind: snapshot.routing.nearest(source, kind) for kind in kinds}})
+
+@app.route('/api/galaxy/<int:version>/<part>', methods=['GET'])
+def get_galaxy_part(version, part):
+    """`map` (coordinates + warp arrays) or `contents` of one galaxy version"""
+    if part not in ('map', 'contents'):
+        return jsonify({'error': 'Unknown galaxy part'}), 404
+    snapshot = galaxy_store.get(version)
+    if snapshot is None:
+        return jsonify({'error': 'Galaxy version not found'}), 404
+    return galaxy_store.response(snapshot, part, request)
+
+# ============================================
+# ECONOMY
+# ============================================
+
+@app.errorhandler(economy.TradeError)
+def handle_trade_error(e):
+    return jsonify({'success': False, 'error': str(e)}), e.status
+
+@app.route('/api/economy/market', methods=['GET'])
+def get_market():
+    """Today's prices and live supply at the trading locations in `sectors=1,2,3`"""
+    snapshot = galaxy_store.current()
+    if snapshot is None:
+        return jsonify({'error': 'No galaxy has been generated yet'}), 404
+    
+    try:
+        ids = sorted({int(part) for part in request.args.get('sectors', '').split(',') if part.strip()})
+    except ValueError:
+        return jsonify({'error': 'sectors must be a comma-separated list of sector ids'}), 400
+    if not ids or len(ids) > GALAXY_MAX_SECTOR_IDS:
+        return jsonify({'error': f'Request between 1 and {GALAXY_MAX_SECTOR_IDS} sector ids'}), 400
+    if ids[0] < 1 or ids[-1] > snapshot.galaxy.size:
+        return jsonify({'error': 'Sector id out of range'}), 400
+    
+    response = jsonify({'success': True, **market.listing(snapshot, ids)})
+    response.cache_control.no_cache = True
+    return response
+
+@app.route('/api/economy/trade', methods=['POST'])
+def trade():
+    """Buy or sell at a planet/station in the player's current sector.
+    
+    Body: {"action": "buy"|"sell", "sector": 12, "commodity": "Ore",
+    "quantity": 10, "slot": 0}. `slot` (index in the sector's contents)
+    picks between a planet and a station; by default the first location
+    trading the commodity is used.
+    """
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    
+    if not token:
+        return jsonify({'error': 'No token provided'}), 401
+    
+    session = get_session(token)
+    if not session:
+        return jsonify({'error': 'Invalid token'}), 401
+    
+    snapshot = galaxy_store.current()
+    if snapshot is None:
+        return jsonify({'error': 'No galaxy has been generated yet'}), 404
+    
+    data = request.get_json(force=True, silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Body must be a JSON object'}), 400
+    
+    # Buffered autosave must land first or it would overwrite the trade
+    with write_behind.account_lock(session.account_id):
+        write_behind.flush_account(session.account_id)
+        result = market.trade(snapshot, session.account_id, data.get('action'), data.get('sector'),
+                              data.get('commodity'), data.get('quantity'), slot=data.get('slot'))
+    live_stats.activity(session.account_id)
+    return jsonify(result)
+
 # ============================================
 # ADMIN ENDPOINTS
 # ============================================
@@ -452,20 +1249,12 @@ def verify_admin_token(token):
         # Check if this might be from Electron app (will be implemented in endpoint)
         return None
     
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    c.execute('''SELECT a.id, a.username, a.is_admin 
-                 FROM sessions s 
-                 JOIN accounts a ON s.account_id = a.id 
-                 WHERE s.token = ?''', (token,))
-    result = c.fetchone()
-    conn.close()
+    session = get_session(token)
     
-    if not result or not result[2]:  # Check is_admin flag
+    if not session or not session.is_admin:  # Check is_admin flag
         return None
     
-    return {'id': result[0], 'username': result[1]}
+    return {'id': session.account_id, 'username': session.username}
 
 def is_localhost_request():
     """Check if request is from localhost (Electron Sysop Station)"""
@@ -474,7 +1263,15 @@ def is_localhost_request():
 
 @app.route('/api/admin/players', methods=['GET'])
 def admin_get_players():
-    """Get all players (admin only)"""
+    """List players, one page at a time (admin only)
+    
+    Query args: limit (<= 500), cursor (from nextCursor), sort
+    (lastActivity|username|credits|createdAt|id or an indexed state_fields
+    key: hullPercent, sectorsVisited), order (asc|desc), include (cargo,
+    equipment,gameState,stateFields - gameState only on request), filters
+    banned, admin, activeSince, sector, prefix (username), <field>Below and
+    <field>AtLeast for indexed state_fields keys (e.g. hullPercentBelow=20).
+    """
     # Allow localhost without token (for Electron Sysop Station)
     if not is_localhost_request():
         token = request.headers.get('Authorization', '').replace('Bearer ', '')
@@ -483,49 +1280,17 @@ def admin_get_players():
         if not admin:
             return jsonify({'error': 'Admin access required'}), 403
     
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    try:
+        query, params, keys, sort, limit = player_listing.build_query(request.args)
+    except player_listing.ListingError as e:
+        return jsonify({'error': str(e)}), 400
     
-    # Get all players with account info
-    c.execute('''SELECT p.*, a.username, a.is_admin, a.last_login, a.created_at, a.is_banned
-                 FROM players p 
-                 JOIN accounts a ON p.account_id = a.id 
-                 ORDER BY p.last_activity DESC''')
+    write_behind.flush()
     
-    rows = c.fetchall()
-    conn.close()
+    with db.connection() as conn:
+        rows = conn.execute(query, params).fetchall()
     
-    players = []
-    for row in rows:
-        try:
-            game_state = json.loads(row[10]) if row[10] else {}
-            cargo = json.loads(row[8]) if row[8] else {}
-            equipment = json.loads(row[9]) if row[9] else {}
-        except:
-            game_state = {}
-            cargo = {}
-            equipment = {}
-        
-        players.append({
-            'username': row[13],  # Fixed: was row[12]
-            'pilotName': row[2],
-            'shipName': row[3],
-            'credits': row[4],
-            'turns': row[5],
-            'currentSector': row[6],
-            'shipType': row[7],
-            'cargo': cargo,
-            'equipment': equipment,
-            'gameState': game_state,
-            'lastActivity': row[11],
-            'shipVariant': row[12],  # Added
-            'lastLogin': row[15],  # Fixed: was row[14]
-            'createdAt': row[16],  # Fixed: was row[15]
-            'isAdmin': bool(row[14]),  # Fixed: was row[13]
-            'isBanned': bool(row[17])  # Fixed: was row[16]
-        })
-    
-    return jsonify({'players': players})
+    return jsonify(player_listing.rows_to_page(rows, keys, sort, limit))
 
 @app.route('/api/admin/player/<username>', methods=['GET'])
 def admin_get_player(username):
@@ -538,16 +1303,17 @@ def admin_get_player(username):
         if not admin:
             return jsonify({'error': 'Admin access required'}), 403
     
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    write_behind.flush()
     
-    c.execute('''SELECT p.*, a.username, a.is_admin, a.last_login, a.created_at, a.is_banned
-                 FROM players p 
-                 JOIN accounts a ON p.account_id = a.id 
-                 WHERE a.username = ?''', (username,))
+    with db.connection() as conn:
+        c = conn.cursor()
     
-    row = c.fetchone()
-    conn.close()
+        c.execute(f'''SELECT {PLAYER_COLUMNS}, a.username, a.is_admin, a.last_login, a.created_at, a.is_banned
+                     FROM players p 
+                     JOIN accounts a ON p.account_id = a.id 
+                     WHERE a.username = ?''', (username,))
+    
+        row = c.fetchone()
     
     if not row:
         return jsonify({'error': 'Player not found'}), 404
@@ -562,7 +1328,7 @@ def admin_get_player(username):
         equipment = {}
     
     player = {
-        'username': row[12],
+        'username': row[13],
         'pilotName': row[2],
         'shipName': row[3],
         'credits': row[4],
@@ -573,10 +1339,11 @@ def admin_get_player(username):
         'equipment': equipment,
         'gameState': game_state,
         'lastActivity': row[11],
-        'lastLogin': row[14],
-        'createdAt': row[15],
-        'isAdmin': bool(row[13]),
-        'isBanned': bool(row[16])
+        'shipVariant': row[12],
+        'lastLogin': row[15],
+        'createdAt': row[16],
+        'isAdmin': bool(row[14]),
+        'isBanned': bool(row[17])
     }
     
     return jsonify(player)
@@ -593,85 +1360,94 @@ def admin_update_player(username):
             return jsonify({'error': 'Admin access required'}), 403
     
     data = request.json
-    print(f"[ADMIN UPDATE] ========== UPDATING {username} ==========")
-    print(f"[ADMIN UPDATE] Request data: {data}")
-    
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    admin_log.debug('UPDATING %s', username)
+    admin_log.debug('Request data: %s', data)
     
-    # Get player's account_id and current game_state
-    c.execute('SELECT account_id, game_state FROM players WHERE account_id = (SELECT id FROM accounts WHERE username = ?)', (username,))
-    result = c.fetchone()
-    
-    if not result:
-        conn.close()
-        print(f"[ADMIN UPDATE] ERROR: Player not found")
+    with db.connection() as conn:
+        row = conn.execute('SELECT id FROM accounts WHERE username = ?', (username,)).fetchone()
+    if not row:
+        admin_log.warning('Player not found')
         return jsonify({'error': 'Player not found'}), 404
-    
-    account_id = result[0]
-    print(f"[ADMIN UPDATE] Found account_id: {account_id}")
-    
-    # Parse existing game_state
-    try:
-        game_state = json.loads(result[1]) if result[1] else {}
-        print(f"[ADMIN UPDATE] Existing game_state keys: {list(game_state.keys())}")
-        if 'ship' in game_state:
-            print(f"[ADMIN UPDATE] Existing ship.hull: {game_state['ship'].get('hull')}, ship.fuel: {game_state['ship'].get('fuel')}")
-    except:
-        game_state = {}
-        print(f"[ADMIN UPDATE] No existing game_state, starting fresh")
-    
-    # Update player fields
-    updates = []
-    values = []
-    
-    if 'credits' in data:
-        updates.append('credits = ?')
-        values.append(data['credits'])
-        print(f"[ADMIN UPDATE] Setting credits = {data['credits']}")
-    if 'turns' in data:
-        updates.append('turns = ?')
-        values.append(data['turns'])
-        print(f"[ADMIN UPDATE] Setting turns = {data['turns']}")
-    if 'currentSector' in data:
-        updates.append('current_sector = ?')
-        values.append(data['currentSector'])
-        print(f"[ADMIN UPDATE] Setting current_sector = {data['currentSector']}")
-    if 'shipName' in data:
-        updates.append('ship_name = ?')
-        values.append(data['shipName'])
-    if 'shipType' in data:
-        updates.append('ship_type = ?')
-        values.append(data['shipType'])
-    
-    # Handle hull and fuel - these go in game_state.ship
-    if 'hull' in data or 'fuel' in data:
-        if 'ship' not in game_state:
-            game_state['ship'] = {}
-        if 'hull' in data:
-            game_state['ship']['hull'] = data['hull']
-            print(f"[ADMIN UPDATE] Setting game_state.ship.hull = {data['hull']}")
-        if 'fuel' in data:
-            game_state['ship']['fuel'] = data['fuel']
-            print(f"[ADMIN UPDATE] Setting game_state.ship.fuel = {data['fuel']}")
-        # Update game_state JSON
-        updates.append('game_state = ?')
-        values.append(json.dumps(game_state))
-    elif 'gameState' in data:
-        updates.append('game_state = ?')
-        values.append(json.dumps(data['gameState']))
-    
-    if updates:
-        query = f"UPDATE players SET {', '.join(updates)} WHERE account_id = ?"
-        values.append(account_id)
-        print(f"[ADMIN UPDATE] Query: {query}")
-        print(f"[ADMIN UPDATE] Values: {values}")
-        c.execute(query, values)
-    
-    conn.commit()
-    conn.close()
-    
-    print(f"[ADMIN UPDATE] ========== COMPLETE ==========")
+    account_id = row[0]
+    admin_log.debug('Found account_id: %s', account_id)
+    
+    # Land any buffered autosave before editing on top of it, and keep
+    # new ones out until this edit commits
+    with write_behind.account_lock(account_id):
+        write_behind.flush_account(account_id)
+    
+        with db.connection() as conn:
+            c = conn.cursor()
+    
+            # Get player's current game_state
+            c.execute('SELECT game_state FROM players WHERE account_id = ?', (account_id,))
+            result = c.fetchone()
+    
+            if not result:
+                admin_log.warning('Player not found')
+                return jsonify({'error': 'Player not found'}), 404
+    
+            # Parse existing game_state
+            try:
+                game_state = json.loads(result[0]) if result[0] else {}
+                admin_log.debug('Existing game_state keys: %s', game_state.keys())
+                if 'ship' in game_state:
+                    admin_log.debug('Existing ship.hull: %s, ship.fuel: %s', game_state['ship'].get('hull'), game_state['ship'].get('fuel'))
+            except:
+                game_state = {}
+                admin_log.debug('No existing game_state, starting fresh')
+    
+            # Update player fields
+            updates = []
+            values = []
+    
+            if 'credits' in data:
+                updates.append('credits = ?')
+                values.append(data['credits'])
+                admin_log.debug('Setting credits = %s', data['credits'])
+            if 'turns' in data:
+                updates.append('turns = ?')
+                values.append(data['turns'])
+                admin_log.debug('Setting turns = %s', data['turns'])
+            if 'currentSector' in data:
+                updates.append('current_sector = ?')
+                values.append(data['currentSector'])
+                admin_log.debug('Setting current_sector = %s', data['currentSector'])
+            if 'shipName' in data:
+                updates.append('ship_name = ?')
+                values.append(data['shipName'])
+            if 'shipType' in data:
+                updates.append('ship_type = ?')
+                values.append(data['shipType'])
+    
+            # Handle hull and fuel - these go in game_state.ship
+            if 'hull' in data or 'fuel' in data:
+                if 'ship' not in game_state:
+                    game_state['ship'] = {}
+                if 'hull' in data:
+                    game_state['ship']['hull'] = data['hull']
+                    admin_log.debug('Setting game_state.ship.hull = %s', data['hull'])
+                if 'fuel' in data:
+                    game_state['ship']['fuel'] = data['fuel']
+                    admin_log.debug('Setting game_state.ship.fuel = %s', data['fuel'])
+                # Update game_state JSON
+                updates.append('game_state = ?')
+                values.append(json.dumps(game_state))
+            elif 'gameState' in data:
+                updates.append('game_state = ?')
+                values.append(json.dumps(data['gameState']))
+    
+            if updates:
+                updates.append('version = version + 1')
+                query = f"UPDATE players SET {', '.join(updates)} WHERE account_id = ?"
+                values.append(account_id)
+                admin_log.debug('Query: %s', query)
+                admin_log.debug('Values: %s', values)
+                c.execute(query, values)
+    
+            conn.commit()
+    
+    admin_log.debug('COMPLETE')
     return jsonify({'success': True})
 
 @app.route('/api/admin/player/<username>', methods=['DELETE'])
@@ -685,30 +1461,36 @@ def admin_delete_player(username):
         if not admin:
             return jsonify({'error': 'Admin access required'}), 403
     
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # Get account_id
-    c.execute('SELECT id FROM accounts WHERE username = ?', (username,))
-    result = c.fetchone()
+    with db.connection() as conn:
+        # Get account_id
+        result = conn.execute('SELECT id, is_admin FROM accounts WHERE username = ?', (username,)).fetchone()
     
     if not result:
-        conn.close()
         return jsonify({'error': 'Player not found'}), 404
     
     account_id = result[0]
     
-    # Delete player data
-    c.execute('DELETE FROM players WHERE account_id = ?', (account_id,))
+    # Held like update_player does, so no autosave is buffered between the
+    # discard and the DELETE and then flushed onto the deleted account
+    with write_behind.account_lock(account_id):
+        write_behind.discard(account_id)
+    
+        with db.connection() as conn:
+            c = conn.cursor()
+    
+            # Delete player data
+            c.execute('DELETE FROM players WHERE account_id = ?', (account_id,))
+    
+            # Delete sessions
+            c.execute('DELETE FROM sessions WHERE account_id = ?', (account_id,))
     
-    # Delete sessions
-    c.execute('DELETE FROM sessions WHERE account_id = ?', (account_id,))
+            # Delete account
+            c.execute('DELETE FROM accounts WHERE id = ?', (account_id,))
     
-    # Delete account
-    c.execute('DELETE FROM accounts WHERE id = ?', (account_id,))
+            conn.commit()
     
-    conn.commit()
-    conn.close()
+        session_cache.invalidate_account(account_id)
+    live_stats.player_deleted(account_id, was_admin=bool(result[1]))
     
     return jsonify({'success': True, 'message': f'Player {username} deleted'})
 
@@ -723,24 +1505,25 @@ def admin_kick_player(username):
         if not admin:
             return jsonify({'error': 'Admin access required'}), 403
     
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    with db.connection() as conn:
+        c = conn.cursor()
     
-    # Get account_id
-    c.execute('SELECT id FROM accounts WHERE username = ?', (username,))
-    result = c.fetchone()
+        # Get account_id
+        c.execute('SELECT id FROM accounts WHERE username = ?', (username,))
+        result = c.fetchone()
     
-    if not result:
-        conn.close()
-        return jsonify({'error': 'Player not found'}), 404
+        if not result:
+            return jsonify({'error': 'Player not found'}), 404
     
-    account_id = result[0]
+        account_id = result[0]
     
-    # Delete all sessions for this account (forces re-login)
-    c.execute('DELETE FROM sessions WHERE account_id = ?', (account_id,))
+        # Delete all sessions for this account (forces re-login)
+        c.execute('DELETE FROM sessions WHERE account_id = ?', (account_id,))
+    
+        conn.commit()
     
-    conn.commit()
-    conn.close()
+    session_cache.invalidate_account(account_id)
+    live_stats.sessions_ended(account_id)
     
     return jsonify({'success': True, 'message': f'Player {username} kicked'})
 
@@ -758,26 +1541,39 @@ def admin_ban_player(username):
     data = request.json
     is_banned = data.get('banned', True)
     
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    with db.connection() as conn:
+        c = conn.cursor()
     
-    # Update ban status
-    c.execute('UPDATE accounts SET is_banned = ? WHERE username = ?', (1 if is_banned else 0, username))
+        # Update ban status
+        c.execute('UPDATE accounts SET is_banned = ? WHERE username = ?', (1 if is_banned else 0, username))
     
-    # If banning, also kick them
-    if is_banned:
-        c.execute('DELETE FROM sessions WHERE account_id = (SELECT id FROM accounts WHERE username = ?)', (username,))
+        # If banning, also kick them
+        if is_banned:
+            c.execute('DELETE FROM sessions WHERE account_id = (SELECT id FROM accounts WHERE username = ?)', (username,))
+    
+        c.execute('SELECT id FROM accounts WHERE username = ?', (username,))
+        result = c.fetchone()
     
-    conn.commit()
-    conn.close()
+        conn.commit()
+    
+    # Cached sessions carry is_banned, so drop them either way
+    if result:
+        session_cache.invalidate_account(result[0])
+        if is_banned:
+            live_stats.sessions_ended(result[0])
     
     action = 'banned' if is_banned else 'unbanned'
     return jsonify({'success': True, 'message': f'Player {username} {action}'})
 
 @app.route('/api/admin/reset-galaxy', methods=['POST'])
 def admin_reset_galaxy():
-    """Reset all players to starting values for galaxy regeneration (admin only)"""
+    """Start resetting all players to starting values for galaxy regeneration (admin only).
+    
+    Runs in the background in chunks; poll GET /api/admin/reset-galaxy
+    for progress. An interrupted reset is resumed instead of restarted.
+    """
     # Allow localhost without token (for Electron Sysop Station)
+    admin = None
     if not is_localhost_request():
         token = request.headers.get('Authorization', '').replace('Bearer ', '')
         admin = verify_admin_token(token)
@@ -785,57 +1581,65 @@ def admin_reset_galaxy():
         if not admin:
             return jsonify({'error': 'Admin access required'}), 403
     
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # Get settings from database
-    c.execute('SELECT key, value FROM game_settings')
-    settings = {row[0]: row[1] for row in c.fetchall()}
-    
-    # Use settings or defaults
-    starting_sector = int(settings.get('starting_sector', '1'))
-    starting_credits = int(settings.get('starting_credits', '10000'))
-    starting_turns = int(settings.get('starting_turns', '50'))
-    starting_fuel = int(settings.get('starting_fuel', '100'))
-    starting_hull = int(settings.get('starting_hull', '100'))
-    starting_shields = int(settings.get('starting_shields', '100'))
-    
-    STARTING_CARGO = json.dumps({})
-    STARTING_EQUIPMENT = json.dumps({})
-    STARTING_GAME_STATE = json.dumps({})
-    
-    # Reset all non-admin players
-    c.execute('''
-        UPDATE players SET
-            credits = ?,
-            turns = ?,
-            current_sector = ?,
-            cargo = ?,
-            equipment = ?,
-            hull = ?,
-            shields = ?,
-            fuel = ?,
-            game_state = ?
-        WHERE account_id IN (SELECT id FROM accounts WHERE is_admin = 0)
-    ''', (starting_credits, starting_turns, starting_sector, 
-          STARTING_CARGO, STARTING_EQUIPMENT, starting_hull, starting_shields,
-          starting_fuel, STARTING_GAME_STATE))
-    
-    rows_affected = c.rowcount
-    
-    conn.commit()
-    conn.close()
+    # Buffered autosaves written after the reset would undo it
+    write_behind.flush()
+    
+    try:
+        job = reset_jobs.start(dict(settings_cache.values), started_by=admin['username'] if admin else 'localhost')
+    except galaxy_reset.ResetBusy as e:
+        return jsonify({'error': str(e), 'job': reset_jobs.status()}), 409
     
+    admin_log.info('Galaxy reset job %s (%s players)', job['id'], job['total'])
     return jsonify({
-        'success': True, 
-        'message': f'Reset {rows_affected} players to starting values',
-        'playersReset': rows_affected,
+        'success': True,
+        'message': f"Resetting {job['total']} players to starting values",
+        'job': job,
         'settings': {
-            'sector': starting_sector,
-            'credits': starting_credits,
-            'turns': starting_turns
+            'sector': job['settings']['starting_sector'],
+            'credits': job['settings']['starting_credits'],
+            'turns': job['settings']['starting_turns']
         }
-    })
+    }), 202
+
+@app.route('/api/admin/reset-galaxy', methods=['GET'])
+def admin_reset_galaxy_status():
+    """Progress of the latest (or `?id=`) galaxy reset job (admin only)"""
+    if not is_localhost_request():
+        token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        admin = verify_admin_token(token)
+        if not admin:
+            return jsonify({'error': 'Admin access required'}), 403
+    
+    job = reset_jobs.status(request.args.get('id', type=int))
+    if job is None:
+        return jsonify({'error': 'No reset job found'}), 404
+    return jsonify({'success': True, 'job': job})
+
+@app.route('/api/admin/galaxy/generate', methods=['POST'])
+def admin_generate_galaxy():
+    """Generate and publish a new galaxy from `size` and optional `seed` (admin only)"""
+    admin = None
+    if not is_localhost_request():
+        token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        admin = verify_admin_token(token)
+        if not admin:
+            return jsonify({'error': 'Admin access required'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    size = data.get('size', galaxy.DEFAULT_SIZE)
+    seed = data.get('seed')
+    if not isinstance(size, int) or not galaxy.MIN_SIZE <= size <= GALAXY_MAX_SIZE:
+        return jsonify({'error': f'size must be an integer from {galaxy.MIN_SIZE} to {GALAXY_MAX_SIZE}'}), 400
+    if seed is not None and (isinstance(seed, bool) or not isinstance(seed, (str, int))):
+        return jsonify({'error': 'seed must be a string or integer'}), 400
+    
+    try:
+        snapshot = galaxy_store.generate(size, seed, created_by=admin['username'] if admin else 'localhost')
+    except galaxy.GalaxyBusy as e:
+        return jsonify({'error': str(e)}), 409
+    
+    admin_log.info('Generated galaxy v%s: %s sectors, seed %s', snapshot.version, size, snapshot.galaxy.seed)
+    return jsonify({'success': True, **snapshot.describe(), 'stats': snapshot.galaxy.stats()})
 
 @app.route('/api/admin/settings', methods=['GET'])
 def admin_get_settings():
@@ -846,23 +1650,7 @@ def admin_get_settings():
         if not admin:
             return jsonify({'error': 'Admin access required'}), 403
     
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT key, value FROM game_settings')
-    settings = {row[0]: row[1] for row in c.fetchall()}
-    conn.close()
-    
-    return jsonify({
-        'success': True,
-        'settings': {
-            'startingSector': int(settings.get('starting_sector', '1')),
-            'startingCredits': int(settings.get('starting_credits', '10000')),
-            'startingTurns': int(settings.get('starting_turns', '50')),
-            'startingFuel': int(settings.get('starting_fuel', '100')),
-            'startingHull': int(settings.get('starting_hull', '100')),
-            'startingShields': int(settings.get('starting_shields', '100'))
-        }
-    })
+    return settings_response()
 
 @app.route('/api/admin/settings', methods=['PUT'])
 def admin_update_settings():
@@ -877,33 +1665,16 @@ def admin_update_settings():
     if not data:
         return jsonify({'error': 'No data provided'}), 400
     
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # Map of API keys to database keys
-    key_map = {
-        'startingSector': 'starting_sector',
-        'startingCredits': 'starting_credits',
-        'startingTurns': 'starting_turns',
-        'startingFuel': 'starting_fuel',
-        'startingHull': 'starting_hull',
-        'startingShields': 'starting_shields'
-    }
-    
-    updated = []
-    for api_key, db_key in key_map.items():
-        if api_key in data:
-            value = str(data[api_key])
-            c.execute('INSERT OR REPLACE INTO game_settings (key, value) VALUES (?, ?)', (db_key, value))
-            updated.append(api_key)
-    
-    conn.commit()
-    conn.close()
+    try:
+        updated = settings_cache.update(data)
+    except game_settings.SettingsError as e:
+        return jsonify({'error': str(e)}), 400
     
     return jsonify({
         'success': True,
         'message': f'Updated settings: {", ".join(updated)}',
-        'updated': updated
+        'updated': updated,
+        'version': settings_cache.version
     })
 
 @app.route('/api/admin/stats', methods=['GET'])
@@ -917,35 +1688,107 @@ def admin_get_stats():
         if not admin:
             return jsonify({'error': 'Admin access required'}), 403
     
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # Total players
-    c.execute('SELECT COUNT(*) FROM accounts WHERE is_admin = 0')
-    total_players = c.fetchone()[0]
-    
-    # Active sessions (players logged in)
-    c.execute('SELECT COUNT(DISTINCT account_id) FROM sessions')
-    active_sessions = c.fetchone()[0]
+    # Served from memory; ?refresh=1 re-counts from the database
+    if request.args.get('refresh') == '1':
+        with db.connection() as conn:
+            live_stats.load(conn)
     
-    # Players active in last 10 minutes
-    from datetime import datetime, timedelta
-    ten_min_ago = (datetime.now() - timedelta(minutes=10)).isoformat()
-    c.execute('SELECT COUNT(*) FROM players WHERE last_activity > ?', (ten_min_ago,))
-    recently_active = c.fetchone()[0]
+    return jsonify(live_stats.snapshot())
+
+@app.route('/api/admin/stats/history', methods=['GET'])
+def admin_get_stats_history():
+    """Active players per minute, last 24h by default (admin only)"""
+    if not is_localhost_request():
+        token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        admin = verify_admin_token(token)
+        if not admin:
+            return jsonify({'error': 'Admin access required'}), 403
     
-    # Total connections (sessions)
-    c.execute('SELECT COUNT(*) FROM sessions')
-    total_connections = c.fetchone()[0]
+    minutes = request.args.get('minutes', type=int, default=24 * 60)
     
-    conn.close()
+    return jsonify({
+        'success': True,
+        'history': live_stats.history(max(1, minutes))
+    })
+
+@app.route('/api/admin/db/pool', methods=['GET'])
+def admin_get_db_pool():
+    """Get database connection pool metrics (admin only)"""
+    if not is_localhost_request():
+        token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        admin = verify_admin_token(token)
+        if not admin:
+            return jsonify({'error': 'Admin access required'}), 403
     
     return jsonify({
-        'totalPlayers': total_players,
-        'activeSessions': active_sessions,
-        'recentlyActive': recently_active,
-        'totalConnections': total_connections
+        'success': True,
+        'pool': db.stats(),
+        'sessionCache': session_cache.stats(),
+        'writeBehind': write_behind.stats(),
+        'kdf': kdf.stats(),
+        'sessionReaper': session_reaper.stats(),
+        'static': static_files.stats(),
+        'presenceStream': presence_broadcaster.stats(),
+        'galaxy': galaxy_store.stats(),
+        'economy': market.stats(),
+        'settings': settings_cache.stats()
+    })
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Request metrics and component gauges in Prometheus text format (admin only)"""
+    if not is_localhost_request():
+        token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        admin = verify_admin_token(token)
+        if not admin:
+            return jsonify({'error': 'Admin access required'}), 403
+    
+    body = request_metrics.render({
+        'db_pool': db.stats(),
+        'session_cache': session_cache.stats(),
+        'write_behind': write_behind.stats(),
+        'kdf': kdf.stats(),
+        'static': static_files.stats(),
+        'presence_stream': presence_broadcaster.stats(),
+        'galaxy': galaxy_store.stats(),
+        'economy': market.stats(),
+        'settings': settings_cache.stats()
     })
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/admin/profile', methods=['POST'])
+def admin_profile():
+    """Sample every thread's stack for `seconds` and return collapsed stacks (admin only)
+    
+    Query: seconds (default 10, max 60), intervalMs (default 5),
+    idle=1 to keep threads parked waiting for work, format=json for a
+    leaf-frame summary instead of the folded file.
+    """
+    if not is_localhost_request():
+        token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        admin = verify_admin_token(token)
+        if not admin:
+            return jsonify({'error': 'Admin access required'}), 403
+    
+    seconds = request.args.get('seconds', type=float, default=10.0)
+    interval_ms = request.args.get('intervalMs', type=float, default=5.0)
+    if not 0 < seconds <= 60 or not interval_ms > 0:
+        return jsonify({'error': 'seconds must be in (0, 60] and intervalMs > 0'}), 400
+    
+    sampler = StackSampler(interval=interval_ms / 1000, include_idle=request.args.get('idle') == '1')
+    admin_log.info('Profiling process for %.1fs', seconds)
+    try:
+        sampler.run(seconds)
+    except ProfilerBusy:
+        return jsonify({'error': 'A profile is already running'}), 409
+    
+    if request.args.get('format') == 'json':
+        return jsonify({'success': True, **sampler.summary()})
+    
+    filename = f"adastra-{datetime.now().strftime('%Y%m%d-%H%M%S')}.folded"
+    return Response(sampler.collapsed(), mimetype='text/plain',
+                    headers={'Content-Disposition': f'attachment; filename={filename}',
+                             'X-Profile-Samples': str(sampler.samples)})
 
 # ============================================
 # STATIC FILE SERVING (Must be LAST!)
@@ -957,70 +1800,50 @@ def admin_get_stats():
 @app.route('/<path:path>')
 def serve(path):
     # Serve index.html for root
-    if path == '' or path == 'index.html':
-        try:
-            with open('index.html', 'r', encoding='utf-8') as f:
-                return f.read()
-        except Exception as e:
-            return f"Error loading index.html: {e}", 500
+    if path == '':
+        path = 'index.html'
     
-    # Serve other files
     try:
-        file_path = path
-        with open(file_path, 'rb') as f:
-            content = f.read()
-        
-        # Determine content type
-        if path.endswith('.css'):
-            return content, 200, {'Content-Type': 'text/css'}
-        elif path.endswith('.js'):
-            return content, 200, {'Content-Type': 'application/javascript'}
-        elif path.endswith('.png'):
-            return content, 200, {'Content-Type': 'image/png'}
-        elif path.endswith('.jpg') or path.endswith('.jpeg'):
-            return content, 200, {'Content-Type': 'image/jpeg'}
-        elif path.endswith('.svg'):
-            return content, 200, {'Content-Type': 'image/svg+xml'}
-        elif path.endswith('.mp3'):
-            return content, 200, {'Content-Type': 'audio/mpeg'}
-        else:
-            return content
-    except FileNotFoundError:
-        return f"File not found: {path}", 404
+        return static_files.response(path, request)
     except Exception as e:
         return f"Error loading {path}: {e}", 500
 
 
 def promote_to_admin(username: str):
     """Ensure the given username has admin privileges (is_admin = 1)."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('UPDATE accounts SET is_admin = 1 WHERE username = ?', (username,))
-    conn.commit()
-    conn.close()
+    with db.connection() as conn:
+        c = conn.cursor()
+        c.execute('UPDATE accounts SET is_admin = 1 WHERE username = ?', (username,))
+        c.execute('SELECT id FROM accounts WHERE username = ?', (username,))
+        result = c.fetchone()
+        conn.commit()
+    
+    if result:
+        session_cache.invalidate_account(result[0])
+        # Admins are not counted as players
+        with db.connection() as conn:
+            live_stats.load(conn)
 
 def create_admin_account(username: str, password: str):
     """Create admin account if it doesn't exist."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # Check if account exists
-    c.execute('SELECT id FROM accounts WHERE username = ?', (username,))
-    if c.execute('SELECT id FROM accounts WHERE username = ?', (username,)).fetchone():
-        print(f"[INFO] Admin account '{username}' already exists")
-        conn.close()
-        promote_to_admin(username)
-        return
-    
-    # Create admin account
-    password_hash = hash_password(password)
-    created_at = datetime.now().isoformat()
-    c.execute('''INSERT INTO accounts (username, password_hash, created_at, is_admin)
-                 VALUES (?, ?, ?, 1)''',
-              (username, password_hash, created_at))
-    conn.commit()
-    conn.close()
-    print(f"[OK] Admin account '{username}' created successfully")
+    with db.connection() as conn:
+        c = conn.cursor()
+    
+        # Check if account exists
+        c.execute('SELECT id FROM accounts WHERE username = ?', (username,))
+        if c.execute('SELECT id FROM accounts WHERE username = ?', (username,)).fetchone():
+            log.info("Admin account '%s' already exists", username)
+            promote_to_admin(username)
+            return
+    
+        # Create admin account
+        password_hash = hash_password(password)
+        created_at = datetime.now().isoformat()
+        c.execute('''INSERT INTO accounts (username, password_hash, created_at, is_admin)
+                     VALUES (?, ?, ?, 1)''',
+                  (username, password_hash, created_at))
+        conn.commit()
+    log.info("Admin account '%s' created successfully", username)
 
 if __name__ == '__main__':
     print("========================================")
@@ -1031,13 +1854,40 @@ if __name__ == '__main__':
     # Initialize database
     init_db()
     
+    # Benchmark scrypt cost for this machine
+    kdf_params = calibrate_kdf(KDF_TARGET_MS)
+    log.info('Password hashing: scrypt N=%s r=%s p=%s (target %.0fms, measured %s)',
+             kdf_params['n'], kdf_params['r'], kdf_params['p'], KDF_TARGET_MS, kdf_params['timingsMs'])
+    
     # Create default admin account (username: admin, password: admin123)
     create_admin_account("admin", "admin123")
-    print("[INFO] Admin credentials: username='admin' password='admin123'")
+    log.info("Admin credentials: username='admin' password='admin123'")
+    
+    if WRITE_BEHIND:
+        write_behind.start()
+        log.info('Write-behind saves enabled (flush every %ss)', write_behind.interval)
+    
+    session_reaper.start()
+    market.start()
+    reset_jobs.resume()
+    log.info('Sessions last %gh (sliding), max %s per account',
+             SESSION_TTL_SECONDS / 3600, MAX_SESSIONS_PER_ACCOUNT)
+    
+    # Treat SIGTERM like Ctrl+C so buffered saves are flushed on the way out
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     
     print()
     print("Starting server on http://localhost:8000")
     print("Press Ctrl+C to stop")
     print()
     
-    app.run(host='0.0.0.0', port=8000, debug=False, use_reloader=False)
\ No newline at end of file
+    try:
+        app.run(host='0.0.0.0', port=8000, debug=False, use_reloader=False)
+    finally:
+        session_reaper.stop()
+        market.stop()
+        reset_jobs.stop()
+        write_behind.stop()
+        kdf.shutdown()
+        db.close_all()
+        stop_logging()
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""
+Ad Astra - Session Token Cache
+Process-level token -> session lookup with TTL and LRU eviction
+"""
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# expires_at is a unix timestamp; get_session() checks it on every lookup
+Session = namedtuple('Session', ['account_id', 'username', 'is_admin', 'is_banned', 'expires_at'])
+
+
+class SessionCache:
+    """LRU cache of validated session tokens.
+
+    Entries expire after `ttl` seconds so changes made outside this process
+    are picked up eventually; everything done through the API (logout, kick,
+    ban, delete) invalidates explicitly. Every invalidation bumps a
+    generation counter; a lookup that read the database before an
+    invalidation passes its older generation to put() and is not cached,
+    so a kicked or deleted session cannot be re-cached by a racing miss.
+    """
+
+    def __init__(self, max_entries=10000, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # token -> (Session, expires_at)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, token):
+        """Return the cached Session for a token, or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self._misses += 1
+                return None
+            session, expires_at = entry
+            if expires_at <= now:
+                del self._entries[token]
+                self._misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self._hits += 1
+            return session
+
+    def generation(self):
+        """Current invalidation generation; read it before the database lookup"""
+        with self._lock:
+            return self._generation
+
+    def put(self, token, session, generation=None):
+        """Cache a validated session, unless an invalidation happened since
+        `generation` was read; returns whether it was cached"""
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return False
+            self._entries[token] = (session, time.monotonic() + self.ttl)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+        return True
+
+    def invalidate(self, token):
+        """Drop a single token (logout)"""
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(token, None)
+
+    def invalidate_account(self, account_id):
+        """Drop every token belonging to an account (kick/ban/delete)"""
+        with self._lock:
+            self._generation += 1
+            stale = [t for t, (s, _) in self._entries.items() if s.account_id == account_id]
+            for token in stale:
+                del self._entries[token]
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'maxEntries': self.max_entries,
+                'ttlSeconds': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+            }
@@ -0,0 +1,127 @@
+"""
+Ad Astra - Session Expiry
+Expiry timestamps, per-account session caps and the background reaper
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+
+log = logging.getLogger('adastra.sessions')
+
+
+def to_db_time(epoch):
+    """sessions.expires_at is stored as local ISO text, like every other timestamp"""
+    return datetime.fromtimestamp(epoch).isoformat()
+
+
+def from_db_time(text):
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def migrate_placeholder_expiry(c, ttl_seconds):
+    """Older rows stored expires_at = now() right after created_at (a TODO).
+    Give them a real lifetime counted from created_at."""
+    c.execute('''SELECT id, created_at FROM sessions
+                 WHERE julianday(expires_at) - julianday(created_at) < 1.0 / 1440''')
+    rows = c.fetchall()
+    for session_id, created_at in rows:
+        c.execute('UPDATE sessions SET expires_at = ? WHERE id = ?',
+                  (to_db_time(from_db_time(created_at) + ttl_seconds), session_id))
+    return len(rows)
+
+
+def enforce_session_cap(c, account_id, max_sessions):
+    """Delete the oldest sessions beyond `max_sessions`; returns their tokens"""
+    c.execute('''SELECT id, token FROM sessions WHERE account_id = ?
+                 ORDER BY id DESC LIMIT -1 OFFSET ?''', (account_id, max_sessions))
+    rows = c.fetchall()
+    if rows:
+        c.executemany('DELETE FROM sessions WHERE id = ?', [(row[0],) for row in rows])
+    return [row[1] for row in rows]
+
+
+class SessionReaper:
+    """Background thread deleting expired sessions in small batches.
+
+    Each batch is its own short transaction with a pause in between, so
+    the reaper never holds the write lock long enough to delay saves.
+    `on_reaped(rows)` receives the (token, account_id) pairs removed.
+    """
+
+    def __init__(self, pool, interval=60.0, batch_size=500, pause=0.05, on_reaped=None):
+        self.pool = pool
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self.on_reaped = on_reaped
+        self._stopping = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._reaped_total = 0
+        self._runs_total = 0
+        self._last_run = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='session-reaper', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.reap()
+            except Exception as e:
+                log.error('Session reaper failed: %s', e)
+
+    def reap(self):
+        """Delete all currently expired sessions; returns how many"""
+        now = to_db_time(time.time())
+        removed = 0
+        while True:
+            with self.pool.connection() as conn:
+                rows = conn.execute('''SELECT id, token, account_id FROM sessions
+                                       WHERE expires_at < ? LIMIT ?''',
+                                    (now, self.batch_size)).fetchall()
+                if rows:
+                    conn.executemany('DELETE FROM sessions WHERE id = ?', [(row[0],) for row in rows])
+                    conn.commit()
+            if rows and self.on_reaped:
+                self.on_reaped([(row[1], row[2]) for row in rows])
+            removed += len(rows)
+            if len(rows) < self.batch_size or self._stopping.is_set():
+                break
+            time.sleep(self.pause)
+
+        with self._lock:
+            self._reaped_total += removed
+            self._runs_total += 1
+            self._last_run = datetime.now().isoformat()
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {
+                'running': self.running,
+                'intervalSeconds': self.interval,
+                'batchSize': self.batch_size,
+                'runsTotal': self._runs_total,
+                'reapedTotal': self._reaped_total,
+                'lastRun': self._last_run,
+            }
@@ -0,0 +1,86 @@
+"""
+Ad Astra - Promoted game_state Fields
+Indexed virtual columns over players.game_state (SQLite JSON1), so admin
+queries can filter and sort on ship and stats values in SQL
+"""
+
+import logging
+import sqlite3
+from collections import namedtuple
+
+log = logging.getLogger('adastra.schema')
+
+# Generated columns need SQLite 3.31; dropping retired ones needs 3.35
+MIN_SQLITE = (3, 31, 0)
+COLUMN_PREFIX = 'gs_'
+
+# api_key: name in listings and query args; expr: SQL over game_state or
+# over fields defined earlier in the list; index: create an index on it
+# (only indexed fields can be sorted or filtered on in the admin listing)
+StateField = namedtuple('StateField', 'api_key column sql_type expr index')
+
+
+def _path(path):
+    """json_extract guarded against rows whose game_state is not JSON ('' or junk)"""
+    return f"CASE WHEN json_valid(game_state) THEN json_extract(game_state, '{path}') END"
+
+
+# Add a field by appending it here; to change an expression, give the field
+# a new column name (the old column is dropped on the next start). Each
+# index costs every save a json_extract and an index update, so index only
+# what the admin listing sorts or filters on.
+FIELDS = (
+    StateField('shipHull', 'gs_ship_hull', 'REAL', _path('$.ship.hull'), False),
+    StateField('shipHullMax', 'gs_ship_hull_max', 'REAL', _path('$.ship.hullMax'), False),
+    StateField('hullPercent', 'gs_hull_percent', 'REAL',
+               'CASE WHEN gs_ship_hull_max > 0 THEN 100.0 * gs_ship_hull / gs_ship_hull_max END', True),
+    StateField('shipFuel', 'gs_ship_fuel', 'REAL', _path('$.ship.fuel'), False),
+    StateField('sectorsVisited', 'gs_sectors_visited', 'INTEGER', _path('$.stats.sectorsVisited'), True),
+    StateField('tradesCompleted', 'gs_trades_completed', 'INTEGER', _path('$.stats.tradesCompleted'), False),
+    StateField('combatsWon', 'gs_combats_won', 'INTEGER', _path('$.stats.combatsWon'), False),
+)
+BY_API_KEY = {field.api_key: field for field in FIELDS}
+INDEXED = tuple(field for field in FIELDS if field.index)
+
+# Set by migrate(): False on SQLite builds without generated columns
+available = False
+
+
+def migrate(c):
+    """Add missing generated columns and their indexes, drop retired ones.
+
+    Columns are VIRTUAL, so the table itself stores nothing extra, but
+    every write to game_state recomputes the indexed fields and updates
+    their indexes. Unindexed fields cost nothing until they are read.
+    """
+    global available
+    if sqlite3.sqlite_version_info < MIN_SQLITE:
+        log.warning('SQLite %s has no generated columns; game_state fields are not indexed',
+                    sqlite3.sqlite_version)
+        available = False
+        return
+
+    # table_xinfo also lists generated (hidden) columns
+    existing = {row[1] for row in c.execute('PRAGMA table_xinfo(players)')}
+    wanted = {field.column for field in FIELDS}
+
+    retired = [name for name in existing if name.startswith(COLUMN_PREFIX) and name not in wanted]
+    for name in retired:
+        c.execute(f'DROP INDEX IF EXISTS idx_players_{name}')
+        try:
+            c.execute(f'ALTER TABLE players DROP COLUMN {name}')
+            log.info('Dropped retired game_state column %s', name)
+        except sqlite3.OperationalError as e:
+            log.warning('Could not drop retired game_state column %s: %s', name, e)
+
+    for field in FIELDS:
+        if field.column not in existing:
+            c.execute(f'ALTER TABLE players ADD COLUMN {field.column} {field.sql_type} '
+                      f'GENERATED ALWAYS AS ({field.expr}) VIRTUAL')
+            log.info('Added game_state column %s', field.column)
+        if field.index:
+            c.execute(f'CREATE INDEX IF NOT EXISTS idx_players_{field.column} '
+                      f'ON players({field.column}, id)')
+        else:
+            c.execute(f'DROP INDEX IF EXISTS idx_players_{field.column}')
+    available = True
@@ -0,0 +1,248 @@
+"""
+Ad Astra - Static Asset Engine
+mtime-validated in-memory LRU of file bytes with strong ETags,
+conditional GET, Range support and lazily built gzip/brotli variants;
+large media is streamed from disk instead of buffered
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+
+from flask import Response, send_file
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+
+try:
+    import brotli  # Optional: pip install brotli
+except ImportError:
+    brotli = None
+
+# Explicit types for what the game ships; anything else goes through mimetypes
+CONTENT_TYPES = {
+    '.html': 'text/html',
+    '.css': 'text/css',
+    '.js': 'application/javascript',
+    '.json': 'application/json',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.svg': 'image/svg+xml',
+    '.mp3': 'audio/mpeg',
+    '.webm': 'video/webm',
+}
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+MIN_COMPRESS_BYTES = 1024
+
+# Revalidated on every load (cheap 304s); media may be reused for an hour
+REVALIDATE_TYPES = ('text/html', 'text/css', 'application/javascript', 'application/json')
+MEDIA_MAX_AGE = 3600
+
+
+def content_type_for(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in CONTENT_TYPES:
+        return CONTENT_TYPES[ext]
+    guessed, _ = mimetypes.guess_type(path)
+    return guessed or 'application/octet-stream'
+
+
+class Asset:
+    """One cached file: identity bytes plus compressed variants built on demand"""
+
+    __slots__ = ('path', 'mtime_ns', 'size', 'mtime', 'etag', 'data', 'content_type', 'variants')
+
+    def __init__(self, path, st, data):
+        self.path = path
+        self.mtime_ns = st.st_mtime_ns
+        self.size = st.st_size
+        self.mtime = st.st_mtime
+        self.etag = hashlib.sha256(data).hexdigest()[:32]
+        self.data = data
+        self.content_type = content_type_for(path)
+        self.variants = {}  # encoding -> bytes (None when compression did not help)
+
+    @property
+    def compressible(self):
+        return self.size >= MIN_COMPRESS_BYTES and self.content_type.startswith(COMPRESSIBLE_TYPES)
+
+    @property
+    def cached_bytes(self):
+        return len(self.data) + sum(len(v) for v in self.variants.values() if v)
+
+
+class StaticFiles:
+    """Serve files under `root`.
+
+    Every request costs one stat(); the file is only re-read when its
+    mtime or size changed. Cached bytes (including compressed variants)
+    are bounded by `max_bytes`, least recently used first out.
+
+    Files over `stream_threshold` are never held in memory: they go out
+    through the WSGI server's file wrapper (sendfile under gunicorn and
+    friends) or, failing that, fixed-size chunked reads, so concurrent
+    music downloads cost a buffer each rather than a copy of the track.
+    """
+
+    def __init__(self, root, max_bytes=64 * 1024 * 1024, stream_threshold=1024 * 1024):
+        self.root = os.path.realpath(root)
+        self.max_bytes = max_bytes
+        self.stream_threshold = stream_threshold
+        self._assets = OrderedDict()  # absolute path -> Asset
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._not_modified = 0
+        self._variants_built = 0
+        self._streamed_total = 0
+        self._streamed_bytes = 0
+
+    def resolve(self, path):
+        """Absolute path for a URL path, or None if it escapes the root"""
+        full_path = os.path.realpath(os.path.join(self.root, path))
+        if full_path != self.root and not full_path.startswith(self.root + os.sep):
+            return None
+        return full_path
+
+    def load(self, full_path, st=None):
+        """Return a current Asset for the file (raises OSError if unreadable)"""
+        st = st or os.stat(full_path)
+        with self._lock:
+            asset = self._assets.get(full_path)
+            if asset is not None and asset.mtime_ns == st.st_mtime_ns and asset.size == st.st_size:
+                self._assets.move_to_end(full_path)
+                self._hits += 1
+                return asset
+            self._misses += 1
+
+        with open(full_path, 'rb') as f:
+            data = f.read()
+        asset = Asset(full_path, st, data)
+        with self._lock:
+            self._store(asset)
+        return asset
+
+    def _store(self, asset):
+        # Caller holds self._lock
+        old = self._assets.pop(asset.path, None)
+        if old is not None:
+            self._bytes -= old.cached_bytes
+        self._assets[asset.path] = asset
+        self._bytes += asset.cached_bytes
+        self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._assets) > 1:
+            _, old = self._assets.popitem(last=False)
+            self._bytes -= old.cached_bytes
+
+    def variant(self, asset, encoding):
+        """Compressed bytes for `encoding`, built once per file version"""
+        if encoding in asset.variants:
+            return asset.variants[encoding]
+        if encoding == 'br':
+            body = brotli.compress(asset.data, quality=11)
+        else:
+            body = gzip.compress(asset.data, compresslevel=9, mtime=0)
+        if len(body) >= asset.size:
+            body = None
+        with self._lock:
+            if encoding not in asset.variants:
+                asset.variants[encoding] = body
+                self._variants_built += 1
+                if self._assets.get(asset.path) is asset and body:
+                    self._bytes += len(body)
+                    self._evict()
+        return asset.variants[encoding]
+
+    def _pick_encoding(self, asset, request):
+        if not asset.compressible or request.range is not None:
+            return None, asset.data
+        accepted = request.accept_encodings
+        candidates = (['br'] if brotli is not None else []) + ['gzip']
+        for encoding in candidates:
+            if accepted[encoding] > 0:
+                body = self.variant(asset, encoding)
+                if body is not None:
+                    return encoding, body
+        return None, asset.data
+
+    def response(self, path, request):
+        """Build the response for GET/HEAD of `path` (404 if missing)"""
+        full_path = self.resolve(path)
+        if full_path is None or not os.path.isfile(full_path):
+            return Response(f"File not found: {path}", 404)
+
+        st = os.stat(full_path)
+        if st.st_size > self.stream_threshold:
+            return self._stream(full_path, st, request)
+
+        asset = self.load(full_path, st)
+        encoding, body = self._pick_encoding(asset, request)
+
+        response = Response(body, mimetype=asset.content_type)
+        response.set_etag(asset.etag + ('-' + encoding if encoding else ''))
+        response.last_modified = asset.mtime
+        if asset.content_type in REVALIDATE_TYPES:
+            response.cache_control.no_cache = True
+        else:
+            response.cache_control.public = True
+            response.cache_control.max_age = MEDIA_MAX_AGE
+        if asset.compressible:
+            response.vary.add('Accept-Encoding')
+        if encoding:
+            response.content_encoding = encoding
+
+        try:
+            response.make_conditional(request, accept_ranges=encoding is None,
+                                      complete_length=len(body) if encoding is None else None)
+        except RequestedRangeNotSatisfiable as e:
+            return e.get_response()
+        if response.status_code == 304:
+            with self._lock:
+                self._not_modified += 1
+        return response
+
+    def _stream(self, full_path, st, request):
+        """Unbuffered response for a large file (identity encoding, Range capable)"""
+        content_type = content_type_for(full_path)
+        try:
+            response = send_file(full_path, mimetype=content_type, conditional=True,
+                                 etag=f'{st.st_mtime_ns:x}-{st.st_size:x}',
+                                 last_modified=st.st_mtime, max_age=MEDIA_MAX_AGE)
+        except RequestedRangeNotSatisfiable as e:
+            return e.get_response()
+        if content_type in REVALIDATE_TYPES:
+            response.cache_control.no_cache = True
+            response.cache_control.max_age = None
+        if response.status_code == 304:
+            with self._lock:
+                self._not_modified += 1
+            return response
+
+        # No close hook: the file wrapper is passed straight through to the
+        # server (so it can sendfile), which bypasses response callbacks
+        with self._lock:
+            self._streamed_total += 1
+            self._streamed_bytes += response.content_length or 0
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._assets),
+                'bytes': self._bytes,
+                'maxBytes': self.max_bytes,
+                'streamThreshold': self.stream_threshold,
+                'hits': self._hits,
+                'misses': self._misses,
+                'notModified': self._not_modified,
+                'variantsBuilt': self._variants_built,
+                'streamedTotal': self._streamed_total,
+                'streamedBytes': self._streamed_bytes,
+                'brotli': brotli is not None,
+            }
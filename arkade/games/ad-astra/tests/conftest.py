@@ -0,0 +1,65 @@
+"""
+Shared fixtures: the real server module on a throwaway database
+"""
+
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import pytest
+
+# server.py reads ADASTRA_DB_PATH at import time
+_tmp = tempfile.mkdtemp(prefix='adastra-test-')
+os.environ['ADASTRA_DB_PATH'] = os.path.join(_tmp, 'test.db')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server  # noqa: E402
+
+server.init_db()
+
+GALAXY_SIZE = 300
+GALAXY_SEED = 'tests-1700000000000'
+
+
+@pytest.fixture(scope='session')
+def app():
+    return server.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope='session')
+def snapshot():
+    """One generated galaxy shared by every test"""
+    return server.galaxy_store.generate(GALAXY_SIZE, GALAXY_SEED, created_by='tests')
+
+
+def auth(token):
+    return {'Authorization': f'Bearer {token}'}
+
+
+def register(client, username, password='pw'):
+    """Register through the API; returns the session token"""
+    response = client.post('/api/register', json={'username': username, 'password': password,
+                                                   'pilotName': username.title(), 'shipName': 'Test'})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['token']
+
+
+def insert_player(username, credits=1000, turns=50, sector=1, game_state=None):
+    """Account + player row written straight to the database (no scrypt); returns account id"""
+    with server.db.connection() as conn:
+        account_id = conn.execute('''INSERT INTO accounts (username, password_hash, created_at, is_admin)
+                                     VALUES (?, 'x', ?, 0)''',
+                                  (username, datetime.now().isoformat())).lastrowid
+        conn.execute('''INSERT INTO players (account_id, pilot_name, ship_name, credits, turns,
+                                             current_sector, cargo, equipment, game_state)
+                        VALUES (?, ?, 'Test', ?, ?, ?, '{}', '{}', ?)''',
+                     (account_id, username.title(), credits, turns, sector, json.dumps(game_state or {})))
+        conn.commit()
+    return account_id
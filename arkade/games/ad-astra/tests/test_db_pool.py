@@ -0,0 +1,97 @@
+"""
+ConnectionPool: size bound, acquire timeout, release cleanup
+"""
+
+import sqlite3
+import threading
+
+import pytest
+
+import server
+from db_pool import ConnectionPool, PoolTimeout
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), max_size=3, timeout=0.1)
+    with pool.connection() as conn:
+        conn.execute('CREATE TABLE t (x INTEGER)')
+        conn.commit()
+    yield pool
+    pool.close_all()
+
+
+def test_never_opens_more_than_max_size(pool):
+    held = []
+    peak = []
+    lock = threading.Lock()
+
+    def worker():
+        with pool.connection() as conn:
+            conn.execute('SELECT 1').fetchone()
+            with lock:
+                held.append(conn)
+                peak.append(pool.stats()['inUse'])
+            threading.Event().wait(0.02)
+
+    threads = [threading.Thread(target=worker) for _ in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = pool.stats()
+    assert len(held) == 12
+    assert len({id(conn) for conn in held}) <= 3
+    assert stats['open'] <= 3 and stats['peakInUse'] <= 3 and max(peak) <= 3
+    assert stats['inUse'] == 0
+
+
+def test_acquire_times_out_when_exhausted(pool):
+    held = [pool.acquire() for _ in range(3)]
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert pool.stats()['timeoutsTotal'] == 1
+
+    pool.release(held.pop())
+    pool.release(pool.acquire())
+    for conn in held:
+        pool.release(conn)
+
+
+def test_route_answers_503_on_pool_timeout(client, monkeypatch, tmp_path):
+    busy = ConnectionPool(str(tmp_path / 'busy.db'), max_size=1, timeout=0.05)
+    held = busy.acquire()
+    monkeypatch.setattr(server, 'db', busy)
+    try:
+        response = client.get('/api/multiplayer')
+    finally:
+        busy.release(held)
+        busy.close_all()
+    assert response.status_code == 503
+    assert response.get_json() == {'error': 'Server busy, please retry'}
+
+
+def test_release_rolls_back_open_transaction(pool):
+    with pool.connection() as conn:
+        conn.execute('INSERT INTO t (x) VALUES (1)')
+        assert conn.in_transaction
+    with pool.connection() as conn:
+        assert not conn.in_transaction
+        assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 0
+
+
+def test_release_drops_broken_connection(pool):
+    conn = pool.acquire()
+    opened = pool.stats()['open']
+    conn.close()  # any use now raises sqlite3.ProgrammingError
+    pool.release(conn)
+
+    stats = pool.stats()
+    assert stats['open'] == opened - 1
+    assert stats['inUse'] == 0
+    with pool.connection() as fresh:
+        assert fresh is not conn
+        assert fresh.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 0
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute('SELECT 1')
@@ -0,0 +1,63 @@
+"""
+Chunked galaxy reset: interruption and resume
+"""
+
+import json
+from types import SimpleNamespace
+
+import galaxy_reset
+import server
+from conftest import insert_player
+
+PLAYERS = 25
+CHUNK = 10
+
+
+def reset_state(account_ids):
+    """account id -> (credits, turns, sector, cargo, game_state, version)"""
+    with server.db.connection() as conn:
+        rows = conn.execute(f'''SELECT account_id, credits, turns, current_sector, cargo, game_state, version
+                                FROM players WHERE account_id IN ({','.join('?' * len(account_ids))})''',
+                            account_ids).fetchall()
+    return {row[0]: row[1:] for row in rows}
+
+
+def test_interrupted_reset_resumes_where_it_stopped(monkeypatch):
+    account_ids = [insert_player(f'resetme{i:02d}', credits=777, turns=3, sector=42,
+                                 game_state={'credits': 777, 'ship': {'hull': 5, 'hullMax': 50}})
+                   for i in range(PLAYERS)]
+    before = {account_id: row[-1] for account_id, row in reset_state(account_ids).items()}
+    settings = dict(server.settings_cache.values)
+
+    # "Shut down" right after the first chunk commits
+    first = galaxy_reset.GalaxyReset(server.db, chunk_size=CHUNK, pause=0)
+    monkeypatch.setattr(galaxy_reset, 'time', SimpleNamespace(sleep=lambda _: first._stopping.set()))
+    job = first.start(settings, started_by='tests')
+    first._thread.join(timeout=10)
+    monkeypatch.undo()
+
+    interrupted = first.status(job['id'])
+    assert interrupted['status'] == 'running'
+    assert interrupted['active'] is False
+    assert interrupted['processed'] == CHUNK
+    assert interrupted['processed'] < interrupted['total']
+
+    # A new process picks the job up from last_player_id
+    second = galaxy_reset.GalaxyReset(server.db, chunk_size=CHUNK, pause=0)
+    assert second.resume()['id'] == job['id']
+    second._thread.join(timeout=10)
+
+    done = second.status(job['id'])
+    assert done['status'] == 'done'
+    assert done['processed'] == done['total']
+    assert second.resume() is None
+
+    for account_id, (credits, turns, sector, cargo, game_state, version) in reset_state(account_ids).items():
+        assert (credits, turns, sector) == (settings['starting_credits'], settings['starting_turns'],
+                                            settings['starting_sector'])
+        assert json.loads(cargo) == {}
+        state = json.loads(game_state)
+        assert state['credits'] == settings['starting_credits']
+        assert state['ship']['hull'] == state['ship']['hullMax'] == settings['starting_hull']
+        # Players in the first chunk were not reset a second time
+        assert version == before[account_id] + 1
@@ -0,0 +1,156 @@
+"""
+Market.trade retries on player version conflicts and under concurrent buyers
+"""
+
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import economy
+import server
+from conftest import insert_player
+
+START_CREDITS = 1000000
+START_TURNS = 500
+THREADS = 8
+TRADES_PER_THREAD = 5
+
+
+@pytest.fixture(scope='module')
+def location(snapshot):
+    """(sector id, slot, commodity) of the first place selling anything"""
+    for sector_id in range(1, snapshot.galaxy.size + 1):
+        for slot, content in economy.trading_slots(snapshot.galaxy.contents[sector_id]):
+            return sector_id, slot, next(iter(content['economy']))
+    pytest.skip('Galaxy has no trading locations')
+
+
+def set_supply(snapshot, location, supply):
+    sector_id, slot, commodity = location
+    server.market.ensure(snapshot)
+    with server.db.connection() as conn:
+        conn.execute('''UPDATE market SET supply = ? WHERE galaxy_version = ? AND sector_id = ?
+                        AND slot = ? AND commodity = ?''',
+                     (supply, snapshot.version, sector_id, slot, economy.COMMODITIES.index(commodity)))
+        conn.commit()
+
+
+def concurrent_buys(snapshot, location, account_id):
+    """Run THREADS x TRADES_PER_THREAD one-unit buys; returns (results, errors)"""
+    sector_id, slot, commodity = location
+    results, errors = [], []
+    lock = threading.Lock()
+
+    def buyer():
+        for _ in range(TRADES_PER_THREAD):
+            try:
+                result = server.market.trade(snapshot, account_id, 'buy', sector_id, commodity, 1, slot=slot)
+                with lock:
+                    results.append(result)
+            except economy.TradeError as e:
+                with lock:
+                    errors.append(e)
+
+    threads = [threading.Thread(target=buyer) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def player_row(account_id):
+    with server.db.connection() as conn:
+        return conn.execute('SELECT credits, turns, cargo, version FROM players WHERE account_id = ?',
+                            (account_id,)).fetchone()
+
+
+def test_concurrent_buys_are_all_accounted_for(snapshot, location):
+    sector_id, _, commodity = location
+    account_id = insert_player('trader', credits=START_CREDITS, turns=START_TURNS, sector=sector_id)
+    set_supply(snapshot, location, 1000)
+
+    results, errors = concurrent_buys(snapshot, location, account_id)
+
+    assert len(results) + len(errors) == THREADS * TRADES_PER_THREAD
+    assert all(e.status == 409 for e in errors)
+    assert results
+    credits, turns, cargo, version = player_row(account_id)
+    assert turns == START_TURNS - len(results)
+    assert credits == START_CREDITS - sum(r['cost'] for r in results)
+    assert json.loads(cargo) == {commodity: len(results)}
+    # Every successful trade got its own player version
+    assert sorted(r['version'] for r in results) == list(range(version - len(results) + 1, version + 1))
+    assert min(r['supply'] for r in results) == 1000 - len(results)
+
+
+def current_supply(snapshot, location):
+    sector_id, slot, commodity = location
+    with server.db.connection() as conn:
+        return conn.execute('''SELECT supply FROM market WHERE galaxy_version = ? AND sector_id = ?
+                               AND slot = ? AND commodity = ?''',
+                            (snapshot.version, sector_id, slot, economy.COMMODITIES.index(commodity))).fetchone()[0]
+
+
+def test_concurrent_buys_never_oversell(snapshot, location):
+    sector_id, _, _ = location
+    account_id = insert_player('hoarder', credits=START_CREDITS, turns=START_TURNS, sector=sector_id)
+    set_supply(snapshot, location, 7)
+
+    results, errors = concurrent_buys(snapshot, location, account_id)
+
+    assert 0 < len(results) <= 7
+    assert all(e.status == 409 for e in errors)
+    # Conflicting attempts rolled their supply change back before retrying
+    assert current_supply(snapshot, location) == 7 - len(results)
+    assert player_row(account_id)[1] == START_TURNS - len(results)
+
+
+def bump_version_after_read(monkeypatch, account_id, times):
+    """Have another writer save the player between _attempt's SELECT and its
+    UPDATE (json.loads runs in between, before the trade takes the write
+    lock), for the next `times` decodes"""
+    remaining = [times]
+
+    def loads(text):
+        if remaining[0]:
+            remaining[0] -= 1
+            with server.db.connection() as conn:
+                conn.execute('UPDATE players SET version = version + 1 WHERE account_id = ?', (account_id,))
+                conn.commit()
+        return json.loads(text)
+
+    monkeypatch.setattr(economy, 'json', SimpleNamespace(loads=loads, dumps=json.dumps))
+
+
+def test_trade_retries_after_a_version_conflict(snapshot, location, monkeypatch):
+    sector_id, slot, commodity = location
+    account_id = insert_player('retrier', credits=START_CREDITS, turns=START_TURNS, sector=sector_id)
+    set_supply(snapshot, location, 100)
+    start_version = player_row(account_id)[3]
+    bump_version_after_read(monkeypatch, account_id, 1)
+
+    result = server.market.trade(snapshot, account_id, 'buy', sector_id, commodity, 2, slot=slot)
+
+    credits, turns, cargo, version = player_row(account_id)
+    # One bump by the other writer, one by the retried trade
+    assert result['version'] == version == start_version + 2
+    assert (turns, json.loads(cargo)) == (START_TURNS - 1, {commodity: 2})
+    assert current_supply(snapshot, location) == 98
+
+
+def test_trade_gives_up_after_retries(snapshot, location, monkeypatch):
+    sector_id, slot, commodity = location
+    account_id = insert_player('unlucky', credits=START_CREDITS, turns=START_TURNS, sector=sector_id)
+    set_supply(snapshot, location, 100)
+    bump_version_after_read(monkeypatch, account_id, 1000)
+
+    with pytest.raises(economy.TradeError) as excinfo:
+        server.market.trade(snapshot, account_id, 'buy', sector_id, commodity, 1, slot=slot, retries=3)
+
+    assert excinfo.value.status == 409
+    credits, turns, cargo, _ = player_row(account_id)
+    assert (credits, turns, json.loads(cargo)) == (START_CREDITS, START_TURNS, {})
+    assert current_supply(snapshot, location) == 100
@@ -0,0 +1,57 @@
+"""
+Keyset pagination of /api/admin/players
+"""
+
+import pytest
+
+from conftest import insert_player
+
+PREFIX = 'listing'
+
+
+@pytest.fixture(scope='module')
+def players():
+    """username -> credits, in insertion (player id) order; duplicate and
+    missing credits cover ties and NULLs"""
+    players = {f'{PREFIX}{i:02d}': None if i % 5 == 0 else (i * 7) % 4 * 100 for i in range(23)}
+    for username, credits in players.items():
+        insert_player(username, credits=credits)
+    return players
+
+
+def walk(client, **args):
+    """Follow nextCursor to the end; returns every page's usernames"""
+    query = {'prefix': PREFIX, 'limit': 4, 'include': '', **args}
+    names = []
+    for _ in range(50):
+        response = client.get('/api/admin/players', query_string=query)
+        assert response.status_code == 200, response.get_json()
+        page = response.get_json()
+        names.extend(player['username'] for player in page['players'])
+        if page['nextCursor'] is None:
+            return names
+        query['cursor'] = page['nextCursor']
+    pytest.fail('Cursor walk did not end')
+
+
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+def test_cursor_walk_by_credits(client, players, order):
+    # SQLite sorts NULL first ascending and last descending; ties break on id
+    order_added = list(players)
+    expected = sorted(players, key=lambda name: (players[name] is not None, players[name] or 0,
+                                                 order_added.index(name)))
+    if order == 'desc':
+        expected.reverse()
+    assert walk(client, sort='credits', order=order) == expected
+
+
+@pytest.mark.parametrize('sort', ['username', 'id', 'createdAt'])
+def test_cursor_walk_in_insertion_order(client, players, sort):
+    names = walk(client, sort=sort, order='asc')
+    assert names == list(players)
+    assert walk(client, sort=sort, order='desc') == names[::-1]
+
+
+def test_bad_cursor(client):
+    response = client.get('/api/admin/players', query_string={'cursor': 'not-a-cursor'})
+    assert response.status_code == 400
@@ -0,0 +1,74 @@
+"""
+PATCH /api/player: merge patches and If-Match version checks
+"""
+
+import pytest
+
+from conftest import auth, register
+
+
+@pytest.fixture(scope='module')
+def token(app):
+    return register(app.test_client(), 'patcher')
+
+
+def test_patch_merges_and_bumps_version(client, token):
+    version = client.get('/api/player', headers=auth(token)).get_json()['version']
+
+    response = client.patch('/api/player', headers={**auth(token), 'If-Match': str(version)},
+                            json={'credits': 4321, 'gameState': {'ship': {'fuel': 7}}})
+    assert response.status_code == 200
+    assert response.get_json()['version'] == version + 1
+
+    player = client.get('/api/player', headers=auth(token)).get_json()
+    assert player['credits'] == 4321
+    assert player['gameState']['ship']['fuel'] == 7
+    assert player['version'] == version + 1
+
+
+def test_stale_if_match_conflicts(client, token):
+    version = client.get('/api/player', headers=auth(token)).get_json()['version']
+    assert client.patch('/api/player', headers={**auth(token), 'If-Match': str(version)},
+                        json={'turns': 11}).status_code == 200
+
+    response = client.patch('/api/player', headers={**auth(token), 'If-Match': f'"{version}"'},
+                            json={'turns': 99})
+    assert response.status_code == 409
+    assert response.get_json()['version'] == version + 1
+    assert client.get('/api/player', headers=auth(token)).get_json()['turns'] == 11
+
+
+def test_admin_edit_invalidates_if_match(client, token):
+    version = client.get('/api/player', headers=auth(token)).get_json()['version']
+    assert client.put('/api/admin/player/patcher', json={'credits': 5}).status_code == 200
+
+    response = client.patch('/api/player', headers={**auth(token), 'If-Match': str(version)},
+                            json={'credits': 6})
+    assert response.status_code == 409
+
+
+@pytest.mark.parametrize('headers, body, status', [
+    ({'If-Match': 'abc'}, {'turns': 1}, 400),
+    ({}, {'unknownField': 1}, 400),
+    ({}, {'credits': None}, 400),
+    ({}, [1, 2], 400),
+    ({}, {'credits': 'lots'}, 400),
+    ({}, {'credits': {}}, 400),
+    ({}, {'turns': True}, 400),
+    ({}, {'currentSector': 1.5}, 400),
+    ({}, {'pilotName': 7}, 400),
+    ({}, {'gameState': [1]}, 400),
+])
+def test_bad_patches(client, token, headers, body, status):
+    assert client.patch('/api/player', headers={**auth(token), **headers}, json=body).status_code == status
+
+
+def test_bad_type_names_the_field(client, token):
+    response = client.patch('/api/player', headers=auth(token), json={'turns': 3, 'shipVariant': '2'})
+    assert response.status_code == 400
+    assert 'shipVariant' in response.get_json()['error']
+    assert client.get('/api/player', headers=auth(token)).get_json()['turns'] != 3
+
+
+def test_patch_needs_token(client):
+    assert client.patch('/api/player', json={'turns': 1}).status_code == 401
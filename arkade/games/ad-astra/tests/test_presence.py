@@ -0,0 +1,69 @@
+"""
+Presence writes: only the pilot's own session (or an admin) may write,
+and fields are type-checked before anything is stored
+"""
+
+import pytest
+
+import presence
+import server
+from conftest import auth, register
+
+
+@pytest.fixture(scope='module')
+def tokens(app):
+    client = app.test_client()
+    return {name: register(client, name) for name in ('pres_alice', 'pres_bob')}
+
+
+def status_of(client, username):
+    """Stored status, whether or not the pilot counts as active"""
+    with server.db.connection() as conn:
+        player = presence.get(conn.cursor(), username)
+    return player and player['status']
+
+
+def test_legacy_put_updates_own_pilot(client, tokens):
+    response = client.put('/api/multiplayer', headers=auth(tokens['pres_alice']),
+                          json={'pres_alice': {'currentSector': 4, 'lastSeen': presence.now_ms(), 'status': 'docked'}})
+    assert response.status_code == 200
+    assert status_of(client, 'pres_alice') == 'docked'
+    assert client.get('/api/multiplayer').get_json()['pres_alice']['currentSector'] == 4
+
+
+@pytest.mark.parametrize('headers, body, status', [
+    (None, {'pres_bob': {'status': 'hacked'}}, 401),
+    ({'Authorization': 'Bearer nope'}, {'pres_bob': {'status': 'hacked'}}, 401),
+    ('pres_alice', {'pres_bob': {'status': 'hacked'}}, 403),
+    # One foreign pilot rejects the whole body, including the caller's own entry
+    ('pres_alice', {'pres_alice': {'status': 'hacked'}, 'pres_bob': {'status': 'hacked'}}, 403),
+    ('pres_bob', {'pres_bob': {'lastSeen': None}}, 400),
+    ('pres_bob', {'pres_bob': {'currentSector': 'x', 'status': 'hacked'}}, 400),
+    ('pres_bob', {'pres_bob': {'ship': 'boat', 'status': 'hacked'}}, 400),
+    ('pres_bob', {'pres_bob': 'hacked'}, 400),
+    ('pres_bob', {'pres_bob': {'username': 'pres_alice', 'status': 'hacked'}}, 400),
+    ('pres_bob', ['pres_bob'], 400),
+])
+def test_legacy_put_rejects_before_writing(client, tokens, headers, body, status):
+    if isinstance(headers, str):
+        headers = auth(tokens[headers])
+    response = client.put('/api/multiplayer', headers=headers, json=body)
+    assert response.status_code == status
+    assert 'hacked' not in (status_of(client, 'pres_alice'), status_of(client, 'pres_bob'))
+
+
+@pytest.mark.parametrize('method', ['put', 'delete'])
+def test_pilot_routes_need_own_session(client, tokens, method):
+    url = '/api/multiplayer/player/pres_bob'
+    call = getattr(client, method)
+    assert call(url, json={'status': 'hacked'}).status_code == 401
+    assert call(url, headers=auth(tokens['pres_alice']), json={'status': 'hacked'}).status_code == 403
+
+
+def test_pilot_put_validates_fields(client, tokens):
+    url = '/api/multiplayer/player/pres_bob'
+    headers = auth(tokens['pres_bob'])
+    assert client.put(url, headers=headers, json={'lastSeen': None}).status_code == 400
+    assert client.put(url, headers=headers, json={'kills': True}).status_code == 400
+    assert client.put(url, headers=headers, json={'currentSector': 2, 'lastSeen': 1}).status_code == 200
+    assert client.delete(url, headers=headers).status_code == 200
@@ -0,0 +1,102 @@
+"""
+Routing index answers checked against a plain BFS over the warps
+"""
+
+from collections import deque
+
+import pytest
+
+SOURCES = (1, 2, 57, 150, 299)
+
+
+def bfs(galaxy, source):
+    """sector id -> jumps from source, for every reachable sector"""
+    hops = {source: 0}
+    queue = deque([source])
+    while queue:
+        current = queue.popleft()
+        for warp in galaxy.warps[current]:
+            if warp not in hops:
+                hops[warp] = hops[current] + 1
+                queue.append(warp)
+    return hops
+
+
+def matching_sectors(galaxy, predicate):
+    return [sector_id for sector_id in range(1, galaxy.size + 1)
+            if any(predicate(content) for content in galaxy.contents[sector_id])]
+
+
+@pytest.mark.parametrize('source', SOURCES)
+def test_distances_match_bfs(client, snapshot, source):
+    hops = bfs(snapshot.galaxy, source)
+    response = client.get('/api/galaxy/distances', query_string={'from': source})
+    assert response.status_code == 200
+    assert response.get_json()['jumps'] == [hops.get(i) for i in range(1, snapshot.galaxy.size + 1)]
+
+
+@pytest.mark.parametrize('source', SOURCES)
+def test_routes_are_shortest_warp_paths(client, snapshot, source):
+    galaxy = snapshot.galaxy
+    hops = bfs(galaxy, source)
+    for target in range(1, galaxy.size + 1, 13):
+        response = client.get('/api/galaxy/route', query_string={'from': source, 'to': target})
+        if target not in hops:
+            assert response.status_code == 404
+            continue
+        body = response.get_json()
+        path = body['path']
+        assert body['jumps'] == hops[target] == len(path) - 1
+        assert (path[0], path[-1]) == (source, target)
+        assert all(b in galaxy.warps[a] for a, b in zip(path, path[1:]))
+
+
+def kinds_in(galaxy):
+    """(kind, predicate) for every nearest-X kind this galaxy has content for"""
+    kinds = [('any', lambda c: True)]
+    kinds += [(kind, lambda c, kind=kind: c.get('type') == kind) for kind in ('planet', 'station', 'debris', 'anomaly')]
+    seen = {(field, c[field]) for contents in galaxy.contents[1:] for c in contents
+            for field in ('planetType', 'class') if c.get(field) is not None}
+    kinds += [(f'{field}:{value}', lambda c, field=field, value=value: c.get(field) == value)
+              for field, value in sorted(seen)]
+    commodities = {name for contents in galaxy.contents[1:] for c in contents for name in (c.get('economy') or ())}
+    kinds += [(f'commodity:{name}', lambda c, name=name: name in (c.get('economy') or {}))
+              for name in sorted(commodities)]
+    return kinds
+
+
+@pytest.mark.parametrize('source', SOURCES)
+def test_nearest_matches_bfs(client, snapshot, source):
+    galaxy = snapshot.galaxy
+    hops = bfs(galaxy, source)
+    kinds = kinds_in(galaxy)
+    results = {}
+    for start in range(0, len(kinds), 20):
+        names = ','.join(kind for kind, _ in kinds[start:start + 20])
+        response = client.get('/api/galaxy/nearest', query_string={'from': source, 'kinds': names})
+        assert response.status_code == 200, response.get_json()
+        results.update(response.get_json()['results'])
+
+    for kind, predicate in kinds:
+        reachable = [hops[s] for s in matching_sectors(galaxy, predicate) if s in hops]
+        result = results[kind]
+        if not reachable:
+            assert result is None, kind
+            continue
+        assert result['jumps'] == min(reachable), kind
+        assert hops.get(result['sector']) == result['jumps'], kind
+        assert any(predicate(c) for c in galaxy.contents[result['sector']]), kind
+        path = result['path']
+        assert (path[0], path[-1], len(path) - 1) == (source, result['sector'], result['jumps']), kind
+        assert all(b in galaxy.warps[a] for a, b in zip(path, path[1:])), kind
+
+
+@pytest.mark.parametrize('query', [
+    {'from': 1, 'kinds': 'nebula'},
+    {'from': 1, 'kinds': 'class:'},
+    {'from': 1, 'kinds': 'class:NoSuchClass'},
+    {'from': 1, 'kinds': 'commodity:Unobtainium'},
+    {'from': 0, 'kinds': 'station'},
+])
+def test_nearest_rejects_bad_queries(client, snapshot, query):
+    assert client.get('/api/galaxy/nearest', query_string=query).status_code == 400
@@ -0,0 +1,98 @@
+"""
+Write-behind autosaves: bad input is rejected or dropped, never blocks others
+"""
+
+import pytest
+
+import server
+from conftest import auth, insert_player, register
+from write_behind import WriteBehindBuffer
+
+
+def save(name, credits):
+    return {
+        'pilot_name': name, 'ship_name': 'Test', 'credits': credits, 'turns': 5,
+        'current_sector': 1, 'ship_type': 'scout', 'cargo': {}, 'equipment': {},
+        'game_state': {}, 'last_activity': '2026-01-01T00:00:00', 'ship_variant': 1
+    }
+
+
+def credits_of(account_id):
+    with server.db.connection() as conn:
+        return conn.execute('SELECT credits FROM players WHERE account_id = ?', (account_id,)).fetchone()[0]
+
+
+def test_unbindable_row_does_not_block_other_saves():
+    buffer = WriteBehindBuffer(server.db, interval=60)
+    bad = insert_player('wb_bad')
+    good = insert_player('wb_good')
+
+    buffer.put(bad, save('Bad', {'x': 1}), 1)
+    buffer.put(good, save('Good', 321), 1)
+    assert buffer.flush() == 1
+
+    assert credits_of(good) == 321
+    assert credits_of(bad) == 1000
+    stats = buffer.stats()
+    assert (stats['dirty'], stats['rowsDroppedTotal'], stats['flushErrorsTotal']) == (0, 1, 0)
+
+    # Later saves, and a direct writer's flush, are not held up
+    buffer.put(good, save('Good', 654), 1)
+    buffer.flush_account(good)
+    assert credits_of(good) == 654
+
+
+def test_stop_writes_good_saves_despite_a_bad_one():
+    buffer = WriteBehindBuffer(server.db, interval=60)
+    bad = insert_player('wb_bad_stop')
+    good = insert_player('wb_good_stop')
+    buffer.start()
+
+    buffer.put(bad, save('Bad', [1, 2]), 1)
+    buffer.put(good, save('Good', 77), 1)
+    buffer.stop()
+
+    assert credits_of(good) == 77
+    assert buffer.stats()['dirty'] == 0
+
+
+@pytest.fixture
+def write_behind_running():
+    server.write_behind.start()
+    yield server.write_behind
+    server.write_behind.stop()
+
+
+@pytest.mark.parametrize('field, value', [
+    ('credits', {'x': 1}),
+    ('turns', '5'),
+    ('currentSector', True),
+    ('shipVariant', 1.5),
+    ('pilotName', 3),
+    ('cargo', [1]),
+    ('gameState', 'full'),
+])
+def test_put_rejects_bad_types(client, write_behind_running, field, value):
+    token = register(client, f'wb_put_{field.lower()}')
+    player = client.get('/api/player', headers=auth(token)).get_json()
+
+    response = client.put('/api/player', headers=auth(token), json={**player, field: value})
+
+    assert response.status_code == 400
+    assert field in response.get_json()['error']
+    assert write_behind_running.stats()['dirty'] == 0
+    assert client.put('/api/player', headers=auth(token), json=player).status_code == 200
+
+
+def test_delete_discards_buffered_save(client, write_behind_running):
+    token = register(client, 'wb_deleted')
+    player = client.get('/api/player', headers=auth(token)).get_json()
+    assert client.put('/api/player', headers=auth(token), json={**player, 'credits': 5}).status_code == 200
+
+    assert client.delete('/api/admin/player/wb_deleted').status_code == 200
+
+    assert write_behind_running.stats()['dirty'] == 0
+    assert client.put('/api/player', headers=auth(token), json=player).status_code == 401
+    with server.db.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM players WHERE pilot_name = ?',
+                            (player['pilotName'],)).fetchone()[0] == 0
@@ -0,0 +1,224 @@
+"""
+Ad Astra - Write-Behind Player Save Buffer
+Coalesces bursts of PUT /api/player into one batched transaction
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+log = logging.getLogger('adastra.write_behind')
+
+# Column order used by the batched UPDATE
+BUFFERED_COLUMNS = [
+    'pilot_name', 'ship_name', 'credits', 'turns', 'current_sector',
+    'ship_type', 'cargo', 'equipment', 'game_state', 'last_activity',
+    'ship_variant'
+]
+JSON_COLUMNS = ('cargo', 'equipment', 'game_state')
+
+# Per-account locks are striped over this many mutexes
+ACCOUNT_LOCK_STRIPES = 64
+
+
+class WriteBehindBuffer:
+    """Latest-state-wins buffer of player rows.
+
+    Each PUT replaces the pending row for its account; a background thread
+    writes all dirty rows in a single transaction every `interval` seconds,
+    or sooner once `max_dirty` accounts are waiting. JSON columns are kept
+    as Python objects and only serialized at flush time, so coalesced saves
+    never pay for json.dumps.
+
+    Anything that writes a player row directly (PATCH, trades, admin edits)
+    must hold account_lock() across flush_account() and its UPDATE, and
+    saves hold it across reading the base version and put(), so a save
+    cannot be buffered between the flush and the UPDATE and then
+    overwrite it with a reused version number.
+    """
+
+    def __init__(self, pool, interval=1.0, max_dirty=256):
+        self.pool = pool
+        self.interval = interval
+        self.max_dirty = max_dirty
+
+        self._pending = {}  # account_id -> {'values': {...}, 'version': int}
+        self._inflight = {}  # account_id -> version being written right now
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._account_locks = [threading.Lock() for _ in range(ACCOUNT_LOCK_STRIPES)]
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        # Metrics
+        self._puts_total = 0
+        self._flushes_total = 0
+        self._rows_flushed_total = 0
+        self._flush_errors_total = 0
+        self._rows_dropped_total = 0
+        self._last_flush_ms = 0.0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the flusher and write everything still pending (durable shutdown)"""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=max(5.0, self.interval * 2))
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                log.error('Write-behind flush failed: %s', e)
+
+    def account_lock(self, account_id):
+        """Lock serializing buffered saves with direct writes to one account"""
+        return self._account_locks[account_id % ACCOUNT_LOCK_STRIPES]
+
+    def pending(self, account_id):
+        """Return (values, version) for a dirty account, or None"""
+        with self._lock:
+            entry = self._pending.get(account_id)
+            if entry is None:
+                return None
+            return dict(entry['values']), entry['version']
+
+    def put(self, account_id, values, base_version):
+        """Buffer the full row for an account. Returns the new version.
+
+        `base_version` is the stored version, used when the account is not
+        already dirty (the caller reads it once per flush cycle).
+        """
+        with self._lock:
+            entry = self._pending.get(account_id)
+            if entry:
+                version = entry['version'] + 1
+            else:
+                # base_version may predate a batch that is still committing
+                version = max(base_version, self._inflight.get(account_id, 0)) + 1
+            self._pending[account_id] = {'values': values, 'version': version}
+            self._puts_total += 1
+            dirty = len(self._pending)
+        if dirty >= self.max_dirty:
+            self._wake.set()
+        return version
+
+    def discard(self, account_id):
+        """Forget pending state (account deleted)"""
+        with self._lock:
+            self._pending.pop(account_id, None)
+
+    def flush_account(self, account_id):
+        """Write one account's pending row now, if any"""
+        with self._flush_lock:
+            with self._lock:
+                entry = self._pending.pop(account_id, None)
+            if entry is not None:
+                self._write({account_id: entry})
+
+    def flush(self):
+        """Write every dirty row in one transaction"""
+        # Holding _flush_lock across swap + write means a caller of
+        # flush_account() also waits for any batch already in flight.
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch = self._pending
+                self._pending = {}
+            return self._write(batch)
+
+    def _write(self, batch):
+        """Write a batch; caller holds _flush_lock"""
+        rows = []
+        for account_id, entry in batch.items():
+            values = entry['values']
+            row = [json.dumps(values[col]) if col in JSON_COLUMNS else values[col]
+                   for col in BUFFERED_COLUMNS]
+            row.append(entry['version'])
+            row.append(account_id)
+            rows.append(row)
+
+        assignments = ', '.join(f'{col} = ?' for col in BUFFERED_COLUMNS)
+        query = f'UPDATE players SET {assignments}, version = ? WHERE account_id = ?'
+
+        with self._lock:
+            self._inflight = {account_id: entry['version'] for account_id, entry in batch.items()}
+
+        started = time.perf_counter()
+        try:
+            with self.pool.connection() as conn:
+                try:
+                    conn.executemany(query, rows)
+                    conn.commit()
+                    written = len(rows)
+                except (sqlite3.InterfaceError, sqlite3.ProgrammingError):
+                    # One unbindable row fails the whole batch: write the
+                    # rows one by one and drop only the bad ones
+                    conn.rollback()
+                    written = self._write_rows(conn, query, rows)
+        except Exception:
+            # Database trouble, not bad data: put the batch back unless a
+            # newer save arrived meanwhile
+            with self._lock:
+                for account_id, entry in batch.items():
+                    self._pending.setdefault(account_id, entry)
+                self._flush_errors_total += 1
+            raise
+        finally:
+            with self._lock:
+                self._inflight = {}
+
+        with self._lock:
+            self._flushes_total += 1
+            self._rows_flushed_total += written
+            self._last_flush_ms = (time.perf_counter() - started) * 1000
+        return written
+
+    def _write_rows(self, conn, query, rows):
+        """Write rows individually, logging and dropping any that cannot be bound"""
+        written = 0
+        for row in rows:
+            try:
+                conn.execute(query, row)
+                written += 1
+            except (sqlite3.InterfaceError, sqlite3.ProgrammingError) as e:
+                log.error('Dropped buffered save for account %s: %s', row[-1], e)
+                with self._lock:
+                    self._rows_dropped_total += 1
+        conn.commit()
+        return written
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.running,
+                'intervalSeconds': self.interval,
+                'maxDirty': self.max_dirty,
+                'dirty': len(self._pending),
+                'putsTotal': self._puts_total,
+                'flushesTotal': self._flushes_total,
+                'rowsFlushedTotal': self._rows_flushed_total,
+                'flushErrorsTotal': self._flush_errors_total,
+                'rowsDroppedTotal': self._rows_dropped_total,
+                'lastFlushMs': round(self._last_flush_ms, 3),
+            }
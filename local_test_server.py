@@ -1,202 +1,652 @@
 import http.server
-import socketserver
+import argparse
+import hashlib
 import json
 import os
+import random
+import re
+import secrets
+import signal
+import sys
+import threading
+import time
 import urllib.parse
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 
 PORT = 8000
 DIRECTORY = "."
+WORKERS = 16
+KEEPALIVE_TIMEOUT = 5  # seconds an idle keep-alive connection may hold a worker
+SNAPSHOT_INTERVAL = 10  # seconds between snapshot writes when state changed
+
+# Tokens the front-end used against the old hard-coded mock keep working
+ADMIN_TOKEN = 'mock-admin-token-123'
+TESTPILOT_TOKEN = 'mock-token-123'
+
+DEFAULT_SETTINGS = {
+    'startingSector': 1,
+    'startingCredits': 10000,
+    'startingTurns': 50,
+    'startingFuel': 100,
+    'startingHull': 100,
+    'startingShields': 100
+}
+
+class PooledHTTPServer(http.server.HTTPServer):
+    """HTTPServer that hands each connection to a fixed-size thread pool.
+
+    At most `workers` connections are served at once and `backlog` more
+    wait in the pool queue; beyond that the accept loop blocks and new
+    connections queue in the kernel's listen backlog.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, server_address, handler_class, workers=WORKERS, backlog=64):
+        super().__init__(server_address, handler_class)
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mock-http')
+        self.slots = threading.BoundedSemaphore(workers + backlog)
+
+    def process_request(self, request, client_address):
+        self.slots.acquire()
+        self.pool.submit(self._work, request, client_address)
+
+    def _work(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def hash_password(password):
+    # Same unsalted SHA-256 as the Worker; this is a mock, not a vault
+    return hashlib.sha256(password.encode('utf-8')).hexdigest()
+
+class MockStore:
+    """In-memory stand-in for the Worker's D1 tables.
+
+    Holds accounts, players, sessions, multiplayer presence and settings
+    behind one lock. Responses use the same shapes as api/src/index.js.
+    With a snapshot path the state is loaded at startup and written back
+    (atomically) every SNAPSHOT_INTERVAL seconds while dirty and on exit.
+    """
+
+    def __init__(self, snapshot_path=None):
+        self.snapshot_path = snapshot_path
+        self.lock = threading.RLock()
+        self.dirty = False
+        self.accounts = {}  # username -> account dict
+        self.players = {}  # username -> player dict (camelCase, as the API returns it)
+        self.sessions = {}  # token -> username
+        self.multiplayer = {}
+        self.settings = dict(DEFAULT_SETTINGS)
+        if snapshot_path and os.path.exists(snapshot_path):
+            self.load()
+        if 'admin' not in self.accounts:
+            self.create_account('admin', 'admin123', is_admin=True)
+        if 'TestPilot' not in self.accounts:
+            self.create_account('TestPilot', secrets.token_hex(8))
+            self.players['TestPilot'] = self.new_player('TestPilot', 'Ace Test', 'The Debugger')
+        self.sessions.setdefault(ADMIN_TOKEN, 'admin')
+        self.sessions.setdefault(TESTPILOT_TOKEN, 'TestPilot')
+
+    # -- snapshot --------------------------------------------------------
+
+    def load(self):
+        with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        with self.lock:
+            self.accounts = data.get('accounts', {})
+            self.players = data.get('players', {})
+            self.sessions = data.get('sessions', {})
+            self.multiplayer = data.get('multiplayer', {})
+            self.settings = dict(DEFAULT_SETTINGS, **data.get('settings', {}))
+        print(f"Loaded snapshot {self.snapshot_path}: {len(self.accounts)} accounts, {len(self.players)} players")
+
+    def save(self):
+        if not self.snapshot_path:
+            return False
+        with self.lock:
+            if not self.dirty:
+                return False
+            data = json.dumps({
+                'accounts': self.accounts,
+                'players': self.players,
+                'sessions': self.sessions,
+                'multiplayer': self.multiplayer,
+                'settings': self.settings
+            })
+            self.dirty = False
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, self.snapshot_path)
+        return True
+
+    def autosave(self, stop_event):
+        while not stop_event.wait(SNAPSHOT_INTERVAL):
+            self.save()
+
+    # -- records ---------------------------------------------------------
+
+    def create_account(self, username, password, is_admin=False):
+        with self.lock:
+            self.accounts[username] = {
+                'passwordHash': hash_password(password),
+                'isAdmin': is_admin,
+                'isBanned': False,
+                'createdAt': datetime.now().isoformat(),
+                'lastLogin': None
+            }
+            self.dirty = True
+
+    def new_player(self, username, pilot_name='', ship_name='', ship_type='scout', ship_variant=1):
+        settings = self.settings
+        return {
+            'username': username,
+            'pilotName': pilot_name,
+            'shipName': ship_name,
+            'credits': settings['startingCredits'],
+            'turns': settings['startingTurns'],
+            'currentSector': settings['startingSector'],
+            'shipType': ship_type,
+            'cargo': {},
+            'equipment': {},
+            'gameState': {},
+            'lastActivity': datetime.now().isoformat(),
+            'shipVariant': ship_variant
+        }
+
+    def start_session(self, username):
+        token = secrets.token_hex(32)
+        with self.lock:
+            self.sessions[token] = username
+            self.accounts[username]['lastLogin'] = datetime.now().isoformat()
+            self.dirty = True
+        return token
+
+    def end_sessions(self, username=None, token=None):
+        with self.lock:
+            if token is not None:
+                self.sessions.pop(token, None)
+            else:
+                for t in [t for t, u in self.sessions.items() if u == username]:
+                    del self.sessions[t]
+            self.dirty = True
+
+    def account_for(self, token):
+        """(username, account) for a session token, or (None, None)"""
+        with self.lock:
+            username = self.sessions.get(token)
+            account = self.accounts.get(username)
+            if account is None or account['isBanned']:
+                return None, None
+            return username, account
+
+    def player_view(self, username, admin=False):
+        player = dict(self.players[username])
+        account = self.accounts.get(username, {})
+        player['is_admin'] = account.get('isAdmin', False)
+        if admin:
+            del player['is_admin']
+            player.update({
+                'lastLogin': account.get('lastLogin'),
+                'createdAt': account.get('createdAt'),
+                'isAdmin': account.get('isAdmin', False),
+                'isBanned': account.get('isBanned', False)
+            })
+        return player
+
+    def seed(self, count, seed=1):
+        """Add `count` synthetic pilots with realistically sized save payloads"""
+        rng = random.Random(seed)
+        commodities = ['Ore', 'Organics', 'Equipment', 'Fuel', 'Medicine', 'Luxuries', 'Weapons']
+        now = time.time()
+        with self.lock:
+            for i in range(count):
+                username = f'pilot{len(self.accounts):05d}'
+                self.create_account(username, 'password')
+                player = self.new_player(username, f'Pilot {i}', f'Ship {i}', rng.choice(['scout', 'trader', 'fighter']), rng.randint(1, 3))
+                last_active = now - rng.uniform(0, 7 * 86400)
+                player.update({
+                    'credits': rng.randint(0, 5000000),
+                    'turns': rng.randint(0, 100),
+                    'currentSector': rng.randint(1, 1000),
+                    'cargo': {c: rng.randint(0, 50) for c in rng.sample(commodities, 3)},
+                    'lastActivity': datetime.fromtimestamp(last_active).isoformat()
+                })
+                visited = sorted(rng.sample(range(1, 1001), rng.randint(20, 400)))
+                player['gameState'] = {
+                    'username': username,
+                    'pilotName': player['pilotName'],
+                    'credits': player['credits'],
+                    'turns': player['turns'],
+                    'maxTurns': 100,
+                    'currentSector': player['currentSector'],
+                    'ship': {'name': player['shipName'], 'type': player['shipType'], 'hull': rng.randint(1, 100), 'hullMax': 100,
+                             'shields': rng.randint(0, 50), 'shieldsMax': 50, 'fuel': rng.randint(0, 100), 'fuelMax': 100,
+                             'cargoMax': 50, 'weapons': 20, 'weaponsMax': 20},
+                    'shipVariant': player['shipVariant'],
+                    'cargo': player['cargo'],
+                    'visitedSectors': visited,
+                    'stats': {'sectorsVisited': len(visited), 'creditsEarned': rng.randint(0, 10000000),
+                              'combatsWon': rng.randint(0, 500), 'combatsLost': rng.randint(0, 100),
+                              'tradesCompleted': rng.randint(0, 2000), 'eventsEncountered': rng.randint(0, 300)},
+                    'created': int((last_active - rng.uniform(0, 60 * 86400)) * 1000)
+                }
+                self.players[username] = player
+            self.dirty = True
 
 class Handler(http.server.SimpleHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open between requests (every response
+    # must carry a Content-Length); idle ones are dropped after the timeout
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+    quiet = False
+    store = None  # MockStore, set in main()
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
     def end_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
         super().end_headers()
 
     def do_OPTIONS(self):
         self.send_response(200)
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
+    # -- helpers ---------------------------------------------------------
+
+    def read_json(self):
+        length = int(self.headers.get('content-length', 0))
+        if length <= 0:
+            return {}
+        body = self.rfile.read(length).decode('utf-8')
+        if not self.quiet:
+            print(f"{self.command} {self.path} Body: {body[:200]}")
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def token(self):
+        return self.headers.get('Authorization', '').replace('Bearer ', '')
+
+    def current_user(self):
+        """Session owner; unknown tokens act as TestPilot (auth bypass)"""
+        username, account = self.store.account_for(self.token())
+        if username is None:
+            return 'TestPilot', self.store.accounts['TestPilot']
+        return username, account
+
+    def require_admin(self):
+        username, account = self.store.account_for(self.token())
+        if account is None or not account['isAdmin']:
+            self.send_json({'error': 'Admin access required'}, 403)
+            return None
+        return username
+
+    def admin_target(self, path, suffix=''):
+        """Username from /api/adastra/admin/player/<username>[/suffix]"""
+        match = re.match(r'^/api/adastra/admin/player/([^/]+)' + suffix + '$', path)
+        return urllib.parse.unquote(match.group(1)) if match else None
+
+    # -- GET -------------------------------------------------------------
+
     def do_GET(self):
         parsed_path = urllib.parse.urlparse(self.path)
         path = parsed_path.path
-        
+        store = self.store
+
+        # Health check (same shape as the Worker)
+        if path == '/api/health':
+            timestamp = datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+            self.send_json({'status': 'ok', 'timestamp': timestamp.replace('+00:00', 'Z')})
+            return
+
         # Mock Arkade Auth Status
         if path == '/api/arkade/auth-status':
             self.send_json({'bypass': True, 'message': 'Local Test Server Bypass'})
             return
 
-        # Mock Token Verify
+        # Token Verify (unknown tokens fall back to TestPilot)
         if path == '/api/arkade/verify':
-            # Check Authorization header? SIMPLE MOCK:
-            auth_header = self.headers.get('Authorization', '')
-            
-            if 'mock-admin-token-123' in auth_header:
-                self.send_json({
-                    'valid': True,
-                    'username': 'admin',
-                    'is_admin': True,
-                    'bypass': True
-                })
-            else:
-                 # Default TestPilot or Invalid?
-                 # Let's keep TestPilot for convenience if needed, or invalidate.
-                 # User wants STRICT testing.
-                 self.send_json({
-                    'valid': True,
-                    'username': 'TestPilot',
-                    'is_admin': False, # Demote TestPilot
-                    'bypass': True
-                })
+            username, account = self.current_user()
+            self.send_json({
+                'valid': True,
+                'username': username,
+                'is_admin': account['isAdmin'],
+                'bypass': True
+            })
             return
 
-        # Mock Ad Astra Player Data
+        # Ad Astra Player Data
         if path == '/api/adastra/player':
-            print("Requesting mock player data...")
-            # We return a basic user so valid play is possible immediately.
-            self.send_json({
-                'username': 'TestPilot',
-                'pilot_name': 'Ace Test',
-                'ship_name': 'The Debugger',
-                'credits': 99999,
-                'turns': 100,
-                'current_sector': 1,
-                'ship_type': 'scout',
-                'ship_variant': 1,
-                'is_admin': True,
-                'cargo': '{"Ore": 10, "Fuel": 50}',
-                'equipment': '{}',
-                'game_state': {
-                    'username': 'TestPilot',
-                    'pilotName': 'Ace Test',
-                    'credits': 99999,
-                    'turns': 100,
-                    'maxTurns': 100,
-                    'currentSector': 1,
-                    'ship': {'name': 'The Debugger', 'type': 'scout', 'hull': 100, 'hullMax': 100, 'shields': 50, 'shieldsMax': 50, 'cargoMax': 20},
-                    'shipVariant': 1,
-                    'cargo': {'Ore': 10, 'Fuel': 50},
-                    'stats': {'sectorsVisited': 1},
-                    'created': 1733560000000
-                }
-            })
+            username, _ = self.current_user()
+            with store.lock:
+                player = store.player_view(username) if username in store.players else None
+            if player is None:
+                self.send_json({'error': 'Player not found'}, 404)
+            else:
+                self.send_json(player)
+            return
+
+        if path == '/api/adastra/multiplayer':
+            with store.lock:
+                multiplayer = store.multiplayer  # replaced wholesale on PUT, never mutated
+            self.send_json(multiplayer)
+            return
+
+        if path.startswith('/api/adastra/admin/') and not self.require_admin():
+            return
+
+        if path == '/api/adastra/admin/players':
+            with store.lock:
+                players = [store.player_view(u, admin=True) for u in store.players]
+            players.sort(key=lambda p: p['lastActivity'] or '', reverse=True)
+            self.send_json({'players': players})
+            return
+
+        if path.startswith('/api/adastra/admin/player/'):
+            username = self.admin_target(path)
+            with store.lock:
+                player = store.player_view(username, admin=True) if username in store.players else None
+            if player is None:
+                self.send_json({'error': 'Player not found'}, 404)
+            else:
+                self.send_json(player)
+            return
+
+        if path == '/api/adastra/admin/settings':
+            with store.lock:
+                settings = dict(store.settings)
+            self.send_json({'success': True, 'settings': settings})
             return
 
-        # Mock Stats
         if path == '/api/adastra/admin/stats':
-            self.send_json({
-                'totalPlayers': 5,
-                'activeSessions': 1,
-                'serverTime': 'Mock Time'
-            })
+            cutoff = (datetime.now() - timedelta(minutes=10)).isoformat()
+            with store.lock:
+                stats = {
+                    'totalPlayers': sum(1 for a in store.accounts.values() if not a['isAdmin']),
+                    'activeSessions': len(set(store.sessions.values())),
+                    'recentlyActive': sum(1 for p in store.players.values() if (p['lastActivity'] or '') > cutoff),
+                    'totalConnections': len(store.sessions),
+                    'serverTime': datetime.now().isoformat()
+                }
+            self.send_json(stats)
+            return
+
+        if path.startswith('/api/'):
+            self.send_json({'error': 'Not found', 'path': path}, 404)
             return
 
         # Fallback to static files
         super().do_GET()
 
+    # -- POST ------------------------------------------------------------
+
     def do_POST(self):
         parsed_path = urllib.parse.urlparse(self.path)
         path = parsed_path.path
-        length = int(self.headers.get('content-length', 0))
-        if length > 0:
-            body = self.rfile.read(length).decode('utf-8')
-            print(f"POST {path} Body: {body}")
-        
-        # Mock Login
-        if path == '/api/arkade/login':
-            try:
-                data = json.loads(body)
-            except:
-                data = {}
-            
-            username = data.get('username', '')
-            password = data.get('password', '')
-
-            if username == 'admin' and password == 'admin123':
-                self.send_json({
-                    'success': True,
-                    'token': 'mock-admin-token-123',
-                    'username': 'admin',
-                    'is_admin': True,
-                    'pilot_name': 'Admin Pilot',
-                    'ship_name': 'Admin Ship'
-                })
+        data = self.read_json()
+        store = self.store
+
+        # Login (Arkade hub and Ad Astra)
+        if path in ('/api/arkade/login', '/api/adastra/login'):
+            username = (data.get('username') or '').strip()
+            password = data.get('password') or ''
+            with store.lock:
+                account = store.accounts.get(username)
+                valid = account is not None and account['passwordHash'] == hash_password(password)
+                token = store.start_session(username) if valid and not account['isBanned'] else None
+            if not valid:
+                self.send_json({'success': False, 'error': 'Invalid credentials'}, 401)
+            elif token is None:
+                self.send_json({'error': 'Account is banned'}, 403)
             else:
                 self.send_json({
-                    'success': False,
-                    'error': 'Invalid credentials'
+                    'success': True,
+                    'token': token,
+                    'username': username,
+                    'is_admin': account['isAdmin']
                 })
             return
 
-        # Mock Register
-        if path == '/api/arkade/register':
-            self.send_json({
-                'success': True,
-                'token': 'mock-token-123',
-                'username': 'TestPilot'
-            })
+        # Register (the Ad Astra form also creates the player record)
+        if path in ('/api/arkade/register', '/api/adastra/register'):
+            username = (data.get('username') or '').strip()
+            password = data.get('password') or ''
+            if not username or not password:
+                self.send_json({'error': 'Username and password required'}, 400)
+                return
+            with store.lock:
+                exists = username in store.accounts
+                if not exists:
+                    store.create_account(username, password)
+                    if path == '/api/adastra/register':
+                        store.players[username] = store.new_player(
+                            username, (data.get('pilotName') or '').strip(), (data.get('shipName') or '').strip(),
+                            data.get('shipType') or 'scout', data.get('shipVariant') or 1)
+                    token = store.start_session(username)
+            if exists:
+                self.send_json({'error': 'Username already exists'}, 400)
+                return
+            self.send_json({'success': True, 'token': token, 'username': username})
             return
-            
-        # Mock Logout
+
         if path == '/api/arkade/logout':
+            store.end_sessions(token=self.token())
             self.send_json({'success': True})
             return
 
-        # Mock Ad Astra Player Update (PUT)
-        if path == '/api/adastra/player' and self.command == 'POST': # The client sends PUT as POST using fetch? No, fetch sends PUT.
-             pass
+        if path.startswith('/api/adastra/admin/') and not self.require_admin():
+            return
 
-        # Mock Reset Galaxy
-        if path == '/api/adastra/admin/reset-galaxy':
-             self.send_json({'success': True, 'message': 'Mock players reset'})
-             return
+        username = self.admin_target(path, '/kick')
+        if username is not None:
+            store.end_sessions(username)
+            self.send_json({'success': True, 'message': f'Player {username} kicked'})
+            return
 
-        pass
+        username = self.admin_target(path, '/ban')
+        if username is not None:
+            banned = data.get('banned') is not False
+            with store.lock:
+                if username in store.accounts:
+                    store.accounts[username]['isBanned'] = banned
+                    store.dirty = True
+            if banned:
+                store.end_sessions(username)
+            self.send_json({'success': True, 'message': f"Player {username} {'banned' if banned else 'unbanned'}"})
+            return
+
+        # Reset Galaxy: every non-admin pilot back to the starting settings
+        if path == '/api/adastra/admin/reset-galaxy':
+            with store.lock:
+                for username, player in store.players.items():
+                    if store.accounts.get(username, {}).get('isAdmin'):
+                        continue
+                    player.update({
+                        'credits': store.settings['startingCredits'],
+                        'turns': store.settings['startingTurns'],
+                        'currentSector': store.settings['startingSector'],
+                        'cargo': {},
+                        'equipment': {},
+                        'gameState': {}
+                    })
+                store.dirty = True
+            self.send_json({'success': True, 'message': 'Galaxy reset'})
+            return
 
         # Mock Galaxy Generation
         if path == '/api/adastra/admin/galaxy/generate':
             print("Mocking galaxy generation...")
-            try:
-                data = json.loads(body)
-                size = data.get('size', 100)
-                self.send_json({
-                    'success': True,
-                    'size': size,
-                    'message': f'Mock galaxy generated with {size} sectors'
-                })
-            except:
-                self.send_json({'success': False, 'error': 'Invalid JSON'})
+            size = data.get('size', 100)
+            self.send_json({
+                'success': True,
+                'size': size,
+                'message': f'Mock galaxy generated with {size} sectors'
+            })
             return
 
-        # Correctly handle PUT requests
+        # Always answer: on a keep-alive connection silence leaves the client hanging
+        self.send_json({'error': 'Not found', 'path': path}, 404)
+
+    # -- PUT -------------------------------------------------------------
+
     def do_PUT(self):
         parsed_path = urllib.parse.urlparse(self.path)
         path = parsed_path.path
-        length = int(self.headers.get('content-length', 0))
-        if length > 0:
-            body = self.rfile.read(length).decode('utf-8')
-            print(f"PUT {path} Body: {body}")
+        data = self.read_json()
+        store = self.store
 
+        # Save player (created on first save, like the Worker)
         if path == '/api/adastra/player':
+            username, _ = self.current_user()
+            with store.lock:
+                player = store.players.get(username) or store.new_player(username)
+                for key in ('pilotName', 'shipName', 'credits', 'turns', 'currentSector',
+                            'shipType', 'shipVariant', 'cargo', 'equipment', 'gameState'):
+                    if key in data:
+                        player[key] = data[key]
+                player['lastActivity'] = datetime.now().isoformat()
+                store.players[username] = player
+                store.dirty = True
             self.send_json({'success': True})
             return
-            
-        self.send_error(404, "Not Found")
 
-        self.send_error(404, "Not Found")
+        # Multiplayer presence: the client sends the whole map, like the Worker stores it
+        if path == '/api/adastra/multiplayer':
+            with store.lock:
+                store.multiplayer = data
+                store.dirty = True
+            self.send_json({'success': True})
+            return
 
-    def send_json(self, data):
-        self.send_response(200)
+        if path.startswith('/api/adastra/admin/') and not self.require_admin():
+            return
+
+        if path == '/api/adastra/admin/settings':
+            with store.lock:
+                updated = [key for key in DEFAULT_SETTINGS if key in data]
+                for key in updated:
+                    store.settings[key] = data[key]
+                store.dirty = True
+            self.send_json({'success': True, 'updated': updated})
+            return
+
+        username = self.admin_target(path)
+        if username is not None:
+            with store.lock:
+                player = store.players.get(username)
+                if player is not None:
+                    for key in ('credits', 'turns', 'currentSector', 'shipName', 'shipType'):
+                        if key in data:
+                            player[key] = data[key]
+                    if 'hull' in data or 'fuel' in data:
+                        ship = player['gameState'].setdefault('ship', {})
+                        for key in ('hull', 'fuel'):
+                            if key in data:
+                                ship[key] = data[key]
+                    elif 'gameState' in data:
+                        player['gameState'] = data['gameState']
+                    store.dirty = True
+            if player is None:
+                self.send_json({'error': 'Player not found'}, 404)
+            else:
+                self.send_json({'success': True})
+            return
+
+        self.send_json({'error': 'Not found', 'path': path}, 404)
+
+    # -- DELETE ----------------------------------------------------------
+
+    def do_DELETE(self):
+        path = urllib.parse.urlparse(self.path).path
+        store = self.store
+
+        if path.startswith('/api/adastra/admin/') and not self.require_admin():
+            return
+
+        username = self.admin_target(path)
+        if username is not None:
+            with store.lock:
+                found = store.accounts.pop(username, None) is not None
+                store.players.pop(username, None)
+                store.end_sessions(username)
+            if not found:
+                self.send_json({'error': 'Player not found'}, 404)
+                return
+            self.send_json({'success': True, 'message': f'Player {username} deleted'})
+            return
+
+        self.send_json({'error': 'Not found', 'path': path}, 404)
+
+    def send_json(self, data, status=200):
+        payload = json.dumps(data).encode('utf-8')
+        self.send_response(status)
         self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode('utf-8'))
+        self.wfile.write(payload)
+
+def main():
+    parser = argparse.ArgumentParser(description='Local static server with a mock Arkade / Ad Astra API')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--directory', default=DIRECTORY)
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help='connections served concurrently (1 = the old single-threaded behaviour)')
+    parser.add_argument('--quiet', action='store_true', help='no per-request access log (for load tests)')
+    parser.add_argument('--snapshot', metavar='FILE',
+                        help='load mock state from FILE at startup and write it back while running and on exit')
+    parser.add_argument('--seed-players', type=int, default=0, metavar='N',
+                        help='add N synthetic pilots with realistic save payloads')
+    args = parser.parse_args()
+
+    snapshot_path = os.path.abspath(args.snapshot) if args.snapshot else None
+    os.chdir(args.directory)
+    Handler.quiet = args.quiet
+    Handler.store = store = MockStore(snapshot_path)
+    if args.seed_players:
+        store.seed(args.seed_players)
+        print(f"Seeded {args.seed_players} synthetic players ({len(store.players)} total)")
+
+    stop_autosave = threading.Event()
+    if snapshot_path:
+        threading.Thread(target=store.autosave, args=(stop_autosave,), daemon=True).start()
+    # Treat SIGTERM like Ctrl+C so the final snapshot is written
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    print(f"Server started at http://localhost:{args.port}")
+    print(f"Serving directory: {os.getcwd()}")
+    print(f"Workers: {args.workers} (HTTP/1.1 keep-alive, {KEEPALIVE_TIMEOUT}s idle timeout)")
+    print("Mock API active: /api/arkade/*, /api/adastra/* (in-memory store"
+          + (f", snapshot {snapshot_path})" if snapshot_path else ")"))
 
-os.chdir(DIRECTORY)
-print(f"Server started at http://localhost:{PORT}")
-print(f"Serving directory: {os.getcwd()}")
-print("Mock API active: /api/arkade/*")
+    with PooledHTTPServer(("", args.port), Handler, workers=max(1, args.workers)) as httpd:
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stop_autosave.set()
+            if store.save():
+                print(f"Snapshot written to {snapshot_path}")
 
-with socketserver.TCPServer(("", PORT), Handler) as httpd:
-    httpd.serve_forever()
+if __name__ == '__main__':
+    main()